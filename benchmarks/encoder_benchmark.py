@@ -0,0 +1,74 @@
+"""Compares the JSON encoder backends on a mix of messages typical of a run.
+
+Usage: python benchmarks/encoder_benchmark.py [number of messages]
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import random
+import string
+import sys
+import time
+import uuid
+
+from hyperdash import encoder
+from hyperdash import sdk_message
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def message_mix(n):
+    """Roughly what a training run sends: mostly metrics, some logs and params."""
+    sdk_run_uuid = str(uuid.uuid4())
+    body = "".join(random.choice(string.ascii_letters + " \n") for _ in range(2048))
+    messages = []
+    for i in range(n):
+        kind = i % 10
+        if kind < 7:
+            value = np.float32(random.random()) if np is not None and kind % 2 else random.random()
+            messages.append((sdk_message.TYPE_METRIC, sdk_run_uuid, {
+                "name": "loss",
+                "timestamp": int(time.time() * 1000),
+                "value": value,
+                "is_internal": False,
+            }))
+        elif kind < 9:
+            messages.append((sdk_message.TYPE_LOG, sdk_run_uuid, {
+                "uuid": str(uuid.uuid4()),
+                "level": "INFO",
+                "body": body,
+            }))
+        else:
+            params = {"lr": 0.01, "optimizer": "adam", "epochs": 10}
+            if np is not None:
+                params["layer_sizes"] = np.arange(8)
+                params["seed"] = np.int64(42)
+            messages.append((sdk_message.TYPE_PARAM, sdk_run_uuid, {
+                "params": params,
+                "is_internal": False,
+            }))
+    return messages
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    messages = message_mix(n)
+    print("Encoding {} messages (70% metrics, 20% 2 KiB logs, 10% params)".format(n))
+    for name in encoder.available_backends():
+        _, dumps = encoder.create_dumps(name)
+        start = time.time()
+        for type_str, sdk_run_uuid, payload in messages:
+            dumps({
+                "type": type_str,
+                "timestamp": int(time.time() * 1000),
+                "sdk_run_uuid": sdk_run_uuid,
+                "payload": payload,
+            })
+        elapsed = time.time() - start
+        print("{:>8}: {:>10.0f} messages/s ({:.2f}s)".format(name, n / elapsed, elapsed))
+
+
+if __name__ == "__main__":
+    main()
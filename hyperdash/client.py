@@ -1,15 +1,67 @@
+import datetime
 import time
 
 import numbers
 import six
-import json
 
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+from .encoder import is_numpy
+from .params import coerce_param_value
+from .params import DEFAULT_SEPARATOR
+from .params import flatten_params
+from .params import load_params_file
+from .sdk_message import create_distribution_message
 from .sdk_message import create_metric_message
+from .sdk_message import create_metric_series_message
 from .sdk_message import create_param_message
+from .sdk_stats import flatten_stats
+from .sketch import DDSketch
+from .timers import thread_cpu_time
+from .timers import Timer
+
+
+# How often background work (like closing distribution windows) is checked
+TICK_INTERVAL_SECONDS = 1
+# Length of the window each uploaded distribution summarizes
+DISTRIBUTION_WINDOW_SECONDS = 10
+# Minimum time between progress logs of an iter(fast=True) loop
+ITER_LOG_INTERVAL_SECONDS = 10
+# Maximum number of datapoints sent in a single metric series message
+MAX_SERIES_POINTS_PER_MESSAGE = 1000
+# How often the SDK's own stats are sent as internal metrics, if enabled
+SDK_STATS_INTERVAL_SECONDS = 10
+
+
+class _DistributionWindow:
+    def __init__(self, start, log, is_internal):
+        self.start = start
+        self.log = log
+        self.is_internal = is_internal
+        self.sketch = DDSketch()
+
+
+class _IterProgress:
+    def __init__(self, iter_num, n, log, start):
+        self.iter_num = iter_num
+        self.n = n
+        self.log = log
+        # Current iteration, the only thing updated on every iteration
+        self.i = 0
+        # Iteration and time of the previous sample, used to compute the rate
+        self.sampled_i = 0
+        self.sampled_at = start
+        # Log the first sample immediately
+        self.logged_at = start - ITER_LOG_INTERVAL_SECONDS
+        # Held while sampling, which happens on the tick thread as well as
+        # when the loop ends
+        self.lock = Lock()
 
 
 class HDClient:
-    def __init__(self, logger, server_manager, sdk_run_uuid):
+    def __init__(self, logger, server_manager, sdk_run_uuid, aggregator=None, governor=None):
         self.logger = logger
         self._server_manager = server_manager
         self._sdk_run_uuid = sdk_run_uuid
@@ -22,38 +74,85 @@ class HDClient:
         # Keep track of the last time we saw a metric so we can
         # limit how often the are emitted
         self._last_seen_metrics = {}
+        # When running as one rank of a distributed job, metrics are handed
+        # to the aggregator (see distributed.py) instead of being sent directly
+        self._aggregator = aggregator
+        # Open distribution windows by name in the form of (window_start, DDSketch)
+        self._distributions = {}
+        self._distributions_lock = Lock()
+        # Timers by (name, log), reused so that timing a block doesn't allocate one
+        self._timers = {}
+        # Records the spans of timers if a trace of the run is being written
+        self._span_recorder = None
+        # Slows down metric sampling when the SDK is over its CPU budget
+        self._governor = governor
+        # Functions called periodically from a background thread (and one final
+        # time when the client is closed) with the arguments (current_time, force)
+        self._tickers = []
+        self._tick_thread = None
+        self._tick_lock = Lock()
+        self._closed = Event()
 
-    def metric(self, name, value, log=True):
+    def metric(self, name, value, log=True, reduce=None):
         """Emit a datapoint for a named timeseries.
 
         Optional log parameter controls whether the metric is
         logged / printed to STDOUT.
+
+        Optional reduce parameter controls how the metric is combined
+        across ranks of a distributed job (mean, sum, min or max).
         """
-        return self._metric(name, time.time(), value, log, False)
+        return self._metric(name, time.time(), value, log, False, reduce=reduce)
 
     # This is gross, but be careful when modifying this functions signature as its used by the
     # CLI in the tensorboard command.
-    def _metric(self, name, current_time, value, log=True, is_internal=False, sample_frequency_per_second=1):
+    def _metric(self, name, current_time, value, log=True, is_internal=False, sample_frequency_per_second=1, reduce=None):
         assert isinstance(value, numbers.Real), "value must be a real number."
         assert isinstance(name, six.string_types)
         assert isinstance(sample_frequency_per_second, numbers.Real), "sample_frequency_per_second must be a real number."
         assert value is not None and name is not None and sample_frequency_per_second is not None, "value and name and sample_frequency_per_second must not be None."
         # We've already determined its a real number, but some objects that satisfy the real number
-        # constraint (like numpy numbers) are not JSON serializable unless converted.
-        value = float(value)
+        # constraint are not JSON serializable unless converted. NumPy numbers are handled natively
+        # by the encoder.
+        if not (isinstance(value, float) or is_numpy(value)):
+            value = float(value)
 
         last_seen_at = self._last_seen_metrics.get(name, None)
-        if last_seen_at and (current_time - last_seen_at < (1.0/float(sample_frequency_per_second))):
+        slowdown = self._governor.slowdown if self._governor else 1
+        if last_seen_at and (current_time - last_seen_at < (slowdown/float(sample_frequency_per_second))):
             # Not enough time has elapsed since the last time this metric was emitted
             return
 
-        message = create_metric_message(
-            self._sdk_run_uuid, name, current_time, value, is_internal)
-        self._server_manager.put_buf(message)
+        if self._aggregator:
+            self._aggregator.add(name, current_time, value, is_internal, reduce)
+        else:
+            self._send_metric(name, current_time, value, is_internal)
         self._last_seen_metrics[name] = current_time
         if log:
             self.logger.info("| {0}: {1:10f} |".format(name, value))
 
+    def _send_metric(self, name, current_time, value, is_internal):
+        self._put(create_metric_message, name, current_time, value, is_internal)
+
+    def _put(self, create_message, *args):
+        """Create a message for this run and queue it, recording the CPU time
+        spent encoding it."""
+        started_at = thread_cpu_time()
+        message = create_message(self._sdk_run_uuid, *args)
+        self._server_manager.stats.incr("encode_cpu_seconds", thread_cpu_time() - started_at)
+        self._server_manager.put_buf(message)
+
+    # Used by the CLI to upload historical data in bulk
+    def _send_metric_series(self, name, timestamps, values, is_internal=False):
+        """Send many datapoints of a metric at once, bypassing sampling."""
+        for start in range(0, len(timestamps), MAX_SERIES_POINTS_PER_MESSAGE):
+            end = start + MAX_SERIES_POINTS_PER_MESSAGE
+            self._put(create_metric_series_message, name, timestamps[start:end], values[start:end], is_internal)
+        # Sampling of live datapoints picks up where the series left off
+        if timestamps:
+            self._last_seen_metrics[name] = max(
+                timestamps[-1], self._last_seen_metrics.get(name) or timestamps[-1])
+
     def param(self, name, val, log=True):
         """Associate a hyperparameter with the given experiment.
 
@@ -65,38 +164,200 @@ class HDClient:
     def _param(self, name, val, log=True, is_internal=False):
         assert isinstance(name, six.string_types), "name must be a string."
         # Make sure its JSON serializable
-        try:
-            json.dumps(val)
-        except TypeError:
-            # If its not, see if its a number
-            if isinstance(val, numbers.Real):
-                val = float(val)
-            else:
-            # Otherwise, just convert it to a string
-                val = str(val)
+        val = coerce_param_value(val)
         assert name not in self._seen_params, "hyperparameters should be unique and not reused"
 
         params = {}
         params[name] = val
-        message = create_param_message(self._sdk_run_uuid, params, is_internal)
-        self._server_manager.put_buf(message)
+        self._put(create_param_message, params, is_internal)
         self._seen_params.add(name)
         if log:
             self.logger.info("{{ {}: {} }}".format(name, val))
         return val
 
-    def iter(self, n, log=True):
+    def params(self, params, log=True, separator=DEFAULT_SEPARATOR):
+        """Associate many hyperparameters with the given experiment at once.
+
+        params can be a (nested) dict or an object with attributes such as an
+        argparse.Namespace. Nested keys are flattened by joining them with
+        separator, keys that collide once flattened raise ValueError. All of
+        the hyperparameters are sent in a single message.
+
+        Returns the flattened hyperparameters.
+        """
+        return self._params(flatten_params(params, separator), log, False)
+
+    def params_from_file(self, path, log=True, separator=DEFAULT_SEPARATOR):
+        """Associate the hyperparameters in a JSON, YAML or INI config file."""
+        return self.params(load_params_file(path), log, separator)
+
+    def _params(self, params, log=True, is_internal=False):
+        reused = [name for name in params if name in self._seen_params]
+        assert not reused, "hyperparameters should be unique and not reused: {}".format(
+            ", ".join(reused))
+
+        self._put(create_param_message, params, is_internal)
+        self._seen_params.update(params)
+        if log and params:
+            self.logger.info("\n".join(
+                "{{ {}: {} }}".format(name, val) for name, val in params.items()))
+        return params
+
+    def distribution(self, name, values, log=True):
+        """Record values for a named distribution.
+
+        values can be a single number, an iterable of numbers or a NumPy array.
+        Values are summarized on the client in a streaming quantile sketch and
+        only the summary of each window is sent to the server.
+        """
+        return self._distribution(name, time.time(), values, log, False)
+
+    def timer(self, name, log=True):
+        """Returns a Timer which records how long a block of code takes in a
+        named distribution, as a context manager or a decorator.
+
+            with exp.timer("data"):
+                batch = next(loader)
+
+            @exp.timer("checkpoint")
+            def save(): ...
+
+        Timers started inside other timers are named "<outer>/<inner>".
+        """
+        assert isinstance(name, six.string_types), "name must be a string."
+        timer = self._timers.get((name, log))
+        if timer is None:
+            timer = self._timers[(name, log)] = Timer(self, name, log)
+        return timer
+
+    def _record_spans(self, recorder):
+        """Record the span of every timed block with recorder, and write its
+        trace file periodically and when the client is closed.
+        """
+        self._span_recorder = recorder
+
+        def ticker(current_time, force):
+            try:
+                recorder.tick(current_time, force)
+            except (IOError, OSError) as e:
+                self.logger.error("Unable to write trace to {}: {}".format(recorder.path, e))
+        self._add_ticker(ticker)
+
+    def stats(self):
+        """Returns a snapshot of the SDK's own counters and histograms, like
+        how many messages are waiting to be sent and how long requests take.
+        """
+        return self._server_manager.get_stats()
+
+    def _report_stats(self, interval=SDK_STATS_INTERVAL_SECONDS):
+        """Send the SDK's stats as internal metrics (prefixed with hd_sdk_)
+        every interval seconds and when the client is closed.
+        """
+        reported_at = [None]
+
+        def ticker(current_time, force):
+            if not force and reported_at[0] and current_time - reported_at[0] < interval:
+                return
+            reported_at[0] = current_time
+            for name, value in sorted(flatten_stats(self.stats()).items()):
+                self._metric(
+                    name, current_time, value, log=False, is_internal=True,
+                    sample_frequency_per_second=max(1.0, 1.0 / interval))
+        self._add_ticker(ticker)
+
+    def _distribution(self, name, current_time, values, log=True, is_internal=False):
+        assert isinstance(name, six.string_types), "name must be a string."
+        with self._distributions_lock:
+            window = self._distributions.get(name)
+            if window and current_time - window.start >= DISTRIBUTION_WINDOW_SECONDS:
+                self._send_distribution(name, current_time, window)
+                window = None
+            if not window:
+                window = _DistributionWindow(current_time, log, is_internal)
+                self._distributions[name] = window
+            # Timers record one float at a time, skip add_many's type checks
+            if isinstance(values, float):
+                window.sketch.add(values)
+            else:
+                window.sketch.add_many(values)
+        self._add_ticker(self._tick_distributions)
+
+    def _send_distribution(self, name, current_time, window):
+        summary = self._send_sketch(name, current_time, window.sketch, window.is_internal)
+        if window.log:
+            self.logger.info("| {}: {} (n={}) |".format(
+                name,
+                " ".join(
+                    "p{:g}={:g}".format(float(q) * 100, v)
+                    for q, v in sorted(summary["quantiles"].items())
+                ),
+                summary["count"],
+            ))
+
+    # Also used by the CLI to upload distributions that were summarized elsewhere,
+    # like Tensorboard histograms
+    def _send_sketch(self, name, timestamp, sketch, is_internal=False):
+        summary = sketch.to_dict()
+        self._put(create_distribution_message, name, timestamp, summary, is_internal)
+        return summary
+
+    def _tick_distributions(self, current_time, force):
+        with self._distributions_lock:
+            for name, window in list(self._distributions.items()):
+                if force or current_time - window.start >= DISTRIBUTION_WINDOW_SECONDS:
+                    self._send_distribution(name, current_time, window)
+                    del self._distributions[name]
+
+    def _add_ticker(self, ticker):
+        if ticker in self._tickers:
+            return
+        with self._tick_lock:
+            if ticker in self._tickers:
+                return
+            self._tickers.append(ticker)
+            if self._tick_thread is None and not self._closed.is_set():
+                self._tick_thread = Thread(target=self._tick_loop)
+                self._tick_thread.daemon = True
+                self._tick_thread.start()
+
+    def _remove_ticker(self, ticker):
+        with self._tick_lock:
+            if ticker in self._tickers:
+                self._tickers.remove(ticker)
+
+    def _tick_loop(self):
+        while not self._closed.wait(TICK_INTERVAL_SECONDS):
+            for ticker in list(self._tickers):
+                ticker(time.time(), False)
+
+    def _close(self):
+        """Flush any pending background work before the run ends."""
+        self._closed.set()
+        for ticker in list(self._tickers):
+            ticker(time.time(), True)
+
+    def iter(self, n, log=True, fast=False):
         """Returns an iterator with the specified number of iterations.
 
         The iter method automatically associated the number of iterations
         with the experiment, as well as emits timeseries data for each
         iteration so that progress can be monitored.
+
+        With fast=True each iteration only updates a counter, which is meant
+        for loops with millions of cheap iterations. Progress, rate and ETA
+        are then sampled by a background tick once per second and progress
+        is logged at most once every ITER_LOG_INTERVAL_SECONDS.
         """
-        i = 0
         # Capture the existing iterator number
         iter_num = self._iter_num
         # Increment the iterator number for subsequent calls
         self._iter_num += 1
+        if fast:
+            return self._fast_iter(iter_num, n, log)
+        return self._iter(iter_num, n, log)
+
+    def _iter(self, iter_num, n, log):
+        i = 0
         self._param("hd_iter_{}_epochs".format(iter_num),
                     n, log=False, is_internal=True)
         while i < n:
@@ -107,5 +368,58 @@ class HDClient:
             yield i
             i += 1
 
+    def _fast_iter(self, iter_num, n, log):
+        self._param("hd_iter_{}_epochs".format(iter_num),
+                    n, log=False, is_internal=True)
+        progress = _IterProgress(iter_num, n, log, time.time())
+
+        def ticker(current_time, force):
+            self._tick_iter(progress, current_time, force)
+        self._add_ticker(ticker)
+        try:
+            for i in six.moves.xrange(n):
+                progress.i = i
+                yield i
+        finally:
+            self._remove_ticker(ticker)
+            # The time is read once a tick already in progress is over, so
+            # the final sample is never older than the previous one
+            self._tick_iter(progress, None, True)
+
+    def _tick_iter(self, progress, current_time, force):
+        with progress.lock:
+            if current_time is None:
+                current_time = time.time()
+            self._sample_iter(progress, current_time, force)
+
+    def _sample_iter(self, progress, current_time, force):
+        i = progress.i
+        elapsed = current_time - progress.sampled_at
+        if elapsed <= 0 or (i == progress.sampled_i and not force):
+            return
+
+        name = "hd_iter_{}".format(progress.iter_num)
+        rate = (i - progress.sampled_i) / float(elapsed)
+        remaining = progress.n - 1 - i
+        eta = remaining / rate if rate > 0 else None
+        # Make sure the final progress is never dropped by the 1s sampling
+        frequency = float("inf") if force else 1
+        self._metric(name, current_time, i, log=False, is_internal=True,
+                     sample_frequency_per_second=frequency)
+        self._metric(name + "_rate", current_time, rate, log=False, is_internal=True,
+                     sample_frequency_per_second=frequency)
+        if eta is not None:
+            self._metric(name + "_eta_seconds", current_time, eta, log=False, is_internal=True,
+                         sample_frequency_per_second=frequency)
+        progress.sampled_i = i
+        progress.sampled_at = current_time
+
+        if progress.log and (force or current_time - progress.logged_at >= ITER_LOG_INTERVAL_SECONDS):
+            self.logger.info("| Iteration {} of {} | {:.1f} it/s | ETA {} |".format(
+                i, progress.n - 1, rate,
+                str(datetime.timedelta(seconds=int(eta))) if eta is not None else "unknown",
+            ))
+            progress.logged_at = current_time
+
     def end(self):
         self.logger.warning("end() call is unneccessary while using decorator syntax.")
\ No newline at end of file
@@ -45,6 +45,9 @@ class CodeRunner:
                     self.exited_cleanly = False
                     self.exception = e
             finally:
+                # Flush anything the client is still holding on to before
+                # the run is marked as done
+                self.hd_client._close()
                 with self.lock:
                     self.done = True
                     self.return_val = return_val
@@ -18,8 +18,23 @@ API_NAME_EXPERIMENT = "experiment"
 API_NAME_CLI_RUN = "cli_run"
 API_NAME_CLI_PIPE = "cli_pipe"
 API_NAME_CLI_TENSORBOARD = "cli_tensorboard"
+API_NAME_CLI_TAIL_METRICS = "cli_tail_metrics"
 API_NAME_JUPYTER = "jupyter"
 
+# Forces a specific JSON encoder backend (orjson, msgspec, ujson or json)
+JSON_BACKEND_ENV_VAR = "HYPERDASH_JSON_BACKEND"
+
+# Port that rank 0 of a distributed job listens on for metrics from the other ranks
+AGGREGATOR_PORT_ENV_VAR = "HYPERDASH_AGGREGATOR_PORT"
+DEFAULT_AGGREGATOR_PORT = 29600
+# Secret shared by every rank of a distributed job, which the other ranks have
+# to present to rank 0 for their metrics to be accepted
+AGGREGATOR_TOKEN_ENV_VAR = "HYPERDASH_AGGREGATOR_TOKEN"
+
+# Unix socket exported by `hd run` to the process it launches, whose runs are
+# recorded as part of the `hd run` one
+PARENT_SOCKET_ENV_VAR = "HYPERDASH_PARENT_SOCKET"
+
 def get_base_http_url():
     return six.text_type(os.environ.get(
         "HYPERDASH_SERVER",
@@ -56,6 +71,18 @@ def get_hyperdash_logs_home_path_for_job(job):
     return os.path.join(get_hyperdash_logs_home_path(), slugify(job))
 
 
+def get_hyperdash_traces_home_path_for_job(job):
+    return os.path.join(get_hyperdash_home_path(), "traces", slugify(job))
+
+
+def get_hyperdash_profiles_home_path_for_job(job):
+    return os.path.join(get_hyperdash_home_path(), "profiles", slugify(job))
+
+
+def get_hyperdash_checkpoints_home_path():
+    return os.path.join(get_hyperdash_home_path(), "checkpoints")
+
+
 def get_hyperdash_local_path():
     main = sys.modules["__main__"]
     if not hasattr(main, "__file__"):
@@ -0,0 +1,389 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hmac
+import json
+import os
+import socket
+import time
+
+from collections import deque
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+import six
+
+from .constants import AGGREGATOR_PORT_ENV_VAR
+from .constants import AGGREGATOR_TOKEN_ENV_VAR
+from .constants import DEFAULT_AGGREGATOR_PORT
+from .encoder import dumps
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# (rank, world size) environment variables set by the common launchers, in
+# order of precedence: torch.distributed / torchrun, Open MPI, MPICH / Intel
+# MPI and SLURM.
+RANK_ENV_VARS = (
+    ("RANK", "WORLD_SIZE"),
+    ("OMPI_COMM_WORLD_RANK", "OMPI_COMM_WORLD_SIZE"),
+    ("PMI_RANK", "PMI_SIZE"),
+    ("SLURM_PROCID", "SLURM_NTASKS"),
+)
+
+# Environment variables set to the number of ranks on this node by the same
+# launchers, and the number of nodes by SLURM
+LOCAL_SIZE_ENV_VARS = ("LOCAL_WORLD_SIZE", "OMPI_COMM_WORLD_LOCAL_SIZE", "MPI_LOCALNRANKS")
+NUM_NODES_ENV_VAR = "SLURM_NNODES"
+
+LOOPBACK_ADDR = "127.0.0.1"
+
+REDUCE_MEAN = "mean"
+REDUCE_SUM = "sum"
+REDUCE_MIN = "min"
+REDUCE_MAX = "max"
+
+REDUCE_OPS = {
+    REDUCE_MEAN: lambda values: sum(values) / len(values),
+    REDUCE_SUM: sum,
+    REDUCE_MIN: min,
+    REDUCE_MAX: max,
+}
+
+# How long rank 0 waits for every rank to report a metric before it gives up
+# and emits whatever it has received so far.
+WINDOW_SECONDS = 2
+# How often non-zero ranks send their buffered metrics to rank 0
+FORWARD_INTERVAL_SECONDS = 1
+# Upper bound on the number of metrics a non-zero rank buffers while rank 0
+# is unreachable so that a missing master can't exhaust memory.
+MAX_FORWARD_BUFFER = 100000
+# How often rank 0's network threads check whether they should stop
+POLL_INTERVAL_SECONDS = 0.5
+# How long rank 0 waits for the metrics the other ranks already sent when the
+# run ends
+CLOSE_TIMEOUT_SECONDS = 5
+
+
+class RankInfo:
+    """RankInfo describes this process' position in a multi-process job."""
+
+    def __init__(self, rank, world_size, master_addr, port, token):
+        self.rank = rank
+        self.world_size = world_size
+        self.master_addr = master_addr
+        self.port = port
+        self.token = token
+
+    def is_master(self):
+        return self.rank == 0
+
+
+def get_rank_info(environ=None):
+    """Detect whether we're running as one rank of a distributed job.
+
+    Returns None if we're not, or if the job only has a single rank. Rank 0
+    is reached at MASTER_ADDR, or on the loopback interface if every rank
+    runs on this node.
+    """
+    environ = os.environ if environ is None else environ
+    for rank_var, size_var in RANK_ENV_VARS:
+        if rank_var not in environ or size_var not in environ:
+            continue
+        try:
+            rank = int(environ[rank_var])
+            world_size = int(environ[size_var])
+        except ValueError:
+            return None
+        if world_size <= 1:
+            return None
+
+        master_addr = environ.get("MASTER_ADDR", LOOPBACK_ADDR)
+        if _is_single_node(environ, world_size):
+            master_addr = LOOPBACK_ADDR
+        port = int(environ.get(AGGREGATOR_PORT_ENV_VAR, DEFAULT_AGGREGATOR_PORT))
+        return RankInfo(rank, world_size, master_addr, port, environ.get(AGGREGATOR_TOKEN_ENV_VAR))
+    return None
+
+
+def _is_single_node(environ, world_size):
+    if environ.get(NUM_NODES_ENV_VAR) == "1":
+        return True
+    for local_size_var in LOCAL_SIZE_ENV_VARS:
+        if environ.get(local_size_var) == str(world_size):
+            return True
+    return False
+
+
+def _handshake(token):
+    return dumps({"token": token}) + "\n"
+
+
+def create_aggregator(rank_info, parent_logger, default_reduce=REDUCE_MEAN):
+    if default_reduce not in REDUCE_OPS:
+        raise ValueError("reduce must be one of: {}".format(
+            ", ".join(sorted(REDUCE_OPS))))
+    if rank_info.is_master():
+        return RankAggregator(rank_info, parent_logger, default_reduce)
+    return RankForwarder(rank_info, parent_logger)
+
+
+class _Window:
+    """The values reported for one metric by each rank within a window."""
+
+    def __init__(self, reduce, is_internal, created_at):
+        self.reduce = reduce
+        self.is_internal = is_internal
+        self.created_at = created_at
+        self.timestamp = 0
+        self.values_by_rank = {}
+
+
+class RankAggregator:
+    """RankAggregator runs on rank 0 and reduces metrics across all ranks.
+
+    Every other rank streams its (already sampled) metrics to us over TCP as
+    newline delimited JSON, after a first line with the job's shared token.
+    Connections that don't present it are dropped. We only listen on the
+    address the other ranks were told to use (MASTER_ADDR or loopback).
+
+    Values for the same metric are grouped into a window that is closed and
+    reduced as soon as every rank has reported, when a rank reports the same
+    metric twice, or after WINDOW_SECONDS, whichever comes first.
+    """
+
+    def __init__(self, rank_info, parent_logger, default_reduce):
+        self.rank_info = rank_info
+        self.default_reduce = default_reduce
+        self.logger = parent_logger.getChild(__name__)
+        self.lock = Lock()
+        self.windows = {}
+        self.emit = None
+        self.shutdown = Event()
+        self.closed = False
+        self.server = None
+        self.accept_thread = None
+        self.read_threads = []
+
+    def start(self, emit):
+        """Start accepting connections from the other ranks.
+
+        emit is called with (name, timestamp, value, is_internal) for every
+        reduced metric.
+        """
+        self.emit = emit
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            server.bind((self.rank_info.master_addr, self.rank_info.port))
+            server.listen(self.rank_info.world_size)
+            server.settimeout(POLL_INTERVAL_SECONDS)
+        except socket.error as e:
+            server.close()
+            self.logger.error(
+                "Unable to listen for other ranks on {}:{}, metrics from other ranks will be lost: {}".format(
+                    self.rank_info.master_addr, self.rank_info.port, e))
+        else:
+            self.server = server
+            self.accept_thread = self._start_thread(self._accept_loop)
+        self._start_thread(self._expire_loop)
+
+    def add(self, name, timestamp, value, is_internal, reduce=None):
+        self._add(self.rank_info.rank, name, timestamp, value, is_internal, reduce)
+
+    def close(self):
+        """Emit every pending window, once the metrics the other ranks have
+        already sent are in (waiting at most CLOSE_TIMEOUT_SECONDS)."""
+        self.shutdown.set()
+        deadline = time.time() + CLOSE_TIMEOUT_SECONDS
+        if self.accept_thread:
+            self.accept_thread.join(max(0, deadline - time.time()))
+        with self.lock:
+            read_threads = list(self.read_threads)
+        for thread in read_threads:
+            thread.join(max(0, deadline - time.time()))
+        with self.lock:
+            self.closed = True
+            for name in list(self.windows):
+                self._emit_window(name)
+
+    def _add(self, rank, name, timestamp, value, is_internal, reduce):
+        with self.lock:
+            if self.closed:
+                return
+            window = self.windows.get(name)
+            # A rank got ahead of the others, don't let its newer value
+            # overwrite the old one.
+            if window and rank in window.values_by_rank:
+                self._emit_window(name)
+                window = None
+            if not window:
+                window = _Window(
+                    reduce or self.default_reduce, is_internal, time.time())
+                self.windows[name] = window
+            window.values_by_rank[rank] = value
+            window.timestamp = max(window.timestamp, timestamp)
+            if len(window.values_by_rank) >= self.rank_info.world_size:
+                self._emit_window(name)
+
+    # Must be called with self.lock held
+    def _emit_window(self, name):
+        window = self.windows.pop(name)
+        reduce_op = REDUCE_OPS.get(window.reduce, REDUCE_OPS[self.default_reduce])
+        value = reduce_op(list(window.values_by_rank.values()))
+        self.emit(name, window.timestamp, value, window.is_internal)
+
+    def _start_thread(self, target, *args):
+        thread = Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _accept_loop(self):
+        # Connections already waiting are still accepted after shutdown
+        try:
+            while True:
+                try:
+                    conn, addr = self.server.accept()
+                except socket.timeout:
+                    if self.shutdown.is_set():
+                        return
+                    continue
+                except socket.error:
+                    return
+                with self.lock:
+                    self.read_threads.append(self._start_thread(self._read_loop, conn, addr))
+        finally:
+            self.server.close()
+
+    def _read_loop(self, conn, addr):
+        conn.settimeout(POLL_INTERVAL_SECONDS)
+        authenticated = False
+        buf = b""
+        try:
+            while True:
+                try:
+                    data = conn.recv(65536)
+                except socket.timeout:
+                    # Everything that was sent has been read
+                    if self.shutdown.is_set():
+                        return
+                    continue
+                if not data:
+                    return
+                lines = (buf + data).split(b"\n")
+                buf = lines.pop()
+                for line in lines:
+                    if not authenticated:
+                        if not self._authenticate(line):
+                            self.logger.warning(
+                                "Dropping connection from {} which didn't present the token in {}".format(
+                                    addr[0], AGGREGATOR_TOKEN_ENV_VAR))
+                            return
+                        authenticated = True
+                        continue
+                    try:
+                        m = json.loads(line.decode("utf-8"))
+                        self._add(
+                            m["rank"], m["name"], m["timestamp"], m["value"],
+                            m["is_internal"], m.get("reduce"))
+                    except (ValueError, KeyError):
+                        self.logger.debug("Dropping malformed metric from rank: {}".format(line))
+        except socket.error:
+            pass
+        finally:
+            conn.close()
+
+    def _authenticate(self, line):
+        try:
+            token = json.loads(line.decode("utf-8"))["token"]
+        except (ValueError, KeyError, TypeError):
+            return False
+        if not isinstance(token, six.text_type):
+            return False
+        return hmac.compare_digest(token.encode("utf-8"), self.rank_info.token.encode("utf-8"))
+
+    def _expire_loop(self):
+        while not self.shutdown.wait(WINDOW_SECONDS / 2):
+            expire_before = time.time() - WINDOW_SECONDS
+            with self.lock:
+                for name, window in list(self.windows.items()):
+                    if window.created_at < expire_before:
+                        self._emit_window(name)
+
+
+class RankForwarder:
+    """RankForwarder runs on every rank other than 0 and streams metrics to it.
+
+    Metrics are buffered and sent in a batch every FORWARD_INTERVAL_SECONDS
+    so that the training loop never blocks on the network.
+    """
+
+    def __init__(self, rank_info, parent_logger):
+        self.rank_info = rank_info
+        self.logger = parent_logger.getChild(__name__)
+        self.buf = deque(maxlen=MAX_FORWARD_BUFFER)
+        self.conn = None
+        self.logged_connection_error = False
+        self.send_lock = Lock()
+        self.shutdown = Event()
+
+    def start(self, emit=None):
+        # Rank forwarders never emit locally, emit is accepted so that they
+        # can be used interchangeably with RankAggregator.
+        thread = Thread(target=self._forward_loop)
+        thread.daemon = True
+        thread.start()
+
+    def add(self, name, timestamp, value, is_internal, reduce=None):
+        self.buf.append(dumps({
+            "rank": self.rank_info.rank,
+            "name": name,
+            "timestamp": timestamp,
+            "value": value,
+            "is_internal": is_internal,
+            "reduce": reduce,
+        }) + "\n")
+
+    def close(self):
+        self.shutdown.set()
+        self.flush()
+        with self.send_lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+
+    def flush(self):
+        with self.send_lock:
+            lines = []
+            while True:
+                try:
+                    lines.append(self.buf.popleft())
+                except IndexError:
+                    break
+            if not lines:
+                return True
+            try:
+                if not self.conn:
+                    self.conn = socket.create_connection(
+                        (self.rank_info.master_addr, self.rank_info.port), timeout=5)
+                    self.conn.sendall(_handshake(self.rank_info.token).encode("utf-8"))
+                self.conn.sendall("".join(lines).encode("utf-8"))
+                return True
+            except socket.error as e:
+                if not self.logged_connection_error:
+                    self.logger.error("Unable to send metrics to rank 0 at {}:{}: {}".format(
+                        self.rank_info.master_addr, self.rank_info.port, e))
+                    self.logged_connection_error = True
+                if self.conn:
+                    self.conn.close()
+                    self.conn = None
+                # Re-enqueue so metrics are not lost
+                self.buf.extendleft(reversed(lines))
+                return False
+
+    def _forward_loop(self):
+        while not self.shutdown.wait(FORWARD_INTERVAL_SECONDS):
+            self.flush()
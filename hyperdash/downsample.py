@@ -0,0 +1,117 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from array import array
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# LTTB always keeps the first and last points, and one point of every bucket
+# in between
+MIN_THRESHOLD = 3
+# Points of a series buffered by Downsampler before they're downsampled
+CHUNK_POINTS = 16384
+
+
+def lttb(xs, ys, threshold):
+    """Downsample a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    Returns the indices of the (at most threshold) points to keep. The first
+    and last points are always kept, and from each bucket in between the point
+    forming the largest triangle with its neighbours is chosen, which preserves
+    the visual shape of the series (spikes included) far better than taking
+    every Nth point. xs must be sorted. Thresholds under MIN_THRESHOLD are
+    treated as MIN_THRESHOLD.
+
+    See: https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf
+    """
+    n = len(xs)
+    threshold = max(threshold, MIN_THRESHOLD)
+    if threshold >= n:
+        return list(range(n))
+
+    # The first and last points are always kept, every other point falls in
+    # one of threshold - 2 buckets
+    bucket_size = (n - 2) / (threshold - 2)
+    indices = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket, the third point of the triangle
+        avg_start = int((i + 1) * bucket_size) + 1
+        avg_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_count = avg_end - avg_start
+        avg_x = sum(xs[j] for j in range(avg_start, avg_end)) / avg_count
+        avg_y = sum(ys[j] for j in range(avg_start, avg_end)) / avg_count
+
+        ax = xs[a]
+        ay = ys[a]
+        max_area = -1.0
+        next_a = int(i * bucket_size) + 1
+        for j in range(next_a, int((i + 1) * bucket_size) + 1):
+            # Twice the area, which doesn't matter for finding the largest
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        indices.append(next_a)
+        a = next_a
+    indices.append(n - 1)
+    return indices
+
+
+def _downsample(xs, ys, threshold):
+    # Series from overlapping sources, like the event files of a restarted
+    # job, aren't sorted
+    if any(xs[i] > xs[i + 1] for i in range(len(xs) - 1)):
+        order = sorted(range(len(xs)), key=xs.__getitem__)
+        xs = array("d", (xs[i] for i in order))
+        ys = array("d", (ys[i] for i in order))
+    indices = lttb(xs, ys, threshold)
+    return array("d", (xs[i] for i in indices)), array("d", (ys[i] for i in indices))
+
+
+class Downsampler:
+    """Downsampler downsamples a series of any length to at most threshold
+    points with LTTB, without holding all of it in memory.
+
+    Points are added one at a time, in any order, and every CHUNK_POINTS of
+    them are downsampled as they come in. Every point kept stands for the
+    same number of added points (ratio), which doubles whenever the points
+    kept reach CHUNK_POINTS, so the series keeps an even density and at most
+    2 * CHUNK_POINTS points are held.
+    """
+
+    def __init__(self, threshold, chunk_points=CHUNK_POINTS):
+        self.threshold = max(threshold, MIN_THRESHOLD)
+        self.chunk_points = max(chunk_points, 4 * self.threshold)
+        self.count = 0
+        self.ratio = 1
+        self.pending = (array("d"), array("d"))
+        self.kept = (array("d"), array("d"))
+
+    def add(self, x, y):
+        xs, ys = self.pending
+        xs.append(x)
+        ys.append(y)
+        self.count += 1
+        if len(xs) >= self.chunk_points:
+            self._reduce_pending()
+
+    def result(self):
+        """Returns the (xs, ys) of the downsampled series, sorted by x."""
+        self._reduce_pending()
+        return _downsample(self.kept[0], self.kept[1], self.threshold)
+
+    def _reduce_pending(self):
+        xs, ys = self.pending
+        if not xs:
+            return
+        self.pending = (array("d"), array("d"))
+        xs, ys = _downsample(xs, ys, -(-len(xs) // self.ratio))
+        kept_xs, kept_ys = self.kept
+        kept_xs.extend(xs)
+        kept_ys.extend(ys)
+        if len(kept_xs) >= self.chunk_points:
+            self.kept = _downsample(kept_xs, kept_ys, self.chunk_points // 2)
+            self.ratio *= 2
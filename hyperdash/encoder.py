@@ -0,0 +1,149 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import math
+import os
+
+from .constants import JSON_BACKEND_ENV_VAR
+
+
+BACKEND_ORJSON = "orjson"
+BACKEND_MSGSPEC = "msgspec"
+BACKEND_UJSON = "ujson"
+BACKEND_JSON = "json"
+
+# Fastest first, the stdlib json module is always available as a fallback
+BACKEND_PREFERENCE = (BACKEND_ORJSON, BACKEND_MSGSPEC, BACKEND_UJSON, BACKEND_JSON)
+
+
+def is_numpy(obj):
+    # Checking the module avoids importing NumPy for users who don't use it
+    return type(obj).__module__ == "numpy"
+
+
+def _default(obj):
+    """Encode types the backends don't handle natively."""
+    if is_numpy(obj) and hasattr(obj, "tolist"):
+        # Works for both NumPy scalars (returns a Python number) and arrays
+        # (returns a list)
+        return obj.tolist()
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, default=_default)
+
+
+def _has_non_finite(obj):
+    if isinstance(obj, float):
+        return math.isnan(obj) or math.isinf(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(value) for value in obj)
+    if is_numpy(obj) and hasattr(obj, "tolist"):
+        return _has_non_finite(obj.tolist())
+    return False
+
+
+def _encode_non_finite_like_json(fast_dumps):
+    """orjson and msgspec encode NaN and Infinity as null, while stdlib json
+    (and ujson) encode them as NaN and Infinity. Messages with non-finite
+    floats are encoded with stdlib json so every backend agrees. Only output
+    containing null has to be checked, which keeps the common case fast."""
+    def dumps(obj):
+        out = fast_dumps(obj)
+        if "null" in out and _has_non_finite(obj):
+            return _json_dumps(obj)
+        return out
+    return dumps
+
+
+def _create_orjson_dumps():
+    import orjson
+    option = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default, option=option).decode("utf-8")
+    return _encode_non_finite_like_json(dumps)
+
+
+def _create_msgspec_dumps():
+    import msgspec
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+
+    def dumps(obj):
+        return encoder.encode(obj).decode("utf-8")
+    return _encode_non_finite_like_json(dumps)
+
+
+def _create_ujson_dumps():
+    import ujson
+    kwargs = {"ensure_ascii": False, "escape_forward_slashes": False}
+    try:
+        ujson.dumps(0, default=_default, **kwargs)
+        kwargs["default"] = _default
+    except TypeError:
+        # Older versions of ujson don't support default, NumPy values will
+        # fall back to stdlib json
+        pass
+
+    def dumps(obj):
+        return ujson.dumps(obj, **kwargs)
+    return dumps
+
+
+_BACKEND_FACTORIES = {
+    BACKEND_ORJSON: _create_orjson_dumps,
+    BACKEND_MSGSPEC: _create_msgspec_dumps,
+    BACKEND_UJSON: _create_ujson_dumps,
+    BACKEND_JSON: lambda: _json_dumps,
+}
+
+
+def available_backends():
+    """Returns the names of the backends that can be used in this environment."""
+    available = []
+    for name in BACKEND_PREFERENCE:
+        try:
+            _BACKEND_FACTORIES[name]()
+        except (ImportError, TypeError, AttributeError):
+            continue
+        available.append(name)
+    return available
+
+
+def create_dumps(backend=None):
+    """Returns (backend_name, dumps) for the requested backend.
+
+    If backend is None, the fastest installed backend is used.
+    """
+    candidates = (backend,) if backend else BACKEND_PREFERENCE
+    for name in candidates:
+        if name not in _BACKEND_FACTORIES:
+            raise ValueError("Unknown JSON backend {}, expected one of: {}".format(
+                name, ", ".join(BACKEND_PREFERENCE)))
+        try:
+            fast_dumps = _BACKEND_FACTORIES[name]()
+        except (ImportError, TypeError, AttributeError):
+            continue
+        if fast_dumps is _json_dumps:
+            return name, _json_dumps
+
+        def dumps(obj, fast_dumps=fast_dumps):
+            try:
+                return fast_dumps(obj)
+            # The optional backends don't support everything stdlib json does,
+            # like integers larger than 64 bits, so fall back to it. If stdlib
+            # json can't encode it either, its error is raised instead.
+            except Exception:
+                return _json_dumps(obj)
+        return name, dumps
+    return BACKEND_JSON, _json_dumps
+
+
+try:
+    backend_name, dumps = create_dumps(os.environ.get(JSON_BACKEND_ENV_VAR) or None)
+except ValueError:
+    backend_name, dumps = BACKEND_JSON, _json_dumps
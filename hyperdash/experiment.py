@@ -1,5 +1,7 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import logging
+import os
 import sys
 import uuid
 import threading
@@ -8,13 +10,30 @@ from threading import Lock
 from datetime import datetime
 
 from six.moves.queue import Queue
+from slugify import slugify
 
 from .client import HDClient
+from .constants import AGGREGATOR_TOKEN_ENV_VAR
 from .constants import API_NAME_EXPERIMENT
-from .constants import API_NAME_CLI_TENSORBOARD
+from .constants import get_hyperdash_profiles_home_path_for_job
+from .constants import get_hyperdash_traces_home_path_for_job
+from .distributed import create_aggregator
+from .distributed import get_rank_info
+from .distributed import REDUCE_MEAN
 from .monitor import monitor
+from .params import DEFAULT_SEPARATOR
+from .profiler import StackSampler
+from . import telemetry
+from .governor import OverheadGovernor
 from .io_buffer import IOBuffer
-from .server_manager import ServerManagerHTTP
+from .log_limiter import DEFAULT_LOG_BYTES_PER_SECOND
+from .log_records import LogRecordCapture
+from . import memory
+from .server_manager import create_server_manager
+from .server_manager import ServerManagerLocal
+from .timers import NullTimer
+from .trace import DEFAULT_TRACE_CAPACITY
+from .trace import SpanRecorder
 from .hyper_dash import HyperDash
 from .utils import get_logger
 
@@ -78,12 +97,50 @@ class Experiment:
         model_name,
         api_key_getter=None,
         capture_io=True,
+        distributed=None,
+        distributed_reduce=REDUCE_MEAN,
+        system_metrics=False,
+        system_metrics_interval=telemetry.DEFAULT_SYSTEM_METRICS_INTERVAL,
+        trace=False,
+        trace_capacity=DEFAULT_TRACE_CAPACITY,
+        profile_hz=None,
+        memory_snapshot_interval=None,
+        sdk_stats=False,
+        cpu_budget=None,
+        log_bytes_per_second=DEFAULT_LOG_BYTES_PER_SECOND,
+        capture_logging=False,
     ):
         """Initialize the HyperDash class.
 
         args:
             1) model_name: Name of the model. Experiment number will autoincrement. 
             2) capture_io: Should save stdout/stderror to log file and upload it to Hyperdash.
+            3) distributed: Aggregate metrics across the ranks of a distributed job (detected
+               from RANK/WORLD_SIZE style environment variables) into a single run uploaded by
+               rank 0. Defaults to auto-detection, pass False to disable.
+            4) distributed_reduce: How metrics are combined across ranks by default. One of
+               mean, sum, min or max.
+            5) system_metrics: Record host CPU, memory, disk and network usage, and this process'
+               memory usage, as internal metrics (Linux only).
+            6) system_metrics_interval: How often system metrics are sampled, in seconds.
+            7) trace: Keep the spans of the last trace_capacity exp.timer blocks and periodically
+               write them to a Chrome trace event file which can be opened in Perfetto.
+            8) profile_hz: Sample the stacks of every thread this many times a second and write
+               them as folded stacks (for flamegraphs) every minute. Defaults to not profiling.
+            9) memory_snapshot_interval: Take a tracemalloc snapshot this often, in seconds,
+               record the traced memory as internal metrics and write the allocation sites that
+               grew the most since the previous snapshot to the local log (Python 3 only).
+               Defaults to not tracing memory.
+            10) sdk_stats: Periodically send the SDK's own stats (see stats()) as internal metrics.
+            11) cpu_budget: Fraction of one core the SDK should stay under, e.g. 0.01 for 1%.
+               While over budget metrics are sampled less often and logs are sent in larger
+               batches (or summarized, under heavy load). Defaults to no budget.
+            12) log_bytes_per_second: Average rate at which logs are uploaded. Repeats of a line
+               are uploaded as a count, and lines over the rate are left out of the uploaded logs
+               (but not the local log).
+            13) capture_logging: Upload the records of the logging module (from the root logger and
+               the SDK's own logger) as structured logs with their level, logger name and timestamp,
+               rather than as the text their handlers print.
         """
         self.model_name = model_name
         self.callbacks = Callbacks(self)
@@ -101,12 +158,42 @@ class Experiment:
 
         self._logger = get_logger(model_name, current_sdk_run_uuid, out[0])
 
+        # Created (and validated) before anything is started, but only
+        # started once the run has been
+        self._profiler = None
+        if profile_hz:
+            profile_dir = os.path.join(
+                get_hyperdash_profiles_home_path_for_job(model_name),
+                "{}_{}".format(slugify(model_name), slugify(datetime.now().isoformat())),
+            )
+            self._profiler = StackSampler(profile_dir, profile_hz, self._logger)
+
         if capture_io:
             # Redirect STDOUT/STDERR to buffers
             sys.stdout, sys.stderr = out
 
-        server_manager = ServerManagerHTTP(api_key_getter, self._logger, self._api_name)
-        self._hd_client = HDClient(self._logger, server_manager, current_sdk_run_uuid)
+        rank_info = get_rank_info() if distributed is not False else None
+        if rank_info and not rank_info.token:
+            self._logger.warning(
+                "Set {} to the same secret on every rank to aggregate metrics across ranks, "
+                "creating a separate run for this rank instead".format(AGGREGATOR_TOKEN_ENV_VAR))
+            rank_info = None
+        self._aggregator = None
+        if rank_info:
+            self._aggregator = create_aggregator(rank_info, self._logger, distributed_reduce)
+
+        if rank_info and not rank_info.is_master():
+            # Only rank 0 creates a run, every other rank forwards its metrics to it
+            server_manager = ServerManagerLocal(api_key_getter, self._logger, self._api_name)
+        else:
+            server_manager = create_server_manager(api_key_getter, self._logger, self._api_name)
+        governor = None
+        if cpu_budget:
+            governor = OverheadGovernor(server_manager.stats, cpu_budget, self._logger)
+        self._hd_client = HDClient(
+            self._logger, server_manager, current_sdk_run_uuid, aggregator=self._aggregator, governor=governor)
+        if self._aggregator:
+            self._aggregator.start(self._hd_client._send_metric)
         self._hd = HyperDash(
             model_name,
             current_sdk_run_uuid,
@@ -115,7 +202,45 @@ class Experiment:
             (self._old_out, self._old_err,),
             self._logger,
             self._experiment_runner,
+            governor=governor,
+            log_bytes_per_second=log_bytes_per_second,
         )
+        # Everything that sends messages is set up after HyperDash, which queues run_started
+        if sdk_stats:
+            self._hd_client._report_stats()
+        if trace:
+            trace_path = os.path.join(
+                get_hyperdash_traces_home_path_for_job(model_name),
+                "{}_{}.json".format(slugify(model_name), slugify(datetime.now().isoformat())),
+            )
+            self._hd_client._record_spans(SpanRecorder(trace_path, trace_capacity))
+            # Link the trace to the run
+            self._hd_client._param("hd_trace_path", trace_path, log=False, is_internal=True)
+            self._logger.info("A trace of the last {} timed blocks will be written to: {}".format(
+                trace_capacity, trace_path))
+        if self._profiler:
+            self._profiler.start()
+            self._hd_client._param("hd_profile_path", self._profiler.directory, log=False, is_internal=True)
+        self._system_sampler = None
+        if system_metrics:
+            if telemetry.is_supported():
+                self._system_sampler = telemetry.SystemSampler(self._hd_client, system_metrics_interval)
+                self._system_sampler.start()
+            else:
+                self._logger.warning("System metrics are only available on Linux")
+        self._log_capture = None
+        if capture_logging:
+            self._log_capture = LogRecordCapture(
+                [logging.getLogger(), self._logger], out, server_manager, current_sdk_run_uuid, self._hd.log_bucket)
+            self._log_capture.start()
+        self._memory_snapshotter = None
+        if memory_snapshot_interval:
+            if memory.is_supported():
+                self._memory_snapshotter = memory.MemorySnapshotter(
+                    self._hd_client, self._hd.write_to_log_file, memory_snapshot_interval)
+                self._memory_snapshotter.start()
+            else:
+                self._logger.warning("Memory snapshots require Python 3")
 
         # Channel to update once experiment has finished running
         # Syncs with the seperate hyperdash messaging loop thread
@@ -130,11 +255,11 @@ class Experiment:
         exp_thread.start()
         self._ended = False
 
-    def metric(self, name, value, log=True):
+    def metric(self, name, value, log=True, reduce=None):
         if self._ended:
             self._logger.warn("Cannot send metric {}, experiment ended. Please start a new experiment.".format(name))
             return
-        return self._hd_client.metric(name, value, log)
+        return self._hd_client.metric(name, value, log, reduce)
 
     def param(self, name, value, log=True):
         if self._ended:
@@ -142,17 +267,69 @@ class Experiment:
             return
         return self._hd_client.param(name, value, log)
 
-    def iter(self, n, log=True):
+    def params(self, params, log=True, separator=DEFAULT_SEPARATOR):
+        if self._ended:
+            self._logger.warn("Cannot send params, experiment ended. Please start a new experiment.")
+            return
+        return self._hd_client.params(params, log, separator)
+
+    def params_from_file(self, path, log=True, separator=DEFAULT_SEPARATOR):
+        if self._ended:
+            self._logger.warn("Cannot send params, experiment ended. Please start a new experiment.")
+            return
+        return self._hd_client.params_from_file(path, log, separator)
+
+    def distribution(self, name, values, log=True):
+        if self._ended:
+            self._logger.warn("Cannot send distribution {}, experiment ended. Please start a new experiment.".format(name))
+            return
+        return self._hd_client.distribution(name, values, log)
+
+    def timer(self, name, log=True):
+        if self._ended:
+            self._logger.warn("Cannot time {}, experiment ended. Please start a new experiment.".format(name))
+            return NullTimer()
+        return self._hd_client.timer(name, log)
+
+    def stats(self):
+        """Returns the SDK's own counters and histograms, to tell whether it's
+        keeping up: how many messages are waiting to be sent (queue_depth) and
+        for how long (queue_oldest_seconds, queue_wait_seconds), request
+        latency (request_seconds), bytes_sent, retries, request_errors,
+        poison_pills (messages rejected by the server), the time taken to
+        capture output (capture_seconds), the CPU time spent capturing,
+        encoding and sending (capture_cpu_seconds, encode_cpu_seconds,
+        request_cpu_seconds) and how many log lines were
+        deduplicated, left out by the log rate limit or dropped
+        (log_lines_deduplicated, log_lines_suppressed, log_records_dropped).
+
+        Histograms are dicts of count, sum, max, p50, p90 and p99.
+        """
+        return self._hd_client.stats()
+
+    def iter(self, n, log=True, fast=False):
         if self._ended:
             self._logger.warn("Cannot iterate, experiment ended. Please start a new experiment.")
             return
-        return self._hd_client.iter(n, log)
+        return self._hd_client.iter(n, log, fast)
 
     def end(self):
         if self._ended:
             return
 
         self._ended = True
+        if self._log_capture:
+            self._log_capture.stop()
+        if self._system_sampler:
+            self._system_sampler.stop()
+        if self._profiler:
+            self._profiler.stop()
+        if self._memory_snapshotter:
+            self._memory_snapshotter.stop()
+        self._hd_client._close()
+        # Flush metrics to (or from) the other ranks before the run is marked as done
+        if self._aggregator:
+            self._aggregator.close()
         with self.lock:
             sys.stdout, sys.stderr = self._old_out, self._old_err
             self._experiment_runner.exit_cleanly = True
@@ -233,10 +410,3 @@ class Callbacks:
                 return None
         return cb
 
-
-# Version of Experiment with a different name for use internally, should not be used directly by consumers
-class _TensorboardExperiment(Experiment):
-    _api_name = API_NAME_CLI_TENSORBOARD
-
-    def __init__(self, *args, **kwargs):
-        Experiment.__init__(self, *args, **kwargs)
@@ -0,0 +1,84 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# How often the SDK's overhead is measured and the slowdown adjusted
+GOVERNOR_INTERVAL_SECONDS = 5
+# Metrics are sampled at most this many times less often than requested
+MAX_SLOWDOWN = 16
+# The slowdown is only relaxed once the overhead is well under budget, so that
+# halving it doesn't immediately put the SDK over budget again
+RECOVERY_FRACTION = 0.25
+# Counters of SDKStats (see sdk_stats.py) with the CPU time used by the SDK
+WORK_COUNTERS = ("capture_cpu_seconds", "encode_cpu_seconds", "request_cpu_seconds")
+# At the maximum slowdown, batches of logs sent to the server longer than this
+# are replaced by their beginning and end
+LOG_SUMMARY_CHARS = 4096
+
+
+def summarize_log(s):
+    if len(s) <= LOG_SUMMARY_CHARS:
+        return s
+    half = LOG_SUMMARY_CHARS // 2
+    return "{}\n[... {} characters omitted by Hyperdash to stay within its CPU budget, see the local log for the full output ...]\n{}".format(
+        s[:half], len(s) - 2 * half, s[-half:])
+
+
+class OverheadGovernor:
+    """OverheadGovernor keeps the CPU time the SDK spends capturing output,
+    encoding messages and sending them under budget (a fraction of one
+    core, e.g. 0.01 for 1%).
+
+    Every GOVERNOR_INTERVAL_SECONDS it compares the CPU time recorded in
+    stats to the time elapsed. While over budget the slowdown doubles, up to
+    MAX_SLOWDOWN: metrics are sampled slowdown times less often and logs are
+    batched over slowdown times longer periods before being sent. At the
+    maximum slowdown large batches of logs are summarized. Once the SDK is
+    comfortably under budget again the slowdown is halved.
+
+    Only CPU time counts, so waiting on a slow network doesn't.
+    """
+
+    def __init__(self, stats, budget, logger):
+        assert budget > 0, "budget must be positive."
+        self.stats = stats
+        self.budget = budget
+        self.logger = logger
+        self.slowdown = 1
+        self.warned = False
+        self.checked_at = None
+        self.work = 0.0
+
+    def work_seconds(self):
+        return sum(self.stats.counter(name) for name in WORK_COUNTERS)
+
+    def should_summarize_logs(self):
+        return self.slowdown >= MAX_SLOWDOWN
+
+    def tick(self, current_time):
+        if self.checked_at is None:
+            self.checked_at, self.work = current_time, self.work_seconds()
+            return
+        elapsed = current_time - self.checked_at
+        if elapsed < GOVERNOR_INTERVAL_SECONDS:
+            return
+        work = self.work_seconds()
+        overhead = (work - self.work) / elapsed
+        self.checked_at, self.work = current_time, work
+
+        if overhead > self.budget and self.slowdown < MAX_SLOWDOWN:
+            self.slowdown *= 2
+            if not self.warned:
+                self.warned = True
+                self.logger.warning(
+                    "Hyperdash is using more than its CPU budget of {:.2%}, metrics will be sampled less "
+                    "often and logs sent in larger batches until it's back under budget".format(self.budget))
+            self.logger.debug("SDK overhead of {:.2%} is over its budget of {:.2%}, slowing down {}x".format(
+                overhead, self.budget, self.slowdown))
+        elif overhead < self.budget * RECOVERY_FRACTION and self.slowdown > 1:
+            self.slowdown //= 2
+            self.logger.debug("SDK overhead of {:.2%} is under its budget of {:.2%}, slowing down {}x".format(
+                overhead, self.budget, self.slowdown))
@@ -1,5 +1,6 @@
 # Python 2/3 compatibility
 from __future__ import absolute_import, division, print_function, unicode_literals
+from threading import Lock
 from threading import Thread
 
 import datetime
@@ -17,9 +18,16 @@ from .code_runner import CodeRunner
 from .constants import get_hyperdash_logs_home_path
 from .constants import get_hyperdash_logs_home_path_for_job
 from .constants import MAX_LOG_SIZE_BYTES
+from .governor import summarize_log
+from .log_limiter import DEFAULT_LOG_BYTES_PER_SECOND
+from .log_limiter import LOG_BURST_SECONDS
+from .log_limiter import LogLimiter
+from .log_limiter import TokenBucket
 from .sdk_message import create_run_started_message
 from .sdk_message import create_run_ended_message
 from .sdk_message import create_log_message
+from .terminal import TerminalCompactor
+from .timers import thread_cpu_time
 from .utils import human_readable_duration
 
 # Python 2/3 compatibility
@@ -28,6 +36,8 @@ __metaclass__ = type
 
 INFO_LEVEL = 'INFO'
 ERROR_LEVEL = 'ERROR'
+# Captured output is batched over this period before being sent to the server
+SERVER_CAPTURE_INTERVAL_SECONDS = 1
 
 
 class HyperDash:
@@ -47,6 +57,9 @@ class HyperDash:
         std_streams,
         parent_logger,
         runner,
+        output_stages=None,
+        governor=None,
+        log_bytes_per_second=DEFAULT_LOG_BYTES_PER_SECOND,
     ):
         """Initialize the HyperDash class.
 
@@ -57,6 +70,12 @@ class HyperDash:
             4) server_manager: ServerManager instance
             5) io_bufs: Tuple in the form of (StringIO(), StringIO(),)
             6) std_streams: Tuple in the form of (StdOut, StdErr)
+            7) output_stages: Optional tuple in the form of (stdout_stage, stderr_stage)
+               whose feed method is called with all new output as it's captured
+            8) governor: Optional OverheadGovernor which slows down sending output to the
+               server when the SDK is over its CPU budget
+            9) log_bytes_per_second: How many bytes of logs are uploaded per second on average,
+               repeated lines not included
         """
         self.job_name = job_name
         self.current_sdk_run_uuid = current_sdk_run_uuid
@@ -64,6 +83,8 @@ class HyperDash:
         self.server_manager = server_manager
         self.out_buf, self.err_buf = io_bufs
         self.std_out, self.std_err = std_streams
+        self.out_stage, self.err_stage = output_stages or (None, None)
+        self.governor = governor
         self.programmatic_exit = False
         self.shutdown_network_channel = Queue()
         self.shutdown_main_channel = Queue()
@@ -84,6 +105,14 @@ class HyperDash:
         # second period.
         self.server_out_buf_offset = 0
         self.server_err_buf_offset = 0
+        # Output is compacted to what it would look like in a terminal before
+        # it's sent to the server, e.g. only the final frame of progress bars
+        self.out_compactor = TerminalCompactor()
+        self.err_compactor = TerminalCompactor()
+        # Then repeated lines are collapsed and the rate logs are sent at limited
+        self.log_bucket = TokenBucket(log_bytes_per_second, log_bytes_per_second * LOG_BURST_SECONDS)
+        self.out_limiter = LogLimiter(self.log_bucket, self.server_manager.stats)
+        self.err_limiter = LogLimiter(self.log_bucket, self.server_manager.stats)
 
         self.time_since_last_server_capture = time.time()
 
@@ -108,6 +137,8 @@ class HyperDash:
         self.err_buf.set_on_flush(on_stderr_flush)
 
         self.logger = parent_logger.getChild(__name__)
+        # The log file is also written to by SDK threads (e.g. memory snapshots)
+        self.log_file_lock = Lock()
         self.log_file, self.log_file_path = self.open_log_file()
         if not self.log_file:
             self.logger.error(
@@ -147,8 +178,13 @@ class HyperDash:
     # Capture all IO for terminal/log file since we last checked
     def capture_io(self, force_server_capture=False):
         current_time = time.time()
+        # Includes encoding the captured logs into messages
+        started_cpu_time = thread_cpu_time()
+        server_capture_interval = SERVER_CAPTURE_INTERVAL_SECONDS
+        if self.governor:
+            server_capture_interval *= self.governor.slowdown
         should_send_to_server_manager = (
-            ((current_time - self.time_since_last_server_capture) > 1) or
+            ((current_time - self.time_since_last_server_capture) > server_capture_interval) or
             force_server_capture
         )
         if should_send_to_server_manager:
@@ -160,13 +196,16 @@ class HyperDash:
         len_out = len(out) - self.out_buf_offset
         if len_out != 0:
             self.print_out(out[self.out_buf_offset:])
+            if self.out_stage:
+                self.out_stage.feed(out[self.out_buf_offset:])
         self.out_buf_offset += len_out
         # Server
-        len_out_server = len(out) - self.server_out_buf_offset
-        if len_out_server != 0 and should_send_to_server_manager:
-            self.send_print_to_server_manager(
-                out[self.server_out_buf_offset:], INFO_LEVEL)
-            self.server_out_buf_offset += len_out_server
+        # Fed even when there's no new output, to send held back lines once they're due
+        if should_send_to_server_manager:
+            self.ship_to_server_manager(
+                self.out_buf.strip_local_only(out[self.server_out_buf_offset:], self.server_out_buf_offset),
+                self.out_compactor, self.out_limiter, INFO_LEVEL, current_time)
+            self.server_out_buf_offset = len(out)
         self.out_buf.release()
 
         self.err_buf.acquire()
@@ -175,14 +214,18 @@ class HyperDash:
         len_err = len(err) - self.err_buf_offset
         if len_err != 0:
             self.print_err(err[self.err_buf_offset:])
+            if self.err_stage:
+                self.err_stage.feed(err[self.err_buf_offset:])
         self.err_buf_offset += len_err
         # Server
-        len_err_server = len(err) - self.server_err_buf_offset
-        if len_err_server != 0 and should_send_to_server_manager:
-            self.send_print_to_server_manager(
-                err[self.server_err_buf_offset:], ERROR_LEVEL)
-            self.server_err_buf_offset += len_err_server
+        if should_send_to_server_manager:
+            self.ship_to_server_manager(
+                self.err_buf.strip_local_only(err[self.server_err_buf_offset:], self.server_err_buf_offset),
+                self.err_compactor, self.err_limiter, ERROR_LEVEL, current_time)
+            self.server_err_buf_offset = len(err)
         self.err_buf.release()
+        self.server_manager.stats.observe("capture_seconds", time.time() - current_time)
+        self.server_manager.stats.incr("capture_cpu_seconds", thread_cpu_time() - started_cpu_time)
 
     def print_out(self, s):
         self.std_out.write(s)
@@ -192,9 +235,14 @@ class HyperDash:
         self.std_err.write(s)
         self.write_to_log_file(s)
 
+    def ship_to_server_manager(self, s, compactor, limiter, level, current_time):
+        self.send_print_to_server_manager(limiter.feed(compactor.feed(s, current_time), current_time), level)
+
     # In the case that the amount of data is large, we chunk it into
     # several smaller messages
     def send_print_to_server_manager(self, s, level):
+        if self.governor and self.governor.should_summarize_logs():
+            s = summarize_log(s)
         offset = 0
         while offset < len(s):
             chunk_size = min(len(s) - offset, MAX_LOG_SIZE_BYTES)
@@ -205,18 +253,30 @@ class HyperDash:
 
     def write_to_log_file(self, s):
         if self.log_file:
-            if PY2:
-                self.log_file.write(s.encode("utf-8"))
-            else:
-                self.log_file.write(s)
+            with self.log_file_lock:
+                if PY2:
+                    self.log_file.write(s.encode("utf-8"))
+                else:
+                    self.log_file.write(s)
 
     def flush_log_file(self):
         if self.log_file:
-            self.log_file.flush()
+            with self.log_file_lock:
+                self.log_file.flush()
 
     def cleanup(self, exit_status):
         self.print_completion_message()
         self.capture_io(force_server_capture=True)
+        current_time = time.time()
+        for compactor, limiter, level in (
+            (self.out_compactor, self.out_limiter, INFO_LEVEL),
+            (self.err_compactor, self.err_limiter, ERROR_LEVEL),
+        ):
+            self.send_print_to_server_manager(
+                limiter.feed(compactor.flush(), current_time) + limiter.flush(), level)
+        for stage in (self.out_stage, self.err_stage):
+            if stage:
+                stage.flush()
         self.server_manager.put_buf(
             create_run_ended_message(self.current_sdk_run_uuid, exit_status),
         )
@@ -319,6 +379,8 @@ class HyperDash:
         while True:
             try:
                 self.capture_io()
+                if self.governor:
+                    self.governor.tick(time.time())
                 exited_cleanly, is_done = self.runner.is_done()
                 if is_done:
                     self.programmatic_exit = True
@@ -13,6 +13,8 @@ class IOBuffer:
         self.buf = StringIO()
         self.on_flush = on_flush
         self.lock = RLock()
+        # (start, end) offsets of what was written with write_local_only
+        self.local_only = []
 
     # Wrap the write method so the buffer can handle inputs other than strings
     # Otherwise it would fail with calls like: print(1) or print(<SOME_OBJECT>)
@@ -24,6 +26,38 @@ class IOBuffer:
                 return
             self.buf.write(input)
 
+    def write_local_only(self, input):
+        """Like write, but what's written is only shown and saved locally, not
+        sent to the server (see strip_local_only)."""
+        with self.lock:
+            start = self.buf.tell()
+            self.write(input)
+            self.local_only.append((start, self.buf.tell()))
+
+    def strip_local_only(self, text, start):
+        """Returns text, found at offset start of the buffer, without what was
+        written with write_local_only. Call with increasing offsets."""
+        with self.lock:
+            if not self.local_only:
+                return text
+            end = start + len(text)
+            pieces = []
+            pos = start
+            remaining = []
+            for local_start, local_end in self.local_only:
+                if local_end <= start:
+                    continue
+                if local_start >= end:
+                    remaining.append((local_start, local_end))
+                    continue
+                pieces.append(text[pos - start:max(local_start, pos) - start])
+                pos = min(local_end, end)
+                if local_end > end:
+                    remaining.append((end, local_end))
+            pieces.append(text[pos - start:])
+            self.local_only = remaining
+            return "".join(pieces)
+
     def getvalue(self):
         return self.buf.getvalue()
 
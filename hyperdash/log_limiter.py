@@ -0,0 +1,154 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from collections import deque
+from threading import Lock
+
+import six
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Log bytes uploaded per second per run, on average
+DEFAULT_LOG_BYTES_PER_SECOND = 100 * 1024
+# After a quiet period, this many seconds worth of logs can be uploaded at once
+LOG_BURST_SECONDS = 10
+# Repeats of a line within this period of its first occurrence are counted
+# instead of uploaded
+DEDUP_WINDOW_SECONDS = 10
+# Number of the most recent rate limited lines uploaded once the limit allows
+TAIL_SAMPLE_LINES = 5
+
+
+def _size(line):
+    return len(line.encode("utf-8")) if isinstance(line, six.text_type) else len(line)
+
+
+class TokenBucket:
+    """TokenBucket allows rate bytes per second on average, and bursts of up
+    to burst bytes. It can be shared by threads."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = None
+        self.lock = Lock()
+
+    def refill(self, current_time):
+        with self.lock:
+            if self.refilled_at is not None:
+                elapsed = max(0, current_time - self.refilled_at)
+                self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.refilled_at = max(current_time, self.refilled_at or current_time)
+
+    def take(self, n):
+        with self.lock:
+            if self.tokens < n:
+                return False
+            self.tokens -= n
+            return True
+
+    def spend(self, n):
+        """Take n tokens even if that leaves the bucket in debt."""
+        with self.lock:
+            self.tokens -= n
+
+
+class LogLimiter:
+    """LogLimiter keeps libraries that spam the same lines, or just a lot of
+    lines, from flooding the uploaded logs.
+
+    The first occurrence of a line is uploaded, and the repeats that
+    immediately follow it within DEDUP_WINDOW_SECONDS are only counted. As
+    soon as a different line arrives, or the window is over, they're
+    uploaded as the line followed by "(xN)", N being the number of repeats,
+    so uploaded lines stay in order.
+
+    Lines are then uploaded as long as the token bucket (shared by every
+    stream of a run) allows. Once it runs out, lines are only counted until
+    it has refilled, at which point a note of how many lines were left out
+    is uploaded, followed by the last TAIL_SAMPLE_LINES of them. The
+    beginning and end of a flood of output are uploaded that way.
+
+    Output is fed in as complete lines. The local log isn't limited.
+    """
+
+    def __init__(self, bucket, stats=None):
+        self.bucket = bucket
+        self.stats = stats
+        # The last line, when it was first seen and how many times it was
+        # repeated since
+        self.last_line = None
+        self.last_seen_at = None
+        self.repeats = 0
+        self.suppressed_lines = 0
+        self.suppressed_bytes = 0
+        self.tail = deque(maxlen=TAIL_SAMPLE_LINES)
+
+    def feed(self, s, current_time):
+        """Returns the lines of s which should be uploaded, which may be none."""
+        out = []
+        self.bucket.refill(current_time)
+        if self.suppressed_lines and self.bucket.tokens > 0:
+            self._write_suppressed(out)
+        if self.last_line is not None and current_time - self.last_seen_at >= DEDUP_WINDOW_SECONDS:
+            self._write_repeats(out)
+
+        lines = s.split("\n")
+        if not lines[-1]:
+            lines.pop()
+        for line in lines:
+            if line == self.last_line:
+                self.repeats += 1
+                if self.stats:
+                    self.stats.incr("log_lines_deduplicated")
+                continue
+            self._write_repeats(out)
+            # Blank lines are never counted as repeats
+            if line.strip():
+                self.last_line = line
+                self.last_seen_at = current_time
+            self._write(line, out)
+        return "".join(out)
+
+    def flush(self):
+        """Returns everything held back, once output has ended."""
+        out = []
+        self._write_repeats(out)
+        if self.suppressed_lines:
+            self._write_suppressed(out)
+        return "".join(out)
+
+    def _write_repeats(self, out):
+        if self.repeats:
+            self._write("{} (x{})".format(self.last_line, self.repeats), out)
+        self.last_line = None
+        self.repeats = 0
+
+    def _write(self, line, out):
+        n = _size(line) + 1
+        if not self.suppressed_lines and self.bucket.take(n):
+            out.append(line + "\n")
+            return
+        self.suppressed_lines += 1
+        self.suppressed_bytes += n
+        self.tail.append(line)
+        if self.stats:
+            self.stats.incr("log_lines_suppressed")
+
+    def _write_suppressed(self, out):
+        tail_bytes = sum(_size(line) + 1 for line in self.tail)
+        left_out = self.suppressed_lines - len(self.tail)
+        if left_out:
+            out.append(
+                "[... {} lines ({} bytes) left out by Hyperdash to stay under its log rate limit of "
+                "{} bytes/s, see the local log for the full output ...]\n".format(
+                    left_out, self.suppressed_bytes - tail_bytes, int(self.bucket.rate)))
+        out.extend(line + "\n" for line in self.tail)
+        # The tail is always uploaded, it's paid for by the next lines
+        self.bucket.spend(tail_bytes)
+        self.tail.clear()
+        self.suppressed_lines = 0
+        self.suppressed_bytes = 0
@@ -0,0 +1,219 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import logging
+import time
+
+from threading import Event
+from threading import Thread
+
+from six.moves.queue import Empty
+from six.moves.queue import Full
+from six.moves.queue import Queue
+
+from .log_limiter import _size
+from .sdk_message import create_log_record_message
+from .timers import thread_cpu_time
+
+try:
+    from logging.handlers import QueueHandler
+except ImportError:
+    # Python 2
+    class QueueHandler(logging.Handler):
+        def __init__(self, queue):
+            logging.Handler.__init__(self)
+            self.queue = queue
+
+        def enqueue(self, record):
+            self.queue.put_nowait(record)
+
+        def prepare(self, record):
+            return record
+
+        def emit(self, record):
+            try:
+                self.enqueue(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Records queued beyond this are dropped rather than blocking the application
+MAX_QUEUED_RECORDS = 10000
+# How often queued records are turned into messages
+DRAIN_INTERVAL_SECONDS = 0.5
+
+_formatter = logging.Formatter()
+
+
+class LogRecordHandler(QueueHandler):
+    """LogRecordHandler queues the parts of a record that are uploaded, and
+    never blocks: records are dropped (and counted) if the queue is full.
+
+    The message is interpolated right away, since its arguments could be
+    changed by the application afterwards, but it isn't formatted.
+    """
+
+    def __init__(self, queue, stats):
+        QueueHandler.__init__(self, queue)
+        self.stats = stats
+
+    def prepare(self, record):
+        body = record.getMessage()
+        if record.exc_info:
+            body = "{}\n{}".format(body, _formatter.formatException(record.exc_info))
+        if getattr(record, "stack_info", None):
+            body = "{}\n{}".format(body, record.stack_info)
+        return record.created, record.levelname, record.name, body
+
+    def enqueue(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            self.stats.incr("log_records_dropped")
+
+
+class _LocalOnlyStream:
+    """_LocalOnlyStream is put in place of the captured stream of a logging
+    handler, so what the handler prints isn't uploaded as text."""
+
+    def __init__(self, io_buf):
+        self.io_buf = io_buf
+
+    def write(self, s):
+        self.io_buf.write_local_only(s)
+
+    def __getattr__(self, name):
+        return getattr(self.io_buf, name)
+
+
+class LogRecordCapture:
+    """LogRecordCapture uploads the records of Python's logging module as
+    structured log messages, with their level, logger name and timestamp,
+    instead of as lines of text.
+
+    A LogRecordHandler is added to loggers (e.g. the root logger) and the
+    queued records are sent from a background thread, subject to the run's
+    log rate limit (bucket).
+
+    Handlers which print to the captured io_bufs, and only ever see records
+    that reach the captured loggers, have their stream wrapped: what they
+    print still shows up in the terminal and local log, but isn't uploaded
+    as text as well. Handlers added later to the captured loggers, or to
+    loggers created later, are wrapped within DRAIN_INTERVAL_SECONDS.
+    Everything else, like a logger that doesn't propagate to a captured one,
+    is uploaded as text as before.
+    """
+
+    def __init__(self, loggers, io_bufs, server_manager, sdk_run_uuid, bucket):
+        self.loggers = loggers
+        self.io_bufs = io_bufs
+        self.server_manager = server_manager
+        self.sdk_run_uuid = sdk_run_uuid
+        self.bucket = bucket
+        self.stats = server_manager.stats
+        self.queue = Queue(MAX_QUEUED_RECORDS)
+        self.handler = LogRecordHandler(self.queue, self.stats)
+        # Handlers whose stream was wrapped, and their original stream
+        self.wrapped = []
+        # Number of loggers when handlers were last wrapped
+        self.num_loggers = None
+        self.shutdown = Event()
+        self.thread = Thread(target=self._loop, name="hyperdash-logging")
+        self.thread.daemon = True
+
+    def start(self):
+        for logger in self.loggers:
+            logger.addHandler(self.handler)
+        self.wrap_handlers(force=True)
+        self.thread.start()
+
+    def stop(self):
+        for logger in self.loggers:
+            logger.removeHandler(self.handler)
+        self.shutdown.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.drain()
+        self._unwrap_handlers()
+
+    def wrap_handlers(self, force=False):
+        """Wraps the streams of handlers of captured records which print to
+        one of the io_bufs.
+
+        Walking every logger gets expensive with many of them, so only the
+        captured loggers are looked at unless loggers were created since the
+        last call, or force is True.
+        """
+        logger_dict = logging.Logger.manager.loggerDict
+        if force or len(logger_dict) != self.num_loggers:
+            self.num_loggers = len(logger_dict)
+            loggers = [logging.getLogger()] + [
+                logger for logger in list(logger_dict.values())
+                if isinstance(logger, logging.Logger)
+            ]
+        else:
+            loggers = self.loggers
+        for logger in loggers:
+            if not self._is_captured(logger):
+                continue
+            for handler in list(logger.handlers):
+                stream = getattr(handler, "stream", None)
+                if not any(stream is io_buf for io_buf in self.io_bufs):
+                    continue
+                handler.acquire()
+                try:
+                    handler.stream = _LocalOnlyStream(stream)
+                finally:
+                    handler.release()
+                self.wrapped.append((handler, stream))
+
+    def _is_captured(self, logger):
+        # Every record a handler of logger sees also reaches a captured logger
+        while logger is not None:
+            if logger in self.loggers:
+                return True
+            if not logger.propagate:
+                return False
+            logger = logger.parent
+        return False
+
+    def _unwrap_handlers(self):
+        for handler, stream in self.wrapped:
+            handler.acquire()
+            try:
+                if isinstance(handler.stream, _LocalOnlyStream):
+                    handler.stream = stream
+            finally:
+                handler.release()
+        self.wrapped = []
+
+    def drain(self):
+        started_cpu_time = thread_cpu_time()
+        self.bucket.refill(time.time())
+        left_out = 0
+        while True:
+            try:
+                created, level, name, body = self.queue.get_nowait()
+            except Empty:
+                break
+            if not self.bucket.take(_size(body) + _size(name)):
+                left_out += 1
+                continue
+            self.server_manager.put_buf(
+                create_log_record_message(self.sdk_run_uuid, level, body, name, created))
+        if left_out:
+            self.stats.incr("log_lines_suppressed", left_out)
+            self.server_manager.put_buf(create_log_record_message(
+                self.sdk_run_uuid, "WARNING",
+                "[... {} log records left out by Hyperdash to stay under its log rate limit ...]".format(left_out),
+                "hyperdash", time.time(),
+            ))
+        self.stats.incr("encode_cpu_seconds", thread_cpu_time() - started_cpu_time)
+
+    def _loop(self):
+        while not self.shutdown.wait(DRAIN_INTERVAL_SECONDS):
+            self.wrap_handlers()
+            self.drain()
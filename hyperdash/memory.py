@@ -0,0 +1,122 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import time
+
+from threading import Event
+from threading import Thread
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Number of allocation sites reported in each diff
+DEFAULT_TOP_N = 10
+# Frames kept per allocation. Every extra frame makes tracing slower and
+# uses more memory, and the allocating line is usually enough to find a leak.
+DEFAULT_TRACEBACK_FRAMES = 1
+
+
+def is_supported():
+    return tracemalloc is not None
+
+
+def _format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return "{:.1f} {}".format(size, unit)
+        size /= 1024.0
+    return "{:.1f} GiB".format(size)
+
+
+class MemorySnapshotter:
+    """MemorySnapshotter looks for memory leaks by periodically taking
+    tracemalloc snapshots from a background thread.
+
+    Every interval seconds the traced memory is recorded as internal metrics,
+    and the top_n allocation sites whose memory grew the most since the
+    previous snapshot are written to the local log with write_log.
+
+    tracemalloc is started if it isn't already, and stopped again when the
+    snapshotter is stopped.
+    """
+
+    def __init__(self, client, write_log, interval, top_n=DEFAULT_TOP_N, frames=DEFAULT_TRACEBACK_FRAMES):
+        self.client = client
+        self.write_log = write_log
+        self.interval = interval
+        self.top_n = top_n
+        self.frames = frames
+        self.started_tracing = False
+        self.previous = None
+        # Don't count tracemalloc's own allocations
+        self.filters = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+        self.shutdown = Event()
+        self.thread = Thread(target=self._loop, name="hyperdash-memory")
+        self.thread.daemon = True
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started_tracing = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.previous = None
+        if self.started_tracing:
+            tracemalloc.stop()
+
+    def snapshot(self):
+        now = time.time()
+        current, peak = tracemalloc.get_traced_memory()
+        frequency = max(1.0, 1.0 / self.interval)
+        self.client._metric(
+            "hd_traced_memory_bytes", now, current, log=False, is_internal=True,
+            sample_frequency_per_second=frequency)
+        self.client._metric(
+            "hd_traced_memory_peak_bytes", now, peak, log=False, is_internal=True,
+            sample_frequency_per_second=frequency)
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(self.filters)
+        previous, self.previous = self.previous, snapshot
+        if previous is None:
+            return
+        key_type = "lineno" if self.frames == 1 else "traceback"
+        grown = [
+            stat for stat in snapshot.compare_to(previous, key_type)[:self.top_n]
+            if stat.size_diff > 0
+        ]
+        if not grown:
+            return
+        lines = ["Top memory growth since the previous snapshot (traced: {}, peak: {}):".format(
+            _format_size(current), _format_size(peak))]
+        for stat in grown:
+            lines.append("  +{} (+{} blocks), {} total: {}".format(
+                _format_size(stat.size_diff), stat.count_diff, _format_size(stat.size),
+                " <- ".join(str(frame) for frame in reversed(stat.traceback)),
+            ))
+        self.write_log("\n".join(lines) + "\n")
+
+    def _loop(self):
+        # The first snapshot is the baseline the next one is compared to
+        while True:
+            try:
+                self.snapshot()
+            except Exception as e:
+                # Diagnostics must never take down the job they're diagnosing
+                self.client.logger.debug("Unable to take memory snapshot: {}".format(e))
+            if self.shutdown.wait(self.interval):
+                return
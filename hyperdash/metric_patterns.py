@@ -0,0 +1,127 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import math
+import re
+import time
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Named groups of the user's patterns, and references to them
+_GROUP_RE = re.compile(r"\(\?P(<|=)([A-Za-z_][A-Za-z0-9_]*)")
+# References to numbered groups, which would refer to other groups once the
+# patterns are combined
+_NUMBERED_REFERENCE_RE = re.compile(r"\\[1-9]|\(\?\(\d")
+# Flags of a pattern without inline global flags like (?i)
+_DEFAULT_FLAGS = re.compile("", re.MULTILINE).flags
+
+
+class MetricPatterns:
+    """MetricPatterns extracts metrics from lines of output using regexes
+    whose named groups are metric names, like `loss=(?P<loss>[0-9.e+-]+)`.
+
+    When possible, all of the patterns are combined into a single
+    precompiled regex, which is only used to find the lines where some
+    pattern matches, so output without metrics is scanned once no matter how
+    many patterns there are. Patterns with inline global flags like (?i) or
+    references to numbered groups would change meaning once combined, so
+    with those every line is matched against every pattern instead. Either
+    way, each pattern is matched on its own against the lines, so patterns
+    can overlap. Raises ValueError if a pattern is invalid or has no named
+    groups.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = []
+        alternatives = []
+        combinable = True
+        for i, pattern in enumerate(patterns):
+            try:
+                compiled = re.compile(pattern, re.MULTILINE)
+            except re.error as e:
+                raise ValueError("Invalid metric pattern {}: {}".format(pattern, e))
+            if not compiled.groupindex:
+                raise ValueError(
+                    "Metric pattern {} has no named groups, use (?P<metric_name>...) to capture metrics".format(pattern))
+            self.patterns.append(compiled)
+            if compiled.flags != _DEFAULT_FLAGS or _NUMBERED_REFERENCE_RE.search(pattern):
+                combinable = False
+            # Group names have to be unique in the combined regex
+            alternatives.append("(?:{})".format(
+                _GROUP_RE.sub(lambda match: "(?P{}p{}_{}".format(match.group(1), i, match.group(2)), pattern)))
+        self.regex = None
+        if combinable:
+            try:
+                self.regex = re.compile("|".join(alternatives), re.MULTILINE)
+            except re.error:
+                pass
+
+    def findall(self, text):
+        """Yields (name, value) for every metric in text."""
+        for line in self._candidate_lines(text):
+            for pattern in self.patterns:
+                for match in pattern.finditer(line):
+                    for name, raw_value in match.groupdict().items():
+                        if raw_value is None:
+                            continue
+                        try:
+                            value = float(raw_value)
+                        except ValueError:
+                            continue
+                        if math.isnan(value) or math.isinf(value):
+                            continue
+                        yield name, value
+
+    def _candidate_lines(self, text):
+        """Yields the lines of text where some pattern may match."""
+        if self.regex is None:
+            for line in text.split("\n"):
+                yield line
+            return
+        pos = 0
+        while pos <= len(text):
+            hit = self.regex.search(text, pos)
+            if hit is None:
+                return
+            start = text.rfind("\n", 0, hit.start()) + 1
+            end = text.find("\n", hit.start())
+            if end == -1:
+                end = len(text)
+            yield text[start:end]
+            pos = end + 1
+
+
+class MetricExtractor:
+    """MetricExtractor is a streaming stage that records the metrics found in
+    a stream of output as it's captured.
+
+    Output can arrive in arbitrary chunks, so only complete lines are
+    matched and the rest is kept until its line is finished.
+    """
+
+    def __init__(self, patterns, client):
+        self.patterns = patterns
+        self.client = client
+        self.partial = ""
+
+    def feed(self, s):
+        end = s.rfind("\n")
+        if end == -1:
+            self.partial += s
+            return
+        text = self.partial + s[:end]
+        self.partial = s[end + 1:]
+        self._record(text)
+
+    def flush(self):
+        """Match whatever is left once the stream has ended."""
+        text, self.partial = self.partial, ""
+        if text:
+            self._record(text)
+
+    def _record(self, text):
+        current_time = time.time()
+        for name, value in self.patterns.findall(text):
+            self.client._metric(name, current_time, value, log=False)
@@ -9,7 +9,8 @@ from .code_runner import CodeRunner
 from .constants import API_NAME_MONITOR
 from .hyper_dash import HyperDash
 from .io_buffer import IOBuffer
-from .server_manager import ServerManagerHTTP
+from .metric_patterns import MetricExtractor
+from .server_manager import create_server_manager
 from .utils import get_logger
 
 
@@ -17,7 +18,7 @@ def monitor(model_name, api_key_getter=None, capture_io=True):
     return _monitor(model_name, api_key_getter, capture_io, API_NAME_MONITOR)
 
 
-def _monitor(model_name, api_key_getter, capture_io, api_name):
+def _monitor(model_name, api_key_getter, capture_io, api_name, metric_patterns=None):
     def _monitor(f):
         def monitored(*args, **kwargs):
             # Create a UUID to uniquely identify this run from the SDK's point of view
@@ -43,9 +44,16 @@ def _monitor(model_name, api_key_getter, capture_io, api_name):
             else:
                 f.callcount += 1
             try:
-                server_manager = ServerManagerHTTP(api_key_getter, logger, api_name)
+                server_manager = create_server_manager(api_key_getter, logger, api_name)
                 hd_client = HDClient(logger, server_manager, current_sdk_run_uuid)
                 code_runner = CodeRunner(f, hd_client, logger, *args, **kwargs)
+                output_stages = None
+                if metric_patterns:
+                    # Record metrics printed by code that can't use the SDK
+                    output_stages = (
+                        MetricExtractor(metric_patterns, hd_client),
+                        MetricExtractor(metric_patterns, hd_client),
+                    )
                 hyper_dash = HyperDash(
                     model_name,
                     current_sdk_run_uuid,
@@ -54,6 +62,7 @@ def _monitor(model_name, api_key_getter, capture_io, api_name):
                     (old_out, old_err,),
                     logger,
                     code_runner,
+                    output_stages,
                 )
                 return_val = hyper_dash.run()
                 f.callcount -= 1
@@ -0,0 +1,101 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import numbers
+import os
+
+import six
+from six.moves import configparser
+
+from .encoder import dumps
+from .encoder import is_numpy
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+DEFAULT_SEPARATOR = "."
+
+# Types that are always JSON serializable, checked before falling back to a
+# trial serialization so that the common case stays cheap
+_JSON_SCALAR_TYPES = six.string_types + six.integer_types + (float, bool, type(None))
+
+
+def coerce_param_value(val):
+    """Make sure a hyperparameter value is JSON serializable."""
+    # NumPy numbers and arrays are handled natively by the encoder
+    if isinstance(val, _JSON_SCALAR_TYPES) or is_numpy(val):
+        return val
+    try:
+        dumps(val)
+        return val
+    except (TypeError, ValueError):
+        # If its not, see if its a number
+        if isinstance(val, numbers.Real):
+            return float(val)
+        # Otherwise, just convert it to a string
+        return str(val)
+
+
+def flatten_params(params, separator=DEFAULT_SEPARATOR):
+    """Flatten nested hyperparameters into a single level dict.
+
+    params can be a (nested) mapping or an object with attributes such as an
+    argparse.Namespace. Nested keys are joined with separator, I.E
+    {"optimizer": {"lr": 0.1}} becomes {"optimizer.lr": 0.1}. Raises
+    ValueError if keys collide once flattened, like "optimizer.lr" and
+    {"optimizer": {"lr": ...}}.
+    """
+    flat = {}
+    _flatten_into(flat, _as_mapping(params), "", separator)
+    return flat
+
+
+def _as_mapping(params):
+    if isinstance(params, Mapping):
+        return params
+    if hasattr(params, "__dict__"):
+        return vars(params)
+    raise TypeError("params must be a mapping or an object with attributes, not {}".format(
+        type(params).__name__))
+
+
+def _flatten_into(flat, params, prefix, separator):
+    for key, val in params.items():
+        name = "{}{}".format(prefix, key)
+        if isinstance(val, Mapping):
+            _flatten_into(flat, val, name + separator, separator)
+        else:
+            if name in flat:
+                raise ValueError("Hyperparameter {} is set more than once after joining nested keys with {}".format(
+                    name, separator))
+            flat[name] = coerce_param_value(val)
+
+
+def load_params_file(path):
+    """Load hyperparameters from a JSON, YAML or INI config file."""
+    _, ext = os.path.splitext(path)
+    ext = ext.lower()
+    with open(path, "r") as f:
+        if ext == ".json":
+            return json.load(f)
+        if ext in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Loading params from YAML files requires PyYAML to be installed.")
+            return yaml.safe_load(f) or {}
+        if ext in (".ini", ".cfg"):
+            parser = configparser.ConfigParser()
+            if six.PY2:
+                parser.readfp(f)
+            else:
+                parser.read_file(f)
+            return dict(
+                (section, dict(parser.items(section)))
+                for section in parser.sections()
+            )
+    raise ValueError("Unsupported config file type {}, expected .json, .yaml, .yml, .ini or .cfg".format(ext))
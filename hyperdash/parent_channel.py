@@ -0,0 +1,145 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+from .constants import PARENT_SOCKET_ENV_VAR
+from .encoder import dumps
+from .sdk_message import TYPE_ENDED
+from .sdk_message import TYPE_HEARTBEAT
+from .sdk_message import TYPE_LOG
+from .sdk_message import TYPE_STARTED
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# The parent owns the run and already captures the child's output, so these
+# messages from the child are dropped
+IGNORED_CHILD_MESSAGE_TYPES = frozenset([TYPE_STARTED, TYPE_ENDED, TYPE_HEARTBEAT, TYPE_LOG])
+# How long close waits for children to finish sending their messages
+CLOSE_TIMEOUT_SECONDS = 5
+# How often the accept thread checks whether it should stop
+POLL_INTERVAL_SECONDS = 0.5
+
+
+def get_parent_socket_path(environ=None):
+    """Returns the socket that an `hd run` we were launched by is listening
+    on, or None.
+    """
+    environ = os.environ if environ is None else environ
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    return environ.get(PARENT_SOCKET_ENV_VAR) or None
+
+
+class ParentChannel:
+    """ParentChannel lets processes launched by `hd run` record metrics and
+    params in the run it created instead of creating runs of their own.
+
+    It listens on a Unix socket whose path is exported to the child in
+    PARENT_SOCKET_ENV_VAR. Children (see ServerManagerParent) write their SDK
+    messages to it as newline delimited JSON, and they're added to our
+    server manager's buffer as messages of our run.
+    """
+
+    def __init__(self, server_manager, sdk_run_uuid, parent_logger):
+        self.server_manager = server_manager
+        self.sdk_run_uuid = sdk_run_uuid
+        self.logger = parent_logger.getChild(__name__)
+        self.tmp_dir = None
+        self.path = None
+        self.server = None
+        self.shutdown = Event()
+        self.accept_thread = None
+        self.threads = []
+        self.threads_lock = Lock()
+
+    def start(self):
+        """Start listening, returns whether children will be able to connect."""
+        if not hasattr(socket, "AF_UNIX"):
+            return False
+        # Only we can connect to a socket in a directory only we can access
+        self.tmp_dir = tempfile.mkdtemp(prefix="hyperdash-")
+        self.path = os.path.join(self.tmp_dir, "parent.sock")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self.path)
+            server.listen(8)
+            server.settimeout(POLL_INTERVAL_SECONDS)
+        except socket.error as e:
+            server.close()
+            self.logger.debug("Unable to listen on {}: {}".format(self.path, e))
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+            return False
+        self.server = server
+        self.accept_thread = self._start_thread(self._accept_loop)
+        return True
+
+    def close(self):
+        """Stop accepting children and wait for the connected ones to finish
+        (at most CLOSE_TIMEOUT_SECONDS)."""
+        self.shutdown.set()
+        deadline = time.time() + CLOSE_TIMEOUT_SECONDS
+        # Closing the socket from another thread doesn't wake up accept, the
+        # accept thread notices the shutdown and closes it instead
+        if self.accept_thread:
+            self.accept_thread.join(max(0, deadline - time.time()))
+        with self.threads_lock:
+            threads = list(self.threads)
+        for thread in threads:
+            thread.join(max(0, deadline - time.time()))
+        if self.tmp_dir:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _start_thread(self, target, *args):
+        thread = Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _accept_loop(self):
+        # Children already waiting are still accepted after shutdown
+        try:
+            while True:
+                try:
+                    conn, _ = self.server.accept()
+                except socket.timeout:
+                    if self.shutdown.is_set():
+                        return
+                    continue
+                except socket.error:
+                    return
+                conn.settimeout(None)
+                with self.threads_lock:
+                    self.threads.append(self._start_thread(self._read_loop, conn))
+        finally:
+            self.server.close()
+
+    def _read_loop(self, conn):
+        stream = conn.makefile("rb")
+        try:
+            for line in stream:
+                try:
+                    message = json.loads(line.decode("utf-8"))
+                    if message["type"] in IGNORED_CHILD_MESSAGE_TYPES:
+                        continue
+                except (ValueError, KeyError, TypeError):
+                    self.logger.debug("Dropping malformed message from child: {}".format(line))
+                    continue
+                message["sdk_run_uuid"] = self.sdk_run_uuid
+                self.server_manager.put_buf(dumps(message))
+        except socket.error:
+            pass
+        finally:
+            stream.close()
+            conn.close()
@@ -0,0 +1,105 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import os
+import sys
+import threading
+import time
+
+from datetime import datetime
+
+from threading import Event
+from threading import Thread
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Length of the window each folded profile covers
+PROFILE_WINDOW_SECONDS = 60
+
+
+class StackSampler:
+    """StackSampler is a sampling profiler for every thread of the process,
+    SDK threads included.
+
+    profile_hz times a second a background thread grabs the stack of every
+    other thread with sys._current_frames() and counts it in collapsed
+    ("folded") form, `thread;outermost function;...;innermost function`.
+    Every PROFILE_WINDOW_SECONDS the counts are written to a file in
+    directory that can be turned into a flamegraph with flamegraph.pl or
+    speedscope, and a new window is started.
+    """
+
+    def __init__(self, directory, profile_hz, logger):
+        if not profile_hz > 0:
+            raise ValueError("profile_hz must be greater than 0, got {}".format(profile_hz))
+        self.directory = directory
+        self.interval = 1.0 / profile_hz
+        self.logger = logger
+        self.counts = {}
+        self.window_start = None
+        # Labels of the code objects seen so far, formatting them is most of
+        # the cost of a sample
+        self.labels = {}
+        self.shutdown = Event()
+        self.thread = Thread(target=self._loop, name="hyperdash-profiler")
+        self.thread.daemon = True
+
+    def start(self):
+        self.window_start = time.time()
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self._write_window()
+
+    def sample(self):
+        own_ident = self.thread.ident
+        thread_names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+        labels = self.labels
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = "{} ({}:{})".format(
+                        code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+                stack.append(label)
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, "thread-{}".format(ident)).replace(";", ":"))
+            stack.reverse()
+            folded = ";".join(stack)
+            self.counts[folded] = self.counts.get(folded, 0) + 1
+
+    def _loop(self):
+        while not self.shutdown.wait(self.interval):
+            try:
+                self.sample()
+                if time.time() - self.window_start >= PROFILE_WINDOW_SECONDS:
+                    self._write_window()
+            except Exception as e:
+                # Profiling must never take down the job it's profiling
+                self.logger.debug("Unable to sample stacks: {}".format(e))
+
+    def _write_window(self):
+        counts, self.counts = self.counts, {}
+        window_start, self.window_start = self.window_start, time.time()
+        if not counts:
+            return
+        path = os.path.join(self.directory, "{}.folded".format(
+            datetime.fromtimestamp(window_start).strftime("%Y%m%dT%H%M%S")))
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            with io.open(path, "w", encoding="utf-8") as f:
+                for stack, count in sorted(counts.items()):
+                    f.write("{} {}\n".format(stack, count))
+        except (IOError, OSError) as e:
+            self.logger.error("Unable to write profile to {}: {}".format(path, e))
@@ -1,14 +1,17 @@
-import json
 import time
 import uuid
 
+from . import encoder
+
 
 TYPE_LOG = 'log'
 TYPE_STARTED = 'run_started'
 TYPE_ENDED = 'run_ended'
 TYPE_HEARTBEAT = 'heartbeat'
 TYPE_METRIC = 'metric'
+TYPE_METRIC_SERIES = 'metric_series'
 TYPE_PARAM = 'param'
+TYPE_DISTRIBUTION = 'distribution'
 
 
 def create_metric_message(sdk_run_uuid, name, timestamp, value, is_internal):
@@ -28,6 +31,37 @@ def create_metric_message(sdk_run_uuid, name, timestamp, value, is_internal):
     )
 
 
+def create_metric_series_message(sdk_run_uuid, name, timestamps, values, is_internal):
+    return create_sdk_message(
+        sdk_run_uuid,
+        TYPE_METRIC_SERIES,
+        {
+            'name': name,
+            # Many datapoints of the same metric at once, like when backfilling
+            # historical data. timestamps[i] is when values[i] was emitted.
+            'timestamps': [int(timestamp * 1000) for timestamp in timestamps],
+            'values': values,
+            'is_internal': is_internal,
+        }
+    )
+
+
+def create_distribution_message(sdk_run_uuid, name, timestamp, distribution, is_internal):
+    return create_sdk_message(
+        sdk_run_uuid,
+        TYPE_DISTRIBUTION,
+        {
+            'name': name,
+            # Timestamp of the end of the window the distribution summarizes
+            'timestamp': int(timestamp * 1000),
+            # Compact summary (quantiles and sketch buckets) as produced by
+            # DDSketch.to_dict, raw values are never sent.
+            'distribution': distribution,
+            'is_internal': is_internal,
+        }
+    )
+
+
 def create_param_message(sdk_run_uuid, params, is_internal):
     return create_sdk_message(
         sdk_run_uuid,
@@ -51,6 +85,21 @@ def create_log_message(sdk_run_uuid, level, body):
     )
 
 
+def create_log_record_message(sdk_run_uuid, level, body, logger_name, timestamp):
+    return create_sdk_message(
+        sdk_run_uuid,
+        TYPE_LOG,
+        {
+            'uuid': str(uuid.uuid4()),
+            'level': level,
+            'body': body,
+            # Captured from a logging record rather than from STDOUT/STDERR
+            'logger': logger_name,
+            'timestamp': int(timestamp * 1000),
+        }
+    )
+
+
 def create_run_started_message(sdk_run_uuid, job_name):
     return create_sdk_message(
         sdk_run_uuid,
@@ -75,7 +124,7 @@ def create_heartbeat_message(sdk_run_uuid):
 
 def create_sdk_message(sdk_run_uuid, type_str, payload):
     """Create a structured message for the server."""
-    return json.dumps({
+    return encoder.dumps({
         'type': type_str,
         'timestamp': int(time.time() * 1000),
         'sdk_run_uuid': sdk_run_uuid,
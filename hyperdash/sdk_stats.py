@@ -0,0 +1,73 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from threading import Lock
+
+from .sketch import DDSketch
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Quantiles of each histogram included in a snapshot
+STATS_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class SDKStats:
+    """SDKStats keeps counters and histograms about the SDK itself (how far
+    behind it is, how long requests take, how much it sends) so that its
+    health can be watched like any other signal.
+
+    Histograms are DDSketches, so recording a value costs a dict update and
+    the memory used doesn't grow with the number of values.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        with self.lock:
+            sketch = self.histograms.get(name)
+            if sketch is None:
+                sketch = self.histograms[name] = DDSketch()
+            sketch.add(value)
+
+    def counter(self, name):
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    def snapshot(self):
+        """Return the counters as numbers and the histograms as dicts of
+        count, sum, max and quantiles (p50, p90 and p99)."""
+        with self.lock:
+            snapshot = dict(self.counters)
+            for name, sketch in self.histograms.items():
+                summary = {
+                    "count": sketch.count,
+                    "sum": sketch.sum,
+                    "max": sketch.max,
+                }
+                for q in STATS_QUANTILES:
+                    summary["p{:g}".format(q * 100)] = sketch.quantile(q)
+                snapshot[name] = summary
+        return snapshot
+
+
+def flatten_stats(snapshot, prefix="hd_sdk_"):
+    """Flatten a snapshot into {metric name: value}, e.g. the p99 of the
+    request_seconds histogram becomes hd_sdk_request_seconds_p99."""
+    flat = {}
+    for name, value in snapshot.items():
+        if isinstance(value, dict):
+            for key, v in value.items():
+                if v is not None:
+                    flat["{}{}_{}".format(prefix, name, key)] = v
+        elif value is not None:
+            flat["{}{}".format(prefix, name)] = value
+    return flat
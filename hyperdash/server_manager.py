@@ -3,6 +3,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import json
 import os
+import socket
 import sys
 import time
 
@@ -20,6 +21,9 @@ from .constants import get_hyperdash_json_paths
 from .constants import get_http_url
 from .constants import get_hyperdash_version
 from .constants import VERSION_KEY_NAME
+from .parent_channel import get_parent_socket_path
+from .sdk_stats import SDKStats
+from .timers import thread_cpu_time
 from .sdk_message import create_heartbeat_message
 
 
@@ -27,10 +31,24 @@ from .sdk_message import create_heartbeat_message
 __metaclass__ = type
 
 
+def create_server_manager(custom_api_key_getter, parent_logger, api_name):
+    """Returns a ServerManagerParent if we were launched by an `hd run` that
+    we can reach, and a ServerManagerHTTP otherwise.
+    """
+    socket_path = get_parent_socket_path()
+    if socket_path:
+        server_manager = ServerManagerParent(custom_api_key_getter, parent_logger, api_name, socket_path)
+        if server_manager.connect():
+            return server_manager
+    return ServerManagerHTTP(custom_api_key_getter, parent_logger, api_name)
+
+
 class ServerManagerBase():
     # TODO: Check type
     def put_buf(self, m):
-        self.out_buf.append(m)
+        # Messages are queued with the time they were queued at, to measure
+        # how far behind the server manager is
+        self.out_buf.append((m, time.time()))
 
     def tick(self, sdk_run_uuid):
         raise NotImplementedError()
@@ -112,8 +130,20 @@ class ServerManagerBase():
     def cleanup(self, sdk_run_uuid):
         raise NotImplementedError()
 
+    def get_stats(self):
+        """Snapshot of the SDK's stats, including how many messages are waiting
+        to be sent and how long the oldest of them has been waiting."""
+        snapshot = self.stats.snapshot()
+        snapshot["queue_depth"] = len(self.out_buf)
+        try:
+            snapshot["queue_oldest_seconds"] = time.time() - self.out_buf[0][1]
+        except IndexError:
+            snapshot["queue_oldest_seconds"] = 0.0
+        return snapshot
+
     def __init__(self, custom_api_key_getter, parent_logger, api_name):
         self.out_buf = deque()
+        self.stats = SDKStats()
         self.in_buf = deque()
         self.logger = parent_logger.getChild(__name__)
         self.custom_api_key_getter = custom_api_key_getter
@@ -129,29 +159,34 @@ class ServerManagerBase():
 class ServerManagerHTTP(ServerManagerBase):
 
     def tick(self, sdk_run_uuid):
+        return self.tick_runs((sdk_run_uuid,))
+
+    def tick_runs(self, sdk_run_uuids):
+        """Like tick, but for several runs that share this server manager."""
         if self.unauthorized:
             return False
 
         # If there are no messages to be sent, check if we
         # need to send a heartbeat
         if self.should_send_heartbeat():
-            try:
-                self.send_message(create_heartbeat_message(sdk_run_uuid))
-            except BaseHTTPError as e:
-                self.log_error_once(
-                    "Unable to send heartbeat due to connection issues: {}".format(
-                        e),
-                )
-                return False
-            except Exception as e:
-                self.logger.debug(e)
-                self.log_error_once("Unable to send heartbeat message")
-                return False
+            for sdk_run_uuid in sdk_run_uuids:
+                try:
+                    self.send_message(create_heartbeat_message(sdk_run_uuid))
+                except BaseHTTPError as e:
+                    self.log_error_once(
+                        "Unable to send heartbeat due to connection issues: {}".format(
+                            e),
+                    )
+                    return False
+                except Exception as e:
+                    self.logger.debug(e)
+                    self.log_error_once("Unable to send heartbeat message")
+                    return False
 
         # TODO: Move while loop out of tick function
         while True:
             try:
-                message = self.out_buf.popleft()
+                message, queued_at = self.out_buf.popleft()
             # Empty
             except IndexError:
                 # Clean exit
@@ -173,8 +208,11 @@ class ServerManagerHTTP(ServerManagerBase):
                     # retrying.
                     if res.status_code == 400:
                         is_poison_pill = True
+                        self.stats.incr("poison_pills")
                 else:
                     sent_successfully = True
+                    self.stats.incr("messages_sent")
+                    self.stats.observe("queue_wait_seconds", time.time() - queued_at)
             except BaseHTTPError as e:
                 self.log_error_once(
                     "Unable to send message due to connection issues: {}".format(
@@ -187,26 +225,38 @@ class ServerManagerHTTP(ServerManagerBase):
 
             if sent_successfully is not True and not is_poison_pill:
                 # Re-enque so message is not lost
-                self.out_buf.appendleft(message)
+                self.out_buf.appendleft((message, queued_at))
+                self.stats.incr("retries")
                 return False
 
     def send_message(self, message, raise_exceptions=True, timeout_seconds=5):
+        # Messages are already encoded, send them as is instead of
+        # decoding them just so requests can encode them again
+        started_cpu_time = thread_cpu_time()
+        data = message.encode("utf-8")
+        started_at = time.time()
         try:
-            return self.s.post(
+            res = self.s.post(
                 get_http_url(),
-                json=json.loads(message),
+                data=data,
                 headers={
+                    "Content-Type": "application/json",
                     AUTH_KEY_NAME: self.get_api_key(),
                     VERSION_KEY_NAME: self.version,
                     API_KEY_NAME: self.api_name,
                 },
                 timeout=timeout_seconds,
             )
+            self.stats.observe("request_seconds", time.time() - started_at)
+            self.stats.incr("bytes_sent", len(data))
+            return res
         except Exception:
+            self.stats.incr("request_errors")
             if raise_exceptions:
                 raise
         finally:
             self.last_message_sent_at = time.time()
+            self.stats.incr("request_cpu_seconds", thread_cpu_time() - started_cpu_time)
 
     def cleanup(self, sdk_run_uuid):
         # Try to flush any remaining messages
@@ -217,3 +267,90 @@ class ServerManagerHTTP(ServerManagerBase):
         # TODO: Keep alive
         # TODO: Timeout
         self.s = HTTPSession()
+
+
+class ServerManagerLocal(ServerManagerBase):
+    """ServerManagerLocal discards every message instead of sending it.
+
+    Used by processes that should not create a run of their own, like the
+    non-zero ranks of a distributed job which forward their metrics to rank 0.
+    """
+
+    def put_buf(self, m):
+        pass
+
+    def tick(self, sdk_run_uuid):
+        return True
+
+    def send_message(self, message, raise_exceptions=True, **kwargs):
+        return None
+
+    def cleanup(self, sdk_run_uuid):
+        return True
+
+
+class ServerManagerParent(ServerManagerBase):
+    """ServerManagerParent sends every message to the `hd run` that launched
+    us (see ParentChannel) instead of the Hyperdash server, so that our
+    metrics and params are recorded in its run.
+    """
+
+    def __init__(self, custom_api_key_getter, parent_logger, api_name, socket_path):
+        ServerManagerBase.__init__(self, custom_api_key_getter, parent_logger, api_name)
+        self.socket_path = socket_path
+        self.conn = None
+
+    def connect(self):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(5)
+        try:
+            conn.connect(self.socket_path)
+        except socket.error as e:
+            conn.close()
+            self.logger.debug("Unable to connect to parent at {}: {}".format(self.socket_path, e))
+            return False
+        self.conn = conn
+        return True
+
+    def tick(self, sdk_run_uuid):
+        queued = []
+        while True:
+            try:
+                queued.append(self.out_buf.popleft())
+            except IndexError:
+                break
+        if not queued:
+            return True
+
+        try:
+            if not self.conn and not self.connect():
+                raise socket.error("Unable to connect to {}".format(self.socket_path))
+            started_cpu_time = thread_cpu_time()
+            data = "".join(line + "\n" for line, _ in queued).encode("utf-8")
+            self.conn.sendall(data)
+            self.stats.incr("request_cpu_seconds", thread_cpu_time() - started_cpu_time)
+            sent_at = time.time()
+            self.stats.incr("messages_sent", len(queued))
+            self.stats.incr("bytes_sent", len(data))
+            for _, queued_at in queued:
+                self.stats.observe("queue_wait_seconds", sent_at - queued_at)
+            return True
+        except socket.error as e:
+            self.log_error_once("Unable to send messages to parent hd run: {}".format(e))
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+            # Re-enqueue so messages are not lost
+            self.out_buf.extendleft(reversed(queued))
+            self.stats.incr("retries")
+            return False
+
+    def send_message(self, message, raise_exceptions=True, **kwargs):
+        return None
+
+    def cleanup(self, sdk_run_uuid):
+        flushed = self.tick(sdk_run_uuid)
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+        return flushed
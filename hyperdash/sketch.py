@@ -0,0 +1,184 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import math
+import numbers
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Values closer to zero than this are counted in a dedicated zero bucket
+MIN_INDEXABLE_VALUE = 1e-9
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Bounds the size of a sketch. If a distribution spans more buckets than this,
+# the buckets closest to zero are collapsed together which sacrifices accuracy
+# for the smallest values only.
+DEFAULT_MAX_BUCKETS = 2048
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class DDSketch:
+    """DDSketch is a mergeable streaming quantile sketch.
+
+    Values are counted in logarithmically sized buckets so that every quantile
+    estimate is within relative_accuracy of the true value, regardless of the
+    shape of the distribution. Two sketches with the same accuracy can be
+    merged losslessly, which makes them a good fit for summarizing a window of
+    values on the client and only uploading the summary.
+
+    See: https://arxiv.org/abs/1908.10693
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_buckets=DEFAULT_MAX_BUCKETS):
+        assert 0 < relative_accuracy < 1, "relative_accuracy must be between 0 and 1."
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def _key(self, value):
+        return int(math.ceil(math.log(value) / self.log_gamma))
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, weight=1):
+        """Add a value, counting it weight times."""
+        value = float(value)
+        if math.isnan(value) or math.isinf(value) or weight <= 0:
+            return
+        if value > MIN_INDEXABLE_VALUE:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + weight
+        elif value < -MIN_INDEXABLE_VALUE:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + weight
+        else:
+            self.zero_count += weight
+        self.count += weight
+        self.sum += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def add_many(self, values):
+        """Add a number, an iterable of numbers or a NumPy array."""
+        if isinstance(values, numbers.Real):
+            self.add(values)
+        elif hasattr(values, "dtype"):
+            self._add_array(values)
+        else:
+            for value in values:
+                self.add(value)
+        self._collapse()
+
+    def _add_array(self, values):
+        # Only imported when we're handed an array so that NumPy is never a
+        # requirement (or an import time cost) for users who don't need it
+        import numpy as np
+
+        arr = np.asarray(values, dtype=np.float64).ravel()
+        arr = arr[np.isfinite(arr)]
+        if arr.size == 0:
+            return
+
+        pos = arr[arr > MIN_INDEXABLE_VALUE]
+        neg = -arr[arr < -MIN_INDEXABLE_VALUE]
+        for buckets, vals in ((self.positive, pos), (self.negative, neg)):
+            if vals.size == 0:
+                continue
+            keys = np.ceil(np.log(vals) / self.log_gamma).astype(np.int64)
+            unique_keys, counts = np.unique(keys, return_counts=True)
+            for key, count in zip(unique_keys.tolist(), counts.tolist()):
+                buckets[key] = buckets.get(key, 0) + count
+        self.zero_count += int(arr.size - pos.size - neg.size)
+        self.count += int(arr.size)
+        self.sum += float(arr.sum())
+        self.min = min(self.min, float(arr.min()))
+        self.max = max(self.max, float(arr.max()))
+
+    def merge(self, other):
+        assert self.gamma == other.gamma, "sketches must have the same relative_accuracy to be merged."
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._collapse()
+
+    def _collapse(self):
+        for buckets in (self.positive, self.negative):
+            if len(buckets) <= self.max_buckets:
+                continue
+            keys = sorted(buckets)
+            excess = len(keys) - self.max_buckets
+            collapsed = sum(buckets.pop(key) for key in keys[:excess])
+            buckets[keys[excess]] += collapsed
+
+    def quantile(self, q):
+        """Estimate the value at quantile q (between 0 and 1)."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # Walk the buckets from the smallest value to the largest: most
+        # negative first, then zero, then positive.
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return max(-self._value(key), self.min)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self._value(key), self.max)
+        return self.max
+
+    def to_dict(self, quantiles=DEFAULT_QUANTILES):
+        """Summarize the sketch in a compact, JSON serializable form."""
+        def buckets_to_dict(buckets):
+            keys = sorted(buckets)
+            return {
+                "keys": keys,
+                "counts": [buckets[key] for key in keys],
+            }
+
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "quantiles": dict(
+                ("{:g}".format(q), self.quantile(q)) for q in quantiles),
+            "zero_count": self.zero_count,
+            "positive": buckets_to_dict(self.positive),
+            "negative": buckets_to_dict(self.negative),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        sketch = cls(d["relative_accuracy"])
+        sketch.positive = dict(zip(d["positive"]["keys"], d["positive"]["counts"]))
+        sketch.negative = dict(zip(d["negative"]["keys"], d["negative"]["counts"]))
+        sketch.zero_count = d["zero_count"]
+        sketch.count = d["count"]
+        sketch.sum = d["sum"]
+        if d["count"]:
+            sketch.min = d["min"]
+            sketch.max = d["max"]
+        return sketch
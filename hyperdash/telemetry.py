@@ -0,0 +1,418 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import os
+import time
+
+from threading import Event
+from threading import Thread
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+PROC = "/proc"
+SYS_BLOCK = "/sys/block"
+
+DEFAULT_SYSTEM_METRICS_INTERVAL = 5
+# Fraction of the sampling thread's time that sampling may take. If a sample
+# takes longer than this, the interval is stretched to stay within budget.
+OVERHEAD_BUDGET = 0.01
+# Sectors in /proc/diskstats are always 512 bytes
+SECTOR_SIZE = 512
+
+
+def is_supported():
+    """Telemetry is read from procfs, so it's only available on Linux."""
+    return os.path.isdir(os.path.join(PROC, "self"))
+
+
+def _sysconf(name, default):
+    try:
+        return os.sysconf(name)
+    except (AttributeError, ValueError, OSError):
+        return default
+
+
+CLOCK_TICKS = _sysconf("SC_CLK_TCK", 100)
+PAGE_SIZE = _sysconf("SC_PAGE_SIZE", 4096)
+# /proc/<pid>/task/<tid>/children is only available if the kernel was built
+# with CONFIG_PROC_CHILDREN, otherwise every process has to be checked
+HAS_PROC_CHILDREN = os.path.exists(os.path.join(PROC, "self", "task", str(os.getpid()), "children"))
+
+
+class ProcFile:
+    """ProcFile keeps a procfs file open so that it can be read again and
+    again without reopening it, which is most of the cost of reading one.
+
+    Reads go into a buffer that is reused (and grown as needed) between
+    reads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+        self.buf = bytearray(4096)
+
+    def read(self):
+        """Returns the contents of the file, or None if it can't be read."""
+        try:
+            if self.f is None:
+                self.f = io.open(self.path, "rb", buffering=0)
+            else:
+                self.f.seek(0)
+            size = 0
+            while True:
+                n = self.f.readinto(memoryview(self.buf)[size:])
+                if not n:
+                    break
+                size += n
+                if size == len(self.buf):
+                    self.buf.extend(bytearray(len(self.buf)))
+            return bytes(self.buf[:size])
+        except (IOError, OSError):
+            self.close()
+            return None
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class _ProcessFiles:
+    def __init__(self, pid):
+        self.stat = ProcFile(os.path.join(PROC, str(pid), "stat"))
+        self.status = ProcFile(os.path.join(PROC, str(pid), "status"))
+        self.io = ProcFile(os.path.join(PROC, str(pid), "io"))
+
+    def close(self):
+        self.stat.close()
+        self.status.close()
+        self.io.close()
+
+
+class _ProcessSample:
+    def __init__(self):
+        self.cpu_ticks = 0
+        self.rss_bytes = 0
+        self.threads = 0
+        self.read_bytes = 0
+        self.write_bytes = 0
+        self.context_switches = 0
+
+
+def _parse_stat(data, sample):
+    # The command name is in parentheses and can contain anything, so the
+    # fields are counted from the last closing parenthesis (man 5 proc)
+    fields = data[data.rindex(b")") + 2:].split()
+    sample.cpu_ticks = int(fields[11]) + int(fields[12])
+    sample.threads = int(fields[17])
+    sample.rss_bytes = int(fields[21]) * PAGE_SIZE
+    return int(fields[1])
+
+
+def _parse_status(data, sample):
+    for line in data.splitlines():
+        if line.startswith(b"voluntary_ctxt_switches:") or line.startswith(b"nonvoluntary_ctxt_switches:"):
+            sample.context_switches += int(line.split()[1])
+
+
+def _parse_io(data, sample):
+    for line in data.splitlines():
+        if line.startswith(b"read_bytes:"):
+            sample.read_bytes = int(line.split()[1])
+        elif line.startswith(b"write_bytes:"):
+            sample.write_bytes = int(line.split()[1])
+
+
+class _Sampler:
+    """_Sampler calls sample every interval seconds from a background thread
+    and records what it returns as internal metrics.
+
+    The time spent sampling is measured, and if it exceeds OVERHEAD_BUDGET
+    of the interval the interval is stretched until it doesn't.
+    """
+
+    def __init__(self, client, interval):
+        self.client = client
+        self.interval = interval
+        self.current_interval = interval
+        self.shutdown = Event()
+        self.thread = Thread(target=self._loop)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.close()
+
+    def close(self):
+        pass
+
+    def sample(self, now):
+        """Returns {name: value} of the metrics to record, or None."""
+        raise NotImplementedError()
+
+    def _loop(self):
+        while not self.shutdown.wait(self.current_interval):
+            started_at = time.time()
+            try:
+                metrics = self.sample(started_at)
+            except Exception as e:
+                # Telemetry must never take down the job it's monitoring
+                self.client.logger.debug("Unable to sample telemetry: {}".format(e))
+                continue
+            elapsed = time.time() - started_at
+            self.current_interval = max(self.interval, elapsed / OVERHEAD_BUDGET)
+            if metrics:
+                self._emit(started_at, metrics)
+
+    def _emit(self, now, metrics):
+        for name, value in sorted(metrics.items()):
+            self.client._metric(
+                name, now, value, log=False, is_internal=True,
+                sample_frequency_per_second=max(1.0, 1.0 / self.interval))
+
+
+class ProcessSampler(_Sampler):
+    """ProcessSampler periodically reports the resource usage of a process
+    and all of its descendants as internal metrics.
+
+    Every interval seconds it reads /proc/<pid>/{stat,status,io} of each
+    process in the tree and records CPU%, RSS, disk I/O rates, context
+    switch rate and thread and process counts. Rates are computed per
+    process so that children exiting don't show up as negative usage.
+    """
+
+    def __init__(self, pid, client, interval):
+        _Sampler.__init__(self, client, interval)
+        self.pid = pid
+        self.files = {}
+        self.last_samples = {}
+        self.last_sampled_at = None
+
+    def close(self):
+        for files in self.files.values():
+            files.close()
+        self.files = {}
+
+    def sample(self, now):
+        samples = {}
+        for pid in self._process_tree():
+            sample = self._sample_process(pid)
+            if sample is not None:
+                samples[pid] = sample
+        for pid in list(self.files):
+            if pid not in samples:
+                self.files.pop(pid).close()
+
+        metrics = None
+        if self.last_sampled_at is not None and samples:
+            elapsed = max(now - self.last_sampled_at, 1e-6)
+            # Processes that started since the last sample did all their work
+            # since then
+            zero = _ProcessSample()
+            deltas = _ProcessSample()
+            for pid, sample in samples.items():
+                last = self.last_samples.get(pid, zero)
+                deltas.cpu_ticks += max(sample.cpu_ticks - last.cpu_ticks, 0)
+                deltas.read_bytes += max(sample.read_bytes - last.read_bytes, 0)
+                deltas.write_bytes += max(sample.write_bytes - last.write_bytes, 0)
+                deltas.context_switches += max(sample.context_switches - last.context_switches, 0)
+            metrics = {
+                "hd_process_cpu_percent": 100.0 * deltas.cpu_ticks / CLOCK_TICKS / elapsed,
+                "hd_process_rss_bytes": sum(s.rss_bytes for s in samples.values()),
+                "hd_process_threads": sum(s.threads for s in samples.values()),
+                "hd_process_count": len(samples),
+                "hd_process_read_bytes_per_second": deltas.read_bytes / elapsed,
+                "hd_process_write_bytes_per_second": deltas.write_bytes / elapsed,
+                "hd_process_context_switches_per_second": deltas.context_switches / elapsed,
+            }
+        self.last_samples = samples
+        self.last_sampled_at = now
+        return metrics
+
+    def _sample_process(self, pid):
+        files = self.files.get(pid)
+        if files is None:
+            files = self.files[pid] = _ProcessFiles(pid)
+        stat = files.stat.read()
+        if not stat:
+            files.close()
+            del self.files[pid]
+            return None
+        sample = _ProcessSample()
+        _parse_stat(stat, sample)
+        status = files.status.read()
+        if status:
+            _parse_status(status, sample)
+        # Not readable for processes owned by other users
+        io = files.io.read()
+        if io:
+            _parse_io(io, sample)
+        return sample
+
+    def _process_tree(self):
+        """Returns the pids of the process and all of its descendants."""
+        children = self._children if HAS_PROC_CHILDREN else self._children_by_ppid().get
+        pids = [self.pid]
+        i = 0
+        while i < len(pids):
+            pids.extend(children(pids[i]) or [])
+            i += 1
+        return pids
+
+    def _children(self, pid):
+        task_dir = os.path.join(PROC, str(pid), "task")
+        try:
+            tids = os.listdir(task_dir)
+        except OSError:
+            return []
+        children = []
+        for tid in tids:
+            try:
+                with open(os.path.join(task_dir, tid, "children"), "rb") as f:
+                    children.extend(int(child) for child in f.read().split())
+            except (IOError, OSError):
+                # The thread exited
+                continue
+        return children
+
+    def _children_by_ppid(self):
+        children_by_ppid = {}
+        for name in os.listdir(PROC):
+            if not name.isdigit():
+                continue
+            try:
+                with open(os.path.join(PROC, name, "stat"), "rb") as f:
+                    data = f.read()
+            except (IOError, OSError):
+                continue
+            ppid = _parse_stat(data, _ProcessSample())
+            children_by_ppid.setdefault(ppid, []).append(int(name))
+        return children_by_ppid
+
+
+def _find_field(data, key):
+    """Returns the first number after key in data, or 0."""
+    start = data.find(key)
+    if start == -1:
+        return 0
+    start += len(key)
+    end = data.find(b"\n", start)
+    return int(data[start:end if end != -1 else len(data)].split()[0])
+
+
+def _whole_disks():
+    # Partitions are counted as part of their disk, so only whole disks (the
+    # ones listed in /sys/block) are summed
+    try:
+        names = os.listdir(SYS_BLOCK)
+    except OSError:
+        return None
+    return set(
+        name.encode("utf-8") for name in names
+        if not name.startswith(("loop", "ram", "zram"))
+    )
+
+
+class SystemSampler(_Sampler):
+    """SystemSampler periodically reports host-level and own resource usage
+    as internal metrics, so throughput drops can be related to contention
+    from other processes on the host.
+
+    It reads /proc/stat, /proc/meminfo, /proc/self/status, /proc/diskstats
+    and /proc/net/dev, keeping them open between samples, and only looks at
+    the lines and fields it reports.
+    """
+
+    def __init__(self, client, interval=DEFAULT_SYSTEM_METRICS_INTERVAL):
+        _Sampler.__init__(self, client, interval)
+        self.stat = ProcFile(os.path.join(PROC, "stat"))
+        self.meminfo = ProcFile(os.path.join(PROC, "meminfo"))
+        self.status = ProcFile(os.path.join(PROC, "self", "status"))
+        self.diskstats = ProcFile(os.path.join(PROC, "diskstats"))
+        self.net_dev = ProcFile(os.path.join(PROC, "net", "dev"))
+        self.disks = _whole_disks()
+        self.last_counters = None
+        self.last_sampled_at = None
+
+    def close(self):
+        for f in (self.stat, self.meminfo, self.status, self.diskstats, self.net_dev):
+            f.close()
+
+    def sample(self, now):
+        metrics = {}
+        counters = {}
+
+        data = self.stat.read()
+        if data:
+            # cpu  user nice system idle iowait irq softirq steal ...
+            fields = data[:data.find(b"\n")].split()[1:9]
+            ticks = [int(field) for field in fields]
+            counters["cpu_total"] = sum(ticks)
+            counters["cpu_idle"] = ticks[3] + ticks[4]
+            counters["cpu_iowait"] = ticks[4]
+            counters["cpu_steal"] = ticks[7] if len(ticks) > 7 else 0
+
+        data = self.meminfo.read()
+        if data:
+            total = _find_field(data, b"MemTotal:") * 1024
+            available = _find_field(data, b"MemAvailable:") * 1024
+            metrics["hd_system_memory_available_bytes"] = available
+            if total:
+                metrics["hd_system_memory_used_percent"] = 100.0 * (total - available) / total
+
+        data = self.status.read()
+        if data:
+            metrics["hd_self_rss_bytes"] = _find_field(data, b"VmRSS:") * 1024
+            metrics["hd_self_threads"] = _find_field(data, b"Threads:")
+
+        data = self.diskstats.read()
+        if data:
+            read_sectors = write_sectors = 0
+            for line in data.splitlines():
+                fields = line.split()
+                if len(fields) < 10 or (self.disks is not None and fields[2] not in self.disks):
+                    continue
+                read_sectors += int(fields[5])
+                write_sectors += int(fields[9])
+            counters["disk_read_bytes"] = read_sectors * SECTOR_SIZE
+            counters["disk_write_bytes"] = write_sectors * SECTOR_SIZE
+
+        data = self.net_dev.read()
+        if data:
+            rx_bytes = tx_bytes = 0
+            # The first two lines are headers
+            for line in data.splitlines()[2:]:
+                interface, _, fields = line.partition(b":")
+                if interface.strip() == b"lo":
+                    continue
+                fields = fields.split()
+                rx_bytes += int(fields[0])
+                tx_bytes += int(fields[8])
+            counters["net_rx_bytes"] = rx_bytes
+            counters["net_tx_bytes"] = tx_bytes
+
+        last = self.last_counters
+        if last is not None:
+            elapsed = max(now - self.last_sampled_at, 1e-6)
+            cpu_total = counters.get("cpu_total", 0) - last.get("cpu_total", 0)
+            if cpu_total > 0:
+                def cpu_percent(name):
+                    return 100.0 * (counters[name] - last[name]) / cpu_total
+                metrics["hd_system_cpu_percent"] = 100.0 - cpu_percent("cpu_idle")
+                metrics["hd_system_cpu_iowait_percent"] = cpu_percent("cpu_iowait")
+                metrics["hd_system_cpu_steal_percent"] = cpu_percent("cpu_steal")
+            for name in ("disk_read_bytes", "disk_write_bytes", "net_rx_bytes", "net_tx_bytes"):
+                if name in counters and name in last:
+                    metrics["hd_system_{}_per_second".format(name)] = max(counters[name] - last[name], 0) / elapsed
+        self.last_counters = counters
+        self.last_sampled_at = now
+        return metrics
@@ -0,0 +1,108 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import re
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# An unterminated line (like a progress bar) is uploaded at most this often
+PENDING_LINE_INTERVAL_SECONDS = 10
+# Escape sequences longer than this are never held back waiting for their end
+MAX_ESCAPE_SEQUENCE_LENGTH = 256
+
+# OSC sequences (window titles, hyperlinks), CSI sequences (colors, cursor
+# movement) and other two character escape sequences
+_ESCAPE_SEQUENCE = (
+    r"\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)"
+    r"|\x1b\[[0-?]*[ -/]*[@-~]"
+    r"|\x1b[@-Z\\^_]"
+)
+_ESCAPE_SEQUENCE_RE = re.compile(_ESCAPE_SEQUENCE)
+# Escape sequences and every control character except \t, \n, \r and \b
+_CONTROL_RE = re.compile(_ESCAPE_SEQUENCE + r"|[\x00-\x07\x0b\x0c\x0e-\x1f\x7f]")
+
+
+class TerminalCompactor:
+    """TerminalCompactor turns captured output into what it would look like
+    once printed, so that only that is uploaded.
+
+    Progress bars redraw a line many times a second by moving back to its
+    start with \\r (or \\b), and color it with ANSI escape sequences. Each
+    line is emulated until it ends and only its final content is kept,
+    without escape sequences. A line that hasn't ended yet is uploaded as it
+    currently looks every PENDING_LINE_INTERVAL_SECONDS, so a long running
+    progress bar still shows progress.
+
+    Output is fed in as it's captured, in arbitrary chunks.
+    """
+
+    def __init__(self):
+        # Characters of the current, unterminated line and the cursor's column
+        self.line = []
+        self.cursor = 0
+        self.pending_since = None
+        # The beginning of an escape sequence cut off at the end of a chunk
+        self.partial_escape = ""
+
+    def feed(self, s, current_time):
+        """Returns the compacted form of s, which may be empty."""
+        s = self.partial_escape + s
+        self.partial_escape = ""
+        start = s.rfind("\x1b")
+        if (start != -1 and len(s) - start < MAX_ESCAPE_SEQUENCE_LENGTH and
+                "\n" not in s[start:] and not _ESCAPE_SEQUENCE_RE.match(s, start)):
+            s, self.partial_escape = s[:start], s[start:]
+        s = _CONTROL_RE.sub("", s)
+
+        lines = s.split("\n")
+        out = []
+        for line in lines[:-1]:
+            if not self.line and "\r" not in line and "\b" not in line:
+                # Fast path for plain lines
+                out.append(line)
+            else:
+                self._write(line)
+                out.append("".join(self.line))
+                self._reset()
+            out.append("\n")
+
+        if lines[-1]:
+            self._write(lines[-1])
+            if self.pending_since is None:
+                self.pending_since = current_time
+        if self.line and current_time - self.pending_since >= PENDING_LINE_INTERVAL_SECONDS:
+            # Upload what the line looks like now, but keep emulating it
+            out.append("".join(self.line) + "\n")
+            self.pending_since = current_time
+        return "".join(out)
+
+    def flush(self):
+        """Returns the unterminated line, if any, once output has ended."""
+        line = "".join(self.line)
+        self._reset()
+        self.partial_escape = ""
+        return line
+
+    def _write(self, text):
+        if "\b" in text:
+            for c in text:
+                if c == "\r":
+                    self.cursor = 0
+                elif c == "\b":
+                    self.cursor = max(0, self.cursor - 1)
+                else:
+                    self.line[self.cursor:self.cursor + 1] = c
+                    self.cursor += 1
+            return
+        for i, segment in enumerate(text.split("\r")):
+            if i:
+                self.cursor = 0
+            self.line[self.cursor:self.cursor + len(segment)] = segment
+            self.cursor += len(segment)
+
+    def _reset(self):
+        self.line = []
+        self.cursor = 0
+        self.pending_since = None
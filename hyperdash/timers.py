@@ -0,0 +1,100 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import functools
+import threading
+import time
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+if hasattr(time, "perf_counter_ns"):
+    perf_counter_ns = time.perf_counter_ns
+else:
+    _perf_counter = getattr(time, "perf_counter", time.time)
+
+    def perf_counter_ns():
+        return int(_perf_counter() * 1e9)
+
+
+if hasattr(time, "thread_time"):
+    thread_cpu_time = time.thread_time
+elif hasattr(time, "CLOCK_THREAD_CPUTIME_ID"):
+    def thread_cpu_time():
+        return time.clock_gettime(time.CLOCK_THREAD_CPUTIME_ID)
+elif hasattr(time, "process_time"):
+    # CPU time of the whole process, an overestimate of the current thread's
+    thread_cpu_time = time.process_time
+else:
+    # Python 2, CPU time of the whole process on Unix
+    thread_cpu_time = time.clock
+
+
+# Names and start times of the timers currently running in each thread
+_local = threading.local()
+
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+class Timer:
+    """Timer records how long a block of code takes, as a context manager or
+    a decorator.
+
+    Durations (in seconds) are recorded in a distribution, so only the
+    summary of each window (count, sum and quantiles) is sent. A timer
+    started inside another one is recorded as "<outer>/<inner>", which
+    breaks a step down into its phases.
+
+    If the client has a span recorder, every timed block is also recorded
+    as a span of the run's timeline.
+
+    A Timer holds no state of its own while running, so the same one can be
+    used from many threads and nested inside itself.
+    """
+
+    def __init__(self, client, name, log=True):
+        self.client = client
+        self.name = name
+        self.log = log
+
+    def __enter__(self):
+        stack = _stack()
+        name = "{}/{}".format(stack[-1][0], self.name) if stack else self.name
+        stack.append((name, perf_counter_ns()))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = perf_counter_ns()
+        name, start = _stack().pop()
+        self.client._distribution(name, time.time(), (end - start) / 1e9, self.log)
+        recorder = self.client._span_recorder
+        if recorder is not None:
+            recorder.record(name, start, end)
+        return False
+
+    def __call__(self, f):
+        @functools.wraps(f)
+        def timed(*args, **kwargs):
+            with self:
+                return f(*args, **kwargs)
+        return timed
+
+
+class NullTimer:
+    """NullTimer can be used in place of a Timer but doesn't record anything."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def __call__(self, f):
+        return f
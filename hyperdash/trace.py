@@ -0,0 +1,97 @@
+# Python 2/3 compatibility
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import itertools
+import json
+import os
+import threading
+
+from .timers import perf_counter_ns
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Number of spans kept, older spans are overwritten by newer ones
+DEFAULT_TRACE_CAPACITY = 100000
+# How often the trace file is rewritten while the run is going
+TRACE_DUMP_INTERVAL_SECONDS = 30
+
+try:
+    from threading import get_ident as _get_ident
+except ImportError:
+    from thread import get_ident as _get_ident
+
+
+class SpanRecorder:
+    """SpanRecorder keeps the most recent spans (a named phase in a thread,
+    like a timer) in a fixed-size ring buffer and writes them to a Chrome
+    trace event file that can be opened in Perfetto or chrome://tracing.
+
+    Recording a span is a single store into a preallocated list, without any
+    locking, so it's cheap enough to leave on in production runs. Spans are
+    written as complete ("X") events rather than begin/end pairs so that the
+    oldest spans being overwritten can never leave unmatched events behind.
+    """
+
+    def __init__(self, path, capacity=DEFAULT_TRACE_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.spans = [None] * capacity
+        # next() of a count is atomic, so concurrent threads get distinct slots
+        self.counter = itertools.count()
+        self.origin_ns = perf_counter_ns()
+        self.last_dumped_at = None
+
+    def record(self, name, start_ns, end_ns):
+        i = next(self.counter)
+        self.spans[i % self.capacity] = (i, name, start_ns, end_ns, _get_ident())
+
+    def to_dict(self):
+        spans = sorted(span for span in list(self.spans) if span is not None)
+        thread_names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+        pid = os.getpid()
+        events = []
+        for tid in sorted(set(span[4] for span in spans)):
+            events.append({
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": thread_names.get(tid, "thread-{}".format(tid))},
+            })
+        for _, name, start_ns, end_ns, tid in spans:
+            events.append({
+                "name": name,
+                "ph": "X",
+                "pid": pid,
+                "tid": tid,
+                # Microseconds since the recorder was created
+                "ts": (start_ns - self.origin_ns) / 1e3,
+                "dur": (end_ns - start_ns) / 1e3,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # Never leave a half written trace behind for someone to open
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        if hasattr(os, "replace"):
+            os.replace(tmp_path, self.path)
+        else:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp_path, self.path)
+
+    def tick(self, current_time, force):
+        """Rewrite the trace file every TRACE_DUMP_INTERVAL_SECONDS."""
+        if self.last_dumped_at is None:
+            self.last_dumped_at = current_time
+        if not force and current_time - self.last_dumped_at < TRACE_DUMP_INTERVAL_SECONDS:
+            return
+        self.last_dumped_at = current_time
+        self.dump()
@@ -6,3 +6,4 @@ from .cli import run
 from .cli import pipe
 from .cli import version
 from .cli import tensorboard
+from .cli import tail_metrics
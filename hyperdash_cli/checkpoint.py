@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+
+import six
+from slugify import slugify
+
+from hyperdash.constants import get_hyperdash_checkpoints_home_path
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+def get_checkpoint_path(kind, job_name, path):
+    """Returns where the checkpoint for ingesting path (or a list of paths)
+    as job_name is stored.
+
+    The same job name can be used with more than one path, so the checkpoint
+    is keyed by both.
+    """
+    paths = [path] if isinstance(path, six.string_types) else sorted(path)
+    key = "\n".join(os.path.abspath(p) for p in paths)
+    if isinstance(key, six.text_type):
+        key = key.encode("utf-8")
+    digest = hashlib.sha1(key).hexdigest()[:12]
+    filename = "{}_{}.json".format(slugify(job_name), digest)
+    return os.path.join(get_hyperdash_checkpoints_home_path(), kind, filename)
+
+
+class Checkpoint:
+    """Checkpoint persists how far CLI ingestion has gotten so that it can
+    resume where it left off after being restarted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.saved_state = None
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                self.saved_state = json.load(f)
+        except (IOError, ValueError):
+            self.saved_state = {}
+        return self.saved_state
+
+    def save(self, state):
+        if state == self.saved_state:
+            return
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        # Write to a temporary file and rename it over the checkpoint so that
+        # crashing mid-write never leaves a corrupt checkpoint behind
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        if hasattr(os, "replace"):
+            os.replace(tmp_path, self.path)
+        else:
+            os.rename(tmp_path, self.path)
+        self.saved_state = state
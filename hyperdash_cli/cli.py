@@ -7,7 +7,6 @@ import subprocess
 import time
 from threading import Thread
 import json
-import signal
 import socket
 import sys
 import webbrowser
@@ -24,18 +23,33 @@ from six import PY2
 
 from hyperdash.constants import API_NAME_CLI_PIPE
 from hyperdash.constants import API_NAME_CLI_RUN
+from hyperdash.constants import API_NAME_CLI_TAIL_METRICS
+from hyperdash.constants import API_NAME_CLI_TENSORBOARD
 from hyperdash.constants import get_hyperdash_json_home_path
 from hyperdash.constants import get_hyperdash_json_paths
 from hyperdash.constants import get_hyperdash_version
-from hyperdash.experiment import _TensorboardExperiment
+from hyperdash.constants import PARENT_SOCKET_ENV_VAR
+from hyperdash.downsample import MIN_THRESHOLD
 from hyperdash import monitor
+from hyperdash.metric_patterns import MetricPatterns
 from hyperdash.monitor import _monitor
+from hyperdash.parent_channel import ParentChannel
+from hyperdash import telemetry
+from hyperdash.utils import get_logger
 
+from .checkpoint import Checkpoint
+from .checkpoint import get_checkpoint_path
 from .constants import get_base_url
 from .constants import get_base_http_url
 from .constants import GITHUB_OAUTH_START
 from .constants import THREADING_TIMEOUT_MAX
 from .constants import LOOPBACK
+from .metric_files import FORMATS
+from .metric_files import MetricFileIngester
+from .tensorboard_ingest import DEFAULT_BACKFILL_MAX_POINTS
+from .tensorboard_ingest import TensorboardIngester
+from .uploader import Uploader
+from .watcher import create_watcher
 
 
 def signup(args=None):
@@ -368,136 +382,159 @@ def keys(args=None):
 
 
 def tensorboard(args=None, is_test=False):
-    try:
-        from tensorboard.backend.event_processing import event_multiplexer
-    except ImportError:
-        print("We were unable to import the necessary tensorboard libraries. Please make sure tensorboard is installed in your Python environment and then try again.")
+    if not os.path.isdir(args.logdir):
+        print("{} is not a directory".format(args.logdir))
         return
 
-    # EventMultiplexer is basically a "manager" of different accumulators. Accumulators are responsible
-    # for "accumulating" all the events for a specific run, so we can use the multiplexer to enumerate all
-    # the available accumulators and find the accumulator for the run that we're looking for.
-    multiplexer = event_multiplexer.EventMultiplexer()
-    multiplexer.AddRunsFromDirectory(args.logdir)
-    multiplexer.Reload()
-
-    run_paths = multiplexer.RunPaths()
-
-    # Figure out which run was created most recently
-    # TODO: Allow the user to specify a name
-    latest_run = None
-    latest_run_first_timestamp = None
-    for run in run_paths:
-        first_timestamp = multiplexer.FirstEventTimestamp(run)
-        if latest_run is None:
-            latest_run = run
-            latest_run_first_timestamp = first_timestamp
-        if first_timestamp > latest_run_first_timestamp:
-            latest_run = run
-            latest_run_first_timestamp = first_timestamp
-
-    if latest_run is None:
-        print("No tensorflow runs detected in {}".format(args.logdir))
-        return
-            
-    accumulator = multiplexer.GetAccumulator(latest_run)
-    # Synchronously load all events since last call to Relaod
-    accumulator.Reload()
+    checkpoint = None
+    if not args.no_checkpoint:
+        checkpoint = Checkpoint(get_checkpoint_path("tensorboard", args.name, args.logdir))
+
+    logger = get_logger(args.name, "tensorboard", sys.stdout)
+    # Every run in the logdir shares one connection to the server
+    uploader = Uploader(API_NAME_CLI_TENSORBOARD, logger)
+    ingester = TensorboardIngester(
+        args.logdir,
+        args.name,
+        uploader,
+        backfill=args.backfill,
+        check_crc=args.check_crc,
+        checkpoint=checkpoint,
+        backfill_max_points=args.backfill_max_points,
+    )
+    # Checkpoint whenever everything read so far has been uploaded
+    uploader.on_flush = ingester.save_checkpoint
+    # Start watching before the first scan so that nothing written in between is missed
+    watcher = create_watcher(args.logdir)
+    uploader.start()
 
-    tags = accumulator.Tags()
-    if 'scalars' not in tags:
-        print("Auto-detected most recent run is `{}`, but no metrics were detected".format(latest_run))
-        return
-  
-    scalars = tags['scalars']
-    scalars_str = ', '.join(scalars)
-    print("Auto-detected most recent run is `{}` with the following metrics: {}".format(latest_run, scalars_str))
-
-    exp = _TensorboardExperiment(args.name, capture_io=False)
-    latest_wall_time_by_scalar = {}
-
-    # If the user doesn't want to backfill data, then we set the latest_wall_time for each
-    # scalar to the current time which will prevent us from emitting any metrics that existed
-    # before we started monitoring the folder
-    if not args.backfill:
-        current_time = time.time()
-        for scalar in scalars:
-            latest_wall_time_by_scalar[scalar] = current_time
-
-    # Cleanup on signal so that runs are marked as completed not disconnected
-    def signal_handler(_, __):
-            exp.end()
-            sys.exit(0)
-    signal.signal(signal.SIGINT, signal_handler)
-
-    # TODO: Right now we can't detect when the run is done because there is no "completion"
+    ingester.scan()
+    if not ingester.runs_by_dir:
+        print("No tensorflow runs detected in {} yet, waiting for them to be created".format(args.logdir))
+
+    # TODO: Right now we can't detect when a run is done because there is no "completion"
     # event in the tensorflow logs so we just run the program inifnitely until the user cancels it.
     # In theory, we could try and guess when the user's program is done by measuring the amount of time
     # between datapoints and then waiting until we don't see any new metrics for some multiple of that
     # period, but for now we don't do that.
-    while True:
-        # Reload will retrieve any new datapoints since the last time we called it
-        accumulator.Reload()
-        tags = accumulator.Tags()
-        # Don't rely on the old scalar tags because new ones may have appeared
-        scalars = tags['scalars']
-        for scalar in scalars:
-            for metric in accumulator.Scalars(scalar):
-                # Skip metrics we've already processed before
-                if latest_wall_time_by_scalar.get(scalar) and metric.wall_time <= latest_wall_time_by_scalar[scalar]:
-                    continue
-                # This is gross, but we need to be able to control the actual timestamp that is being set
-                # in case we're parsing stale Tensorboard files, otherwise the metric timestamps will be completely
-                # off. Also, note that this will do the same 1s sampling we normally do which is important because
-                # tensorflow emits a LOT of datapoints
-                exp._hd_client._metric(scalar, metric.wall_time, metric.value, log=False)
-                latest_wall_time_by_scalar[scalar] = metric.wall_time
+    try:
         # Prevent infinite loop for testing purposes
-        if is_test:
-            break
-        time.sleep(1)
-    # Should never happen for now
-    exp.end()
+        while not is_test:
+            # Only runs that changed are read, and only events appended since the
+            # last time they were read are processed
+            ingester.scan(watcher.wait(1))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        # Mark runs as completed, not disconnected
+        if uploader.close():
+            ingester.save_checkpoint(ended=True)
+
+
+def tail_metrics(args=None, is_test=False):
+    checkpoint = None
+    if not args.no_checkpoint:
+        checkpoint = Checkpoint(get_checkpoint_path("tail-metrics", args.name, args.paths))
+
+    logger = get_logger(args.name, "tail-metrics", sys.stdout)
+    uploader = Uploader(API_NAME_CLI_TAIL_METRICS, logger)
+    ingester = MetricFileIngester(
+        args.paths,
+        args.name,
+        uploader,
+        file_format=args.format,
+        time_column=args.time_column,
+        backfill=args.backfill,
+        checkpoint=checkpoint,
+    )
+    uploader.on_flush = ingester.save_checkpoint
+    uploader.start()
+
+    for path in args.paths:
+        if not os.path.exists(path):
+            print("{} doesn't exist yet, waiting for it to be created".format(path))
+
+    try:
+        ingester.scan()
+        # Like the tensorboard command, this runs until the user cancels it
+        while not is_test:
+            # Checking whether a file grew is a single stat, and only what was
+            # appended since the last scan is read
+            time.sleep(1)
+            ingester.scan()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingester.close()
+        if uploader.close():
+            ingester.save_checkpoint(ended=True)
 
 
 def run(args):
-    @_monitor(args.name, api_key_getter=None, capture_io=True, api_name=API_NAME_CLI_RUN)
+    metric_patterns = None
+    if args.metric_patterns:
+        try:
+            metric_patterns = MetricPatterns(args.metric_patterns)
+        except ValueError as e:
+            print(e)
+            return
+
+    @_monitor(args.name, api_key_getter=None, capture_io=True, api_name=API_NAME_CLI_RUN, metric_patterns=metric_patterns)
     def wrapped(exp):
         # Python detects when its connected to a pipe and buffers output.
         # Spawn the users program with the PYTHONUNBUFFERED environment
         # variable set in case they are running a Python program.
         subprocess_env = os.environ.copy()
         subprocess_env["PYTHONUNBUFFERED"] = "1"
-        # Spawn a subprocess with the user's command
-        p = subprocess.Popen(
-            " ".join(args.args),
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            bufsize=0,
-            env=subprocess_env,
-        )
-
-        # The subprocess's output will be written to the associated
-        # pipes. In order for the @monitor decorator to have access
-        # to them, we need to read them out and write them to
-        # stdout/stderr respectively (which have been redirected by
-        # the monitor decorator)
-        def stdout_loop():
-            _connect_streams(p.stdout, sys.stdout)
-
-        def stderr_loop():
-            _connect_streams(p.stderr, sys.stderr)
-
-        stdout_thread = Thread(target=stdout_loop)
-        stderr_thread = Thread(target=stderr_loop)
-        stdout_thread.start()
-        stderr_thread.start()
-        # Wait for the subprocess to finish executing
-        p.wait()
-        # Threads will exit as soon as their associated pipes are closed by the operating system
-        stdout_thread.join()
-        stderr_thread.join()
+        # If the user's program uses the SDK, its metrics and params are recorded
+        # in this run instead of a run of its own
+        channel = ParentChannel(exp._server_manager, exp._sdk_run_uuid, exp.logger)
+        if channel.start():
+            subprocess_env[PARENT_SOCKET_ENV_VAR] = channel.path
+        sampler = None
+        # Stopped even if the command can't be run, or we're interrupted
+        try:
+            # Spawn a subprocess with the user's command
+            p = subprocess.Popen(
+                " ".join(args.args),
+                shell=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+                env=subprocess_env,
+            )
+            if args.telemetry_interval:
+                if telemetry.is_supported():
+                    sampler = telemetry.ProcessSampler(p.pid, exp, args.telemetry_interval)
+                    sampler.start()
+                else:
+                    exp.logger.warning("Process telemetry is only available on Linux")
+
+            # The subprocess's output will be written to the associated
+            # pipes. In order for the @monitor decorator to have access
+            # to them, we need to read them out and write them to
+            # stdout/stderr respectively (which have been redirected by
+            # the monitor decorator)
+            def stdout_loop():
+                _connect_streams(p.stdout, sys.stdout)
+
+            def stderr_loop():
+                _connect_streams(p.stderr, sys.stderr)
+
+            stdout_thread = Thread(target=stdout_loop)
+            stderr_thread = Thread(target=stderr_loop)
+            stdout_thread.start()
+            stderr_thread.start()
+            # Wait for the subprocess to finish executing
+            p.wait()
+            # Threads will exit as soon as their associated pipes are closed by the operating system
+            stdout_thread.join()
+            stderr_thread.join()
+        finally:
+            if sampler:
+                sampler.stop()
+            channel.close()
     wrapped()
 
 
@@ -659,6 +696,13 @@ def get_api_key_from_env():
     return os.environ.get("HYPERDASH_API_KEY")
 
 
+def _backfill_max_points(value):
+    max_points = int(value)
+    if max_points < MIN_THRESHOLD:
+        raise argparse.ArgumentTypeError("must be at least {}".format(MIN_THRESHOLD))
+    return max_points
+
+
 def main():
     parser = argparse.ArgumentParser(description="The HyperDash SDK")
     subparsers = parser.add_subparsers(
@@ -690,6 +734,8 @@ def main():
 
     run_parser = subparsers.add_parser("run")
     run_parser.add_argument("--name", "-name", "--n", "-n", required=True)
+    run_parser.add_argument("--metric-pattern", "-metric-pattern", required=False, action="append", dest="metric_patterns")
+    run_parser.add_argument("--telemetry-interval", "-telemetry-interval", required=False, type=float, default=None)
     run_parser.add_argument("args", nargs=argparse.REMAINDER)
     run_parser.set_defaults(func=run)
 
@@ -704,7 +750,19 @@ def main():
     tensorboard_parser.add_argument("--name", "-name", "--n", "-n", required=True)
     tensorboard_parser.add_argument("--logdir", "-logdir", required=True)
     tensorboard_parser.add_argument("--backfill", "-backfill", required=False, action='store_true')
+    tensorboard_parser.add_argument("--backfill-max-points", "-backfill-max-points", required=False, type=_backfill_max_points, default=DEFAULT_BACKFILL_MAX_POINTS)
+    tensorboard_parser.add_argument("--check-crc", "-check-crc", required=False, action='store_true')
+    tensorboard_parser.add_argument("--no-checkpoint", "-no-checkpoint", required=False, action='store_true')
     tensorboard_parser.set_defaults(func=tensorboard)
 
+    tail_metrics_parser = subparsers.add_parser("tail-metrics")
+    tail_metrics_parser.add_argument("--name", "-name", "--n", "-n", required=True)
+    tail_metrics_parser.add_argument("--format", "-format", required=False, choices=FORMATS)
+    tail_metrics_parser.add_argument("--time-column", "-time-column", required=False)
+    tail_metrics_parser.add_argument("--backfill", "-backfill", required=False, action='store_true')
+    tail_metrics_parser.add_argument("--no-checkpoint", "-no-checkpoint", required=False, action='store_true')
+    tail_metrics_parser.add_argument("paths", nargs="+")
+    tail_metrics_parser.set_defaults(func=tail_metrics)
+
     args = parser.parse_args()
     args.func(args)
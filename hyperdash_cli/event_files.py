@@ -0,0 +1,366 @@
+import os
+import struct
+
+from .tfrecord import CorruptRecordError
+from .tfrecord import RecordReader
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+EVENT_FILE_MARKER = "tfevents"
+
+
+def is_event_file(path):
+    return EVENT_FILE_MARKER in os.path.basename(path)
+
+
+def find_runs(logdir):
+    """Returns a dict of run name to run directory for every directory in
+    logdir that contains event files. The run name is the directory's path
+    relative to logdir, or "." for logdir itself.
+    """
+    runs = {}
+    for dirpath, _, filenames in os.walk(logdir):
+        if any(is_event_file(filename) for filename in filenames):
+            runs[os.path.relpath(dirpath, logdir)] = dirpath
+    return runs
+
+
+# https://github.com/tensorflow/tensorflow/blob/master/tensorflow/core/framework/types.proto
+DT_FLOAT = 1
+DT_DOUBLE = 2
+DT_INT32 = 3
+DT_UINT8 = 4
+DT_INT16 = 5
+DT_INT8 = 6
+DT_INT64 = 9
+DT_BOOL = 10
+
+# struct formats for decoding a single element of tensor_content
+_TENSOR_CONTENT_FORMATS = {
+    DT_FLOAT: "<f",
+    DT_DOUBLE: "<d",
+    DT_INT32: "<i",
+    DT_UINT8: "<B",
+    DT_INT16: "<h",
+    DT_INT8: "<b",
+    DT_INT64: "<q",
+    DT_BOOL: "<?",
+}
+
+# Protobuf wire types
+_WIRE_VARINT = 0
+_WIRE_FIXED64 = 1
+_WIRE_LENGTH_DELIMITED = 2
+_WIRE_FIXED32 = 5
+
+
+def _read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(buf):
+            raise ValueError("Truncated protobuf varint")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _to_signed64(value):
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _iter_fields(buf):
+    """Yields (field_number, wire_type, value) for every field in a protobuf
+    message. Varints are decoded to ints, every other wire type is returned
+    as the raw bytes of the field.
+    """
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == _WIRE_VARINT:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == _WIRE_FIXED64:
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire_type == _WIRE_LENGTH_DELIMITED:
+            length, pos = _read_varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+        elif wire_type == _WIRE_FIXED32:
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            # Groups are deprecated and never used by the messages we read
+            raise ValueError("Unsupported protobuf wire type {}".format(wire_type))
+        if pos > end:
+            raise ValueError("Truncated protobuf field {}".format(field_number))
+        yield field_number, wire_type, value
+
+
+class SummaryValue:
+    """The parts of a Summary.Value proto that we care about."""
+
+    def __init__(self):
+        self.tag = ""
+        self.simple_value = None
+        self.plugin_name = ""
+        self.tensor = None
+        self.histo = None
+
+
+class Event:
+    """The parts of an Event proto that we care about."""
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.step = 0
+        self.values = []
+
+
+def parse_event(data):
+    """Decode a serialized tensorflow Event proto.
+
+    See: https://github.com/tensorflow/tensorflow/blob/master/tensorflow/core/util/event.proto
+    """
+    buf = bytearray(data)
+    event = Event()
+    for field_number, wire_type, value in _iter_fields(buf):
+        if field_number == 1 and wire_type == _WIRE_FIXED64:
+            event.wall_time = struct.unpack("<d", bytes(value))[0]
+        elif field_number == 2 and wire_type == _WIRE_VARINT:
+            event.step = _to_signed64(value)
+        elif field_number == 5 and wire_type == _WIRE_LENGTH_DELIMITED:
+            event.values.extend(_parse_summary(value))
+    return event
+
+
+def _parse_summary(buf):
+    for field_number, wire_type, value in _iter_fields(buf):
+        if field_number == 1 and wire_type == _WIRE_LENGTH_DELIMITED:
+            yield _parse_summary_value(value)
+
+
+def _parse_summary_value(buf):
+    summary_value = SummaryValue()
+    for field_number, wire_type, value in _iter_fields(buf):
+        if field_number == 1 and wire_type == _WIRE_LENGTH_DELIMITED:
+            summary_value.tag = bytes(value).decode("utf-8", "replace")
+        elif field_number == 2 and wire_type == _WIRE_FIXED32:
+            summary_value.simple_value = struct.unpack("<f", bytes(value))[0]
+        elif field_number == 5 and wire_type == _WIRE_LENGTH_DELIMITED:
+            summary_value.histo = value
+        elif field_number == 8 and wire_type == _WIRE_LENGTH_DELIMITED:
+            summary_value.tensor = value
+        elif field_number == 9 and wire_type == _WIRE_LENGTH_DELIMITED:
+            summary_value.plugin_name = _parse_plugin_name(value)
+    return summary_value
+
+
+def _parse_plugin_name(summary_metadata):
+    for field_number, wire_type, plugin_data in _iter_fields(summary_metadata):
+        if field_number == 1 and wire_type == _WIRE_LENGTH_DELIMITED:
+            for field_number, wire_type, value in _iter_fields(plugin_data):
+                if field_number == 1 and wire_type == _WIRE_LENGTH_DELIMITED:
+                    return bytes(value).decode("utf-8", "replace")
+    return ""
+
+
+def _unpack_all(fmt, buf):
+    """Unpacks as many little endian values of type fmt as fit in buf."""
+    count = len(buf) // struct.calcsize(fmt)
+    return struct.unpack("<{}{}".format(count, fmt), bytes(buf[:count * struct.calcsize(fmt)]))
+
+
+def _tensor_values(buf):
+    """Returns the elements of a TensorProto as a flat list of floats."""
+    dtype = DT_FLOAT
+    content = None
+    values = []
+    for field_number, wire_type, value in _iter_fields(buf):
+        if field_number == 1 and wire_type == _WIRE_VARINT:
+            dtype = value
+        elif field_number == 4 and wire_type == _WIRE_LENGTH_DELIMITED:
+            content = value
+        # float_val and double_val, either packed or not
+        elif field_number in (5, 6):
+            values.extend(_unpack_all("f" if field_number == 5 else "d", value))
+        # int_val, int64_val and bool_val
+        elif field_number in (7, 10, 11):
+            if wire_type == _WIRE_VARINT:
+                values.append(_to_signed64(value))
+            else:
+                pos = 0
+                while pos < len(value):
+                    varint, pos = _read_varint(value, pos)
+                    values.append(_to_signed64(varint))
+    fmt = _TENSOR_CONTENT_FORMATS.get(dtype)
+    if content is not None and fmt:
+        values = _unpack_all(fmt[1:], content)
+    return [float(v) for v in values]
+
+
+def scalar_value(value):
+    """Returns the scalar stored in a SummaryValue, or None."""
+    if value.simple_value is not None:
+        return value.simple_value
+    # Summaries written by tf.summary in TF 2.x store scalars as tensors
+    if value.tensor is not None and value.plugin_name == "scalars":
+        values = _tensor_values(value.tensor)
+        return values[0] if values else None
+    return None
+
+
+class Histogram:
+    """A histogram as a list of (left edge, right edge, count) buckets."""
+
+    def __init__(self, buckets, min_value=None, max_value=None):
+        self.buckets = buckets
+        self.min = min_value if min_value is not None else (buckets[0][0] if buckets else 0.0)
+        self.max = max_value if max_value is not None else (buckets[-1][1] if buckets else 0.0)
+
+
+def _parse_histogram_proto(buf):
+    min_value = max_value = 0.0
+    bucket_limits = []
+    counts = []
+    for field_number, wire_type, value in _iter_fields(buf):
+        if field_number == 1 and wire_type == _WIRE_FIXED64:
+            min_value = struct.unpack("<d", bytes(value))[0]
+        elif field_number == 2 and wire_type == _WIRE_FIXED64:
+            max_value = struct.unpack("<d", bytes(value))[0]
+        # Both are repeated doubles, either packed or not
+        elif field_number == 6:
+            bucket_limits.extend(_unpack_all("d", value))
+        elif field_number == 7:
+            counts.extend(_unpack_all("d", value))
+
+    # bucket_limits are the right edges of the buckets, the first bucket
+    # starts at the minimum
+    buckets = []
+    left = min_value
+    for right, count in zip(bucket_limits, counts):
+        if count:
+            buckets.append((max(left, min_value), min(right, max_value), count))
+        left = right
+    return Histogram(buckets, min_value, max_value)
+
+
+def histogram_value(value):
+    """Returns the Histogram stored in a SummaryValue, or None."""
+    if value.histo is not None:
+        return _parse_histogram_proto(value.histo)
+    # Summaries written by tf.summary in TF 2.x store histograms as tensors of
+    # shape [k, 3] where each row is a bucket
+    if value.tensor is not None and value.plugin_name == "histograms":
+        values = _tensor_values(value.tensor)
+        buckets = [
+            tuple(values[i:i + 3])
+            for i in range(0, len(values) - 2, 3)
+            if values[i + 2]
+        ]
+        if not buckets:
+            return None
+        return Histogram(buckets)
+    return None
+
+
+class EventFileReader:
+    """EventFileReader streams Events out of a tfevents file."""
+
+    def __init__(self, path, offset=0, check_crc=False):
+        self.records = RecordReader(path, offset, check_crc)
+
+    @property
+    def offset(self):
+        return self.records.offset
+
+    def read_events(self):
+        """Yields every new Event, raising CorruptRecordError for one that
+        can't be decoded."""
+        offset = self.records.offset
+        for record in self.records.read_records():
+            try:
+                event = parse_event(record)
+            except (ValueError, IndexError, struct.error) as e:
+                raise CorruptRecordError("Malformed event ({})".format(e), self.records.path, offset)
+            offset = self.records.offset
+            yield event
+
+
+class RunTailer:
+    """RunTailer follows every event file in a run directory.
+
+    Each event file keeps its own reader which remembers how far into the file
+    it has read, so every call to read_scalars only processes events appended
+    since the previous call instead of rescanning the whole run. Events are
+    decoded as they're read so memory usage doesn't grow with the size of the
+    run.
+
+    An event file with a corrupt record (whose CRC is only checked with
+    check_crc) or an event that can't be decoded stops being read at that
+    record, without affecting the run's other event files, and on_corrupt is
+    called with its path and the record's offset.
+    """
+
+    def __init__(self, run_dir, check_crc=False, offsets=None, on_corrupt=None):
+        self.run_dir = run_dir
+        self.check_crc = check_crc
+        self.on_corrupt = on_corrupt
+        self.readers = {}
+        # Paths of event files that had a corrupt record
+        self.corrupt = set()
+        # Byte offsets by filename to resume reading from, like when restoring
+        # from a checkpoint
+        self.resume_offsets = offsets or {}
+
+    def offsets(self):
+        """Returns the byte offset read up to by filename."""
+        return dict(
+            (os.path.basename(path), reader.offset)
+            for path, reader in self.readers.items()
+        )
+
+    def _create_reader(self, path):
+        offset = self.resume_offsets.get(os.path.basename(path), 0)
+        # The file was truncated or replaced since the offset was saved
+        if offset > os.path.getsize(path):
+            offset = 0
+        return EventFileReader(path, offset, check_crc=self.check_crc)
+
+    def read_events(self):
+        """Yields every new Event in the run."""
+        # Pick up event files created since the last call, like when training
+        # is restarted
+        for filename in os.listdir(self.run_dir):
+            path = os.path.join(self.run_dir, filename)
+            if is_event_file(filename) and path not in self.readers:
+                self.readers[path] = self._create_reader(path)
+
+        # Event files are named after their creation timestamp so this reads
+        # them in chronological order
+        for path in sorted(self.readers):
+            if path in self.corrupt:
+                continue
+            reader = self.readers[path]
+            try:
+                for event in reader.read_events():
+                    yield event
+            except CorruptRecordError as e:
+                self.corrupt.add(path)
+                if self.on_corrupt:
+                    self.on_corrupt(path, e.offset)
+
+    def read_scalars(self):
+        """Yields (tag, wall_time, value) for every new scalar in the run."""
+        for event in self.read_events():
+            for value in event.values:
+                scalar = scalar_value(value)
+                if scalar is not None:
+                    yield value.tag, event.wall_time, scalar
@@ -0,0 +1,350 @@
+import csv
+import json
+import math
+import os
+import time
+
+from array import array
+from threading import Lock
+
+import six
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+
+_READ_SIZE = 64 * 1024
+
+
+def guess_format(path):
+    """Returns the format of a metric file based on its extension."""
+    _, ext = os.path.splitext(path)
+    if ext.lower() in (".jsonl", ".ndjson", ".json"):
+        return FORMAT_JSONL
+    return FORMAT_CSV
+
+
+class FileTailer:
+    """FileTailer follows a file like `tail -F`, yielding complete lines as
+    they're appended.
+
+    Only new data is ever read: offset is where the next line starts. If the
+    file is rotated (the path now refers to a different inode) the rest of
+    the old file is read before switching to the new one, and if it's
+    truncated it's read again from the start.
+    """
+
+    def __init__(self, path, offset=0, inode=None):
+        self.path = path
+        self.offset = offset
+        self.inode = inode
+        self.file = None
+        # Bytes after the last newline, which are yielded once the line is complete
+        self.partial = b""
+
+    def read_lines(self):
+        """Yields (offset, line) for every complete line written since the
+        last call.
+        """
+        while True:
+            if self.file is None and not self._open():
+                return
+            for item in self._read_available():
+                yield item
+
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                # Rotated away and not recreated yet, keep following the old file
+                return
+            if st.st_ino != self.inode:
+                # Everything in the old file has been read, continue with the new one
+                self.close()
+                self.offset = 0
+                self.inode = None
+                continue
+            if st.st_size < self.offset + len(self.partial):
+                self.file.seek(0)
+                self.offset = 0
+                self.partial = b""
+                continue
+            return
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.partial = b""
+
+    def _open(self):
+        try:
+            self.file = open(self.path, "rb")
+        except (IOError, OSError):
+            return False
+        st = os.fstat(self.file.fileno())
+        # The file was rotated or truncated while we weren't following it
+        if (self.inode is not None and st.st_ino != self.inode) or st.st_size < self.offset:
+            self.offset = 0
+        self.inode = st.st_ino
+        self.file.seek(self.offset)
+        return True
+
+    def _read_available(self):
+        while True:
+            data = self.file.read(_READ_SIZE)
+            if not data:
+                return
+            lines = (self.partial + data).split(b"\n")
+            self.partial = lines.pop()
+            for line in lines:
+                offset = self.offset
+                self.offset += len(line) + 1
+                yield offset, line.rstrip(b"\r").decode("utf-8", "replace")
+
+
+def _parse_number(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(number) or math.isinf(number):
+        return None
+    return number
+
+
+def _split_csv(line):
+    # The csv module doesn't support unicode input in Python 2
+    if six.PY2:
+        row = next(csv.reader([line.encode("utf-8")]))
+        return [cell.decode("utf-8") for cell in row]
+    return next(csv.reader([line]))
+
+
+class CSVParser:
+    """CSVParser maps every column of a CSV file with a header row to a metric."""
+
+    def __init__(self, time_column=None):
+        self.time_column = time_column
+        self.columns = None
+
+    def parse(self, offset, line):
+        """Returns (timestamp, {name: value}) for a line, where timestamp is
+        None if the line has no time column.
+        """
+        if not line.strip():
+            return None, {}
+        row = [cell.strip() for cell in _split_csv(line)]
+        if offset == 0:
+            self.columns = row
+            return None, {}
+        if self.columns is None:
+            return None, {}
+
+        timestamp = None
+        values = {}
+        for column, cell in zip(self.columns, row):
+            value = _parse_number(cell)
+            if value is None:
+                continue
+            if column == self.time_column:
+                timestamp = value
+            else:
+                values[column] = value
+        return timestamp, values
+
+
+class JSONLParser:
+    """JSONLParser maps every numeric field of JSON objects, one per line, to
+    a metric.
+    """
+
+    def __init__(self, time_column=None):
+        self.time_column = time_column
+
+    def parse(self, offset, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None, {}
+        if not isinstance(record, dict):
+            return None, {}
+
+        timestamp = None
+        values = {}
+        for key, raw_value in record.items():
+            value = _parse_number(raw_value) if isinstance(raw_value, (six.integer_types, float)) else None
+            if value is None:
+                continue
+            if key == self.time_column:
+                timestamp = value
+            else:
+                values[key] = value
+        return timestamp, values
+
+
+_PARSERS = {
+    FORMAT_CSV: CSVParser,
+    FORMAT_JSONL: JSONLParser,
+}
+
+
+def _read_first_line(path):
+    try:
+        with open(path, "rb") as f:
+            line = f.readline()
+    except (IOError, OSError):
+        return None
+    if not line.endswith(b"\n"):
+        return None
+    return line.rstrip(b"\r\n").decode("utf-8", "replace")
+
+
+class _File:
+    def __init__(self, path, job_name, tailer, parser, sdk_run_uuid):
+        self.path = path
+        self.job_name = job_name
+        self.tailer = tailer
+        self.parser = parser
+        # Set if we're resuming a run that was interrupted
+        self.sdk_run_uuid = sdk_run_uuid
+        # Created when the first datapoint is seen
+        self.client = None
+
+
+class MetricFileIngester:
+    """MetricFileIngester uploads the metrics written to CSV or JSONL files.
+
+    Each file is uploaded as its own run. Every scan only reads what was
+    appended since the previous one, and everything read in a scan is sent
+    as one batch per metric.
+
+    If time_column is set, that column holds the (Unix, in seconds) time of
+    each row, otherwise rows are timestamped when they're read. Unless
+    backfill is True, rows that were written before we started are skipped.
+
+    If a checkpoint is provided, the offset of every file is saved to it
+    whenever everything read so far has been uploaded, and restored on
+    startup.
+    """
+
+    def __init__(
+        self,
+        paths,
+        job_name,
+        uploader,
+        file_format=None,
+        time_column=None,
+        backfill=False,
+        checkpoint=None,
+    ):
+        self.job_name = job_name
+        self.uploader = uploader
+        self.checkpoint = checkpoint
+        saved_files = checkpoint.load().get("files", {}) if checkpoint else {}
+        self.files = []
+        for path in paths:
+            self.files.append(self._create_file(
+                path, len(paths) > 1, file_format, time_column, backfill, saved_files))
+        # Held while reading so that checkpoints are consistent with what has
+        # been handed to the uploader
+        self.lock = Lock()
+
+    def _create_file(self, path, prefix_job_name, file_format, time_column, backfill, saved_files):
+        path = os.path.abspath(path)
+        job_name = self.job_name
+        if prefix_job_name:
+            job_name = "{}/{}".format(self.job_name, os.path.basename(path))
+        parser = _PARSERS[file_format or guess_format(path)](time_column)
+
+        saved = saved_files.get(path)
+        if saved:
+            tailer = FileTailer(path, saved["offset"], saved["inode"])
+            sdk_run_uuid = saved["sdk_run_uuid"]
+        else:
+            offset = 0
+            if not backfill:
+                try:
+                    offset = os.path.getsize(path)
+                except OSError:
+                    pass
+            tailer = FileTailer(path, offset)
+            sdk_run_uuid = None
+        # Rows of a CSV file we don't read from the start still need its header
+        if tailer.offset and isinstance(parser, CSVParser):
+            header = _read_first_line(path)
+            if header is not None:
+                parser.parse(0, header)
+        return _File(path, job_name, tailer, parser, sdk_run_uuid)
+
+    def scan(self):
+        """Upload every row appended to the files since the last scan."""
+        with self.lock:
+            for f in self.files:
+                self._emit(f)
+
+    def save_checkpoint(self, ended=False):
+        """Save a checkpoint if everything that has been read was uploaded.
+
+        Called by the uploader whenever it has sent all pending messages. If
+        ended is True, the runs were ended and won't be resumed.
+        """
+        if not self.checkpoint:
+            return
+        with self.lock:
+            if not self.uploader.is_flushed():
+                return
+            state = {"files": dict(
+                (f.path, {
+                    "offset": f.tailer.offset,
+                    "inode": f.tailer.inode,
+                    "sdk_run_uuid": None if ended else self._sdk_run_uuid(f),
+                })
+                for f in self.files
+            )}
+            try:
+                self.checkpoint.save(state)
+            except (IOError, OSError) as e:
+                self.uploader.logger.error("Unable to save checkpoint to {}: {}".format(
+                    self.checkpoint.path, e))
+
+    def close(self):
+        for f in self.files:
+            f.tailer.close()
+
+    def _sdk_run_uuid(self, f):
+        return f.client._sdk_run_uuid if f.client else f.sdk_run_uuid
+
+    def _client(self, f):
+        if f.client is None:
+            if f.sdk_run_uuid:
+                print("Resuming upload of `{}` as `{}`".format(f.path, f.job_name))
+            else:
+                print("Uploading `{}` as `{}`".format(f.path, f.job_name))
+            f.client = self.uploader.create_run(f.job_name, f.sdk_run_uuid)
+        return f.client
+
+    def _emit(self, f):
+        read_at = time.time()
+        series = {}
+        for offset, line in f.tailer.read_lines():
+            timestamp, values = f.parser.parse(offset, line)
+            if timestamp is None:
+                timestamp = read_at
+            for name, value in values.items():
+                if name not in series:
+                    series[name] = (array("d"), array("d"))
+                timestamps, points = series[name]
+                timestamps.append(timestamp)
+                points.append(value)
+        if not series:
+            return
+
+        client = self._client(f)
+        for name, (timestamps, points) in sorted(series.items()):
+            client._send_metric_series(name, list(timestamps), list(points))
@@ -0,0 +1,270 @@
+import os
+import time
+
+from threading import Lock
+
+from hyperdash.downsample import Downsampler
+from hyperdash.sketch import DDSketch
+
+from .event_files import find_runs
+from .event_files import histogram_value
+from .event_files import is_event_file
+from .event_files import RunTailer
+from .event_files import scalar_value
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Maximum number of datapoints uploaded per tag when backfilling a run
+DEFAULT_BACKFILL_MAX_POINTS = 2000
+# Minimum wall time between two uploaded histograms of the same tag
+HISTOGRAM_INTERVAL_SECONDS = 10
+# Histograms are compacted into a coarser sketch than exp.distribution uses
+# which bounds the size of each upload, no matter how many buckets the
+# histogram had
+HISTOGRAM_RELATIVE_ACCURACY = 0.02
+HISTOGRAM_MAX_BUCKETS = 256
+
+
+def histogram_to_sketch(histogram):
+    """Summarize a Tensorboard histogram as a DDSketch."""
+    sketch = DDSketch(HISTOGRAM_RELATIVE_ACCURACY, HISTOGRAM_MAX_BUCKETS)
+    for left, right, count in histogram.buckets:
+        sketch.add((left + right) / 2.0, count)
+    sketch._collapse()
+    if sketch.count:
+        sketch.min = histogram.min
+        sketch.max = histogram.max
+    return sketch
+
+
+class _Run:
+    def __init__(self, name, job_name, tailer, skip_before, resume_wall_times, sdk_run_uuid):
+        self.name = name
+        self.job_name = job_name
+        self.tailer = tailer
+        # Whether the scalars written before the run's first read should be
+        # backfilled in bulk
+        self.needs_backfill = False
+        # Scalars written at or before this time are skipped, None to upload everything
+        self.skip_before = skip_before
+        # Wall time of the last uploaded histogram of each tag
+        self.last_histogram_at = {}
+        # Last wall time of each tag read before we were restarted, used to avoid
+        # uploading summaries twice if an event file had to be read from the start again
+        self.resume_wall_times = resume_wall_times
+        self.last_wall_times = dict(resume_wall_times)
+        # Set if we're resuming a run that was interrupted
+        self.sdk_run_uuid = sdk_run_uuid
+        # Created when the first scalar or histogram is seen so that runs without
+        # any (like ones that only contain a graph) aren't uploaded
+        self.client = None
+
+
+class TensorboardIngester:
+    """TensorboardIngester uploads the scalars and histograms of every run in
+    a logdir.
+
+    Every directory containing event files is uploaded as its own run, named
+    after the directory's path relative to the logdir.
+
+    If a checkpoint is provided, the read offset of every event file and the
+    last wall time of every tag are saved to it whenever everything read so
+    far has been uploaded, and restored on startup. A restarted ingester picks
+    up exactly where the previous one stopped, including anything written
+    while it wasn't running, and a run that was interrupted is resumed.
+    """
+
+    def __init__(
+        self,
+        logdir,
+        job_name,
+        uploader,
+        backfill=False,
+        check_crc=False,
+        start_time=None,
+        checkpoint=None,
+        backfill_max_points=DEFAULT_BACKFILL_MAX_POINTS,
+    ):
+        self.logdir = logdir
+        self.job_name = job_name
+        self.uploader = uploader
+        self.backfill = backfill
+        self.backfill_max_points = backfill_max_points
+        self.check_crc = check_crc
+        self.start_time = time.time() if start_time is None else start_time
+        self.checkpoint = checkpoint
+        self.saved_runs = checkpoint.load().get("runs", {}) if checkpoint else {}
+        self.runs_by_dir = {}
+        # Held while reading so that checkpoints are consistent with what has
+        # been handed to the uploader
+        self.lock = Lock()
+
+    def scan(self, changed_dirs=None):
+        """Upload new scalars in changed_dirs, or in the whole logdir if
+        changed_dirs is None.
+        """
+        with self.lock:
+            if changed_dirs is None:
+                for name, run_dir in find_runs(self.logdir).items():
+                    self._add_run(name, run_dir)
+                runs = list(self.runs_by_dir.values())
+            else:
+                runs = []
+                for run_dir in changed_dirs:
+                    if run_dir not in self.runs_by_dir and self._has_event_files(run_dir):
+                        self._add_run(os.path.relpath(run_dir, self.logdir), run_dir)
+                    if run_dir in self.runs_by_dir:
+                        runs.append(self.runs_by_dir[run_dir])
+
+            for run in runs:
+                self._emit(run)
+
+    def save_checkpoint(self, ended=False):
+        """Save a checkpoint if everything that has been read was uploaded.
+
+        Called by the uploader whenever it has sent all pending messages. If
+        ended is True, the runs were ended and won't be resumed.
+        """
+        if not self.checkpoint:
+            return
+        with self.lock:
+            # Scalars were queued since the uploader's last flush
+            if not self.uploader.is_flushed():
+                return
+            state = {"runs": dict(
+                (run.name, {
+                    "offsets": run.tailer.offsets(),
+                    "last_wall_times": dict(run.last_wall_times),
+                    "sdk_run_uuid": None if ended else self._sdk_run_uuid(run),
+                })
+                for run in self.runs_by_dir.values()
+            )}
+            try:
+                self.checkpoint.save(state)
+            except (IOError, OSError) as e:
+                self.uploader.logger.error("Unable to save checkpoint to {}: {}".format(
+                    self.checkpoint.path, e))
+
+    def _sdk_run_uuid(self, run):
+        return run.client._sdk_run_uuid if run.client else run.sdk_run_uuid
+
+    def _has_event_files(self, run_dir):
+        try:
+            return any(is_event_file(filename) for filename in os.listdir(run_dir))
+        except OSError:
+            return False
+
+    def _add_run(self, name, run_dir):
+        if run_dir in self.runs_by_dir:
+            return
+        job_name = self.job_name if name == "." else "{}/{}".format(self.job_name, name)
+        saved = self.saved_runs.get(name)
+        if saved:
+            # Upload everything written since the checkpoint, even if it was
+            # written before we started
+            skip_before = None
+            tailer = RunTailer(
+                run_dir, check_crc=self.check_crc, offsets=saved["offsets"], on_corrupt=self._corrupt_record)
+            resume_wall_times = saved["last_wall_times"]
+            sdk_run_uuid = saved["sdk_run_uuid"]
+        else:
+            skip_before = None if self.backfill else self.start_time
+            tailer = RunTailer(run_dir, check_crc=self.check_crc, on_corrupt=self._corrupt_record)
+            resume_wall_times = {}
+            sdk_run_uuid = None
+        run = _Run(name, job_name, tailer, skip_before, resume_wall_times, sdk_run_uuid)
+        run.needs_backfill = self.backfill and not saved
+        self.runs_by_dir[run_dir] = run
+
+    def _corrupt_record(self, path, offset):
+        self.uploader.logger.error(
+            "Corrupt record at offset {} of {}, skipping the rest of that event file".format(offset, path))
+
+    def _client(self, run):
+        if run.client is None:
+            if run.sdk_run_uuid:
+                print("Resuming upload of run `{}` as `{}`".format(run.name, run.job_name))
+            else:
+                print("Uploading run `{}` as `{}`".format(run.name, run.job_name))
+            run.client = self.uploader.create_run(run.job_name, run.sdk_run_uuid)
+        return run.client
+
+    def _read(self, run):
+        """Yields (tag, wall_time, scalar, histogram) for every new summary in
+        the run that should be uploaded. Either scalar or histogram is None.
+        """
+        for event in run.tailer.read_events():
+            wall_time = event.wall_time
+            # Skip summaries that existed before we started monitoring the
+            # folder if the user doesn't want to backfill data
+            if run.skip_before is not None and wall_time <= run.skip_before:
+                continue
+            for value in event.values:
+                tag = value.tag
+                if tag in run.resume_wall_times and wall_time <= run.resume_wall_times[tag]:
+                    continue
+                scalar = scalar_value(value)
+                histogram = histogram_value(value) if scalar is None else None
+                if scalar is None and histogram is None:
+                    continue
+                run.last_wall_times[tag] = max(wall_time, run.last_wall_times.get(tag, wall_time))
+                yield tag, wall_time, scalar, histogram
+
+    def _emit(self, run):
+        if run.needs_backfill:
+            self._backfill(run)
+            run.needs_backfill = False
+            return
+
+        for tag, wall_time, scalar, histogram in self._read(run):
+            if histogram is not None:
+                self._emit_histogram(run, tag, wall_time, histogram)
+                continue
+            # This is gross, but we need to be able to control the actual timestamp that is being set
+            # in case we're parsing stale Tensorboard files, otherwise the metric timestamps will be completely
+            # off. Also, note that this will do the same 1s sampling we normally do which is important because
+            # tensorflow emits a LOT of datapoints
+            self._client(run)._metric(tag, wall_time, scalar, log=False)
+
+    def _emit_histogram(self, run, tag, wall_time, histogram):
+        last_histogram_at = run.last_histogram_at.get(tag)
+        if last_histogram_at is not None and wall_time - last_histogram_at < HISTOGRAM_INTERVAL_SECONDS:
+            return
+        run.last_histogram_at[tag] = wall_time
+        self._client(run)._send_sketch(tag, wall_time, histogram_to_sketch(histogram))
+
+    def _backfill(self, run):
+        """Upload everything written to a run so far as downsampled series.
+
+        Instead of applying the 1s sampling to historical wall times, every
+        scalar is read and each tag is downsampled with LTTB as it's read (in
+        bounded memory, see Downsampler) so the shape of the curve survives,
+        then sent in large batches. Histograms are uploaded as they're read,
+        at the usual rate.
+        """
+        started_at = time.time()
+        series = {}
+        num_points = 0
+        for tag, wall_time, scalar, histogram in self._read(run):
+            if histogram is not None:
+                self._emit_histogram(run, tag, wall_time, histogram)
+                continue
+            if tag not in series:
+                series[tag] = Downsampler(self.backfill_max_points)
+            series[tag].add(wall_time, scalar)
+            num_points += 1
+        if not num_points:
+            return
+
+        client = self._client(run)
+        num_uploaded = 0
+        for tag, downsampler in sorted(series.items()):
+            wall_times, values = downsampler.result()
+            client._send_metric_series(tag, list(wall_times), list(values))
+            num_uploaded += len(wall_times)
+
+        elapsed = max(time.time() - started_at, 1e-6)
+        print("Backfilled {:,} datapoints of run `{}` in {:.2f}s ({:,.0f} points/s), uploading {:,} after downsampling".format(
+            num_points, run.name, elapsed, num_points / elapsed, num_uploaded))
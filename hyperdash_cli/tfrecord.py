@@ -0,0 +1,93 @@
+import os
+import struct
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# Every record is framed as:
+#   uint64 length
+#   uint32 masked crc32c of length
+#   byte   data[length]
+#   uint32 masked crc32c of data
+HEADER_SIZE = 12
+FOOTER_SIZE = 4
+_CRC_MASK_DELTA = 0xa282ead8
+
+
+def _make_crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0x82f63b78
+            else:
+                crc >>= 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _make_crc32c_table()
+
+
+def crc32c(data):
+    crc = 0xffffffff
+    table = _CRC32C_TABLE
+    for byte in bytearray(data):
+        crc = table[(crc ^ byte) & 0xff] ^ (crc >> 8)
+    return crc ^ 0xffffffff
+
+
+def masked_crc32c(data):
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + _CRC_MASK_DELTA) & 0xffffffff
+
+
+class CorruptRecordError(Exception):
+    """CorruptRecordError is raised for a record that can't be read, at
+    offset of path."""
+
+    def __init__(self, reason, path, offset):
+        Exception.__init__(self, "{} at offset {} of {}".format(reason, offset, path))
+        self.path = path
+        self.offset = offset
+
+
+class RecordReader:
+    """RecordReader streams records out of a TFRecord file.
+
+    It remembers the byte offset of the first record it hasn't returned yet,
+    so it can be called repeatedly on a file that is still being written to
+    and will only return the records appended since the previous call. A
+    record that has only been partially written is left for the next call.
+    """
+
+    def __init__(self, path, offset=0, check_crc=False):
+        self.path = path
+        self.offset = offset
+        self.check_crc = check_crc
+
+    def read_records(self):
+        """Yields every complete record after the current offset."""
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(self.offset)
+            while True:
+                header = f.read(HEADER_SIZE)
+                if len(header) < HEADER_SIZE:
+                    return
+                length, length_crc = struct.unpack("<QI", header)
+                if self.check_crc and masked_crc32c(header[:8]) != length_crc:
+                    raise CorruptRecordError("Corrupt record length", self.path, self.offset)
+                # Don't try to read a record that hasn't been fully written yet
+                if self.offset + HEADER_SIZE + length + FOOTER_SIZE > size:
+                    return
+                data = f.read(length)
+                footer = f.read(FOOTER_SIZE)
+                if len(data) < length or len(footer) < FOOTER_SIZE:
+                    return
+                if self.check_crc and masked_crc32c(data) != struct.unpack("<I", footer)[0]:
+                    raise CorruptRecordError("Corrupt record data", self.path, self.offset)
+                self.offset += HEADER_SIZE + length + FOOTER_SIZE
+                yield data
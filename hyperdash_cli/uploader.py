@@ -0,0 +1,87 @@
+import sys
+import uuid
+
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+from hyperdash.client import HDClient
+from hyperdash.sdk_message import create_run_ended_message
+from hyperdash.sdk_message import create_run_started_message
+from hyperdash.server_manager import ServerManagerHTTP
+from hyperdash.utils import get_logger
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+NETWORK_INTERVAL_SECONDS = 1
+
+
+class Uploader:
+    """Uploader sends the messages of many runs to the Hyperdash server using
+    a single server manager and network thread.
+
+    Used by CLI commands that create runs from files on disk, where creating
+    an Experiment (and its threads) per run doesn't scale.
+    """
+
+    def __init__(self, api_name, parent_logger, on_flush=None):
+        self.logger = parent_logger.getChild(__name__)
+        # Called from the network thread every time all pending messages
+        # have been sent successfully
+        self.on_flush = on_flush
+        self.server_manager = ServerManagerHTTP(None, self.logger, api_name)
+        self.clients = {}
+        self.lock = Lock()
+        self.shutdown = Event()
+        self.thread = Thread(target=self._network_loop)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def create_run(self, job_name, sdk_run_uuid=None):
+        """Start a new run and return the HDClient used to record its metrics.
+
+        If sdk_run_uuid is provided, that run is resumed instead.
+        """
+        if sdk_run_uuid is None:
+            sdk_run_uuid = str(uuid.uuid4())
+            self.server_manager.put_buf(create_run_started_message(sdk_run_uuid, job_name))
+        logger = get_logger(job_name, sdk_run_uuid, sys.stdout)
+        client = HDClient(logger, self.server_manager, sdk_run_uuid)
+        with self.lock:
+            self.clients[sdk_run_uuid] = client
+        return client
+
+    def end_run(self, client, final_status="success"):
+        client._close()
+        with self.lock:
+            self.clients.pop(client._sdk_run_uuid, None)
+        self.server_manager.put_buf(
+            create_run_ended_message(client._sdk_run_uuid, final_status))
+
+    def is_flushed(self):
+        return len(self.server_manager.out_buf) == 0
+
+    def close(self, final_status="success"):
+        """End every run and make a final attempt to send pending messages.
+
+        Returns whether every message was sent.
+        """
+        with self.lock:
+            clients = list(self.clients.values())
+        for client in clients:
+            self.end_run(client, final_status)
+        self.shutdown.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        return self.server_manager.tick_runs(()) and self.is_flushed()
+
+    def _network_loop(self):
+        while not self.shutdown.wait(NETWORK_INTERVAL_SECONDS):
+            with self.lock:
+                sdk_run_uuids = list(self.clients)
+            if self.server_manager.tick_runs(sdk_run_uuids) and self.on_flush:
+                self.on_flush()
@@ -0,0 +1,161 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+import six
+
+# Python 2/3 compatibility
+__metaclass__ = type
+
+
+# See: man 7 inotify
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+def create_watcher(path):
+    """Returns a watcher for every directory under path, using inotify if
+    it's available and falling back to polling otherwise.
+    """
+    libc = _load_libc()
+    if libc:
+        try:
+            return InotifyWatcher(path, libc)
+        except OSError:
+            pass
+    return PollingWatcher(path)
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        # Make sure this libc actually supports inotify
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class PollingWatcher:
+    """PollingWatcher has no way of knowing what changed, so it just waits."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def wait(self, timeout):
+        """Waits for timeout seconds and returns None to indicate that
+        anything under path may have changed.
+        """
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """InotifyWatcher uses inotify to find out which directories under path
+    have changed, including directories that are created after it started.
+    """
+
+    def __init__(self, path, libc):
+        self.path = path
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "Unable to initialize inotify")
+        self.dirs_by_wd = {}
+        # Set if we ran out of inotify watches, after which we can no longer
+        # tell what changed
+        self.degraded = False
+        for dirpath, _, _ in os.walk(path):
+            if not self._watch(dirpath):
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), "Unable to watch {}".format(dirpath))
+
+    def _watch(self, path):
+        encoded = path.encode(sys.getfilesystemencoding()) if isinstance(path, six.text_type) else path
+        wd = self.libc.inotify_add_watch(self.fd, encoded, WATCH_MASK)
+        if wd < 0:
+            return False
+        self.dirs_by_wd[wd] = path
+        return True
+
+    def wait(self, timeout):
+        """Waits up to timeout seconds for something to change.
+
+        Returns the set of directories that changed, or None if we can't tell
+        and anything under path may have changed.
+        """
+        if self.degraded:
+            time.sleep(timeout)
+            return None
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        overflowed = False
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, pos)
+                pos += _EVENT_HEADER.size
+                name = data[pos:pos + name_len].rstrip(b"\0")
+                pos += name_len
+
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                    continue
+                if mask & IN_IGNORED:
+                    # The directory was deleted
+                    self.dirs_by_wd.pop(wd, None)
+                    continue
+                path = self.dirs_by_wd.get(wd)
+                if path is None:
+                    continue
+                changed.add(path)
+
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    if six.PY3:
+                        name = os.fsdecode(name)
+                    # Files may have been written to the new directory before
+                    # we started watching it, so report all of it as changed
+                    for dirpath, _, _ in os.walk(os.path.join(path, name)):
+                        if not self._watch(dirpath):
+                            self.degraded = True
+                        changed.add(dirpath)
+
+        if overflowed or self.degraded:
+            return None
+        return changed
+
+    def close(self):
+        os.close(self.fd)
@@ -6,4 +6,15 @@ class TestBuffer(object):
     def test_buffer_has_atty_method(self):
         """Verify IOBuffer has an atty() method."""
         buf = IOBuffer()
-        assert buf.isatty() is True
\ No newline at end of file
+        assert buf.isatty() is True
+    def test_strip_local_only(self):
+        """Verify what's written with write_local_only is stripped from the server's view."""
+        buf = IOBuffer()
+        buf.write("a\n")
+        buf.write_local_only("local\n")
+        buf.write("b\n")
+        value = buf.getvalue()
+        # Cut in the middle of the local only write
+        assert buf.strip_local_only(value[:5], 0) == "a\n"
+        assert buf.strip_local_only(value[5:], 5) == "b\n"
+        assert buf.local_only == []
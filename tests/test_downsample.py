@@ -0,0 +1,46 @@
+import math
+
+from hyperdash.downsample import Downsampler
+from hyperdash.downsample import lttb
+from hyperdash.downsample import MIN_THRESHOLD
+
+
+class TestDownsample(object):
+    """TestDownsample contains tests for LTTB downsampling."""
+    def test_keeps_endpoints_and_spikes(self):
+        xs = list(range(10000))
+        ys = [math.sin(x / 100.0) for x in xs]
+        ys[5000] = 100.0
+        indices = lttb(xs, ys, 500)
+
+        assert len(indices) == 500
+        assert indices == sorted(set(indices))
+        assert indices[0] == 0 and indices[-1] == len(xs) - 1
+        # Taking every Nth point would likely miss the spike
+        assert 5000 in indices
+
+    def test_short_series_are_unchanged(self):
+        assert lttb([1, 2, 3], [4, 5, 6], 10) == [0, 1, 2]
+        assert lttb([], [], 10) == []
+
+    def test_small_thresholds_keep_endpoints(self):
+        for threshold in (-1, 0, 1, 2):
+            assert lttb(list(range(10)), [0] * 4 + [5] + [0] * 5, threshold) == [0, 4, 9]
+        assert MIN_THRESHOLD == 3
+
+    def test_downsampler_bounds_memory(self):
+        downsampler = Downsampler(100, chunk_points=1000)
+        xs = list(range(100000))
+        # Added out of order, like overlapping event files
+        for x in xs[50000:] + xs[:50000]:
+            downsampler.add(x, 100.0 if x == 70000 else math.sin(x / 1000.0))
+            assert len(downsampler.pending[0]) + len(downsampler.kept[0]) < 2000
+        result_xs, result_ys = downsampler.result()
+
+        assert downsampler.count == 100000
+        assert len(result_xs) == 100
+        assert list(result_xs) == sorted(result_xs)
+        assert result_xs[0] == 0 and result_xs[-1] == 99999
+        assert 70000 in result_xs
+        # Kept points are spread evenly over the series
+        assert 40 <= sum(1 for x in result_xs if x < 50000) <= 60
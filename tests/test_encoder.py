@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import json
+import math
+
+import numpy as np
+
+from hyperdash import encoder
+
+
+class TestEncoder(object):
+    """TestEncoder contains tests for the JSON encoder backends."""
+    def test_backends_encode_message_mix(self):
+        message = {
+            "type": "param",
+            "sdk_run_uuid": "c5a4b6f2-8d3e-4f0c-9a51-2e7d4b1f6a93",
+            "payload": {
+                "params": {
+                    "np_float": np.float64(0.25),
+                    "np_int": np.int64(7),
+                    "np_array": np.arange(3),
+                    "big_int": 4324320984309284328743827432,
+                    "unicode": "字",
+                },
+                "is_internal": False,
+            },
+        }
+        expected = {
+            "type": "param",
+            "sdk_run_uuid": "c5a4b6f2-8d3e-4f0c-9a51-2e7d4b1f6a93",
+            "payload": {
+                "params": {
+                    "np_float": 0.25,
+                    "np_int": 7,
+                    "np_array": [0, 1, 2],
+                    "big_int": 4324320984309284328743827432,
+                    "unicode": "字",
+                },
+                "is_internal": False,
+            },
+        }
+
+        backends = encoder.available_backends()
+        assert encoder.BACKEND_JSON in backends
+        for backend in backends:
+            _, dumps = encoder.create_dumps(backend)
+            assert json.loads(dumps(message)) == expected
+
+    def test_backends_encode_non_finite_floats_alike(self):
+        message = {
+            "nan": float("nan"),
+            "inf": float("inf"),
+            "-inf": float("-inf"),
+            "np_nan": np.float32("nan"),
+            "np_array": np.array([1.0, np.inf]),
+            "none": None,
+        }
+        expected = json.dumps(message, default=lambda obj: obj.tolist(), sort_keys=True)
+        for backend in encoder.available_backends():
+            _, dumps = encoder.create_dumps(backend)
+            decoded = json.loads(dumps(message))
+            assert json.dumps(decoded, sort_keys=True) == expected, backend
+            assert math.isnan(decoded["np_nan"])
+        # Messages without non-finite floats keep their nulls
+        for backend in encoder.available_backends():
+            _, dumps = encoder.create_dumps(backend)
+            assert json.loads(dumps({"none": None, "value": 1.5})) == {"none": None, "value": 1.5}
+
+    def test_unsupported_types_raise(self):
+        for backend in encoder.available_backends():
+            _, dumps = encoder.create_dumps(backend)
+            try:
+                dumps({"value": object()})
+                assert False, "{} encoded an object".format(backend)
+            except TypeError:
+                pass
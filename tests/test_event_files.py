@@ -0,0 +1,216 @@
+import os
+import shutil
+import struct
+import tempfile
+
+from mock import Mock
+from mock import patch
+from nose.tools import assert_raises
+from six import StringIO
+
+from hyperdash_cli.event_files import EventFileReader
+from hyperdash_cli.event_files import histogram_value
+from hyperdash_cli.event_files import RunTailer
+from hyperdash_cli.event_files import DT_DOUBLE
+from hyperdash_cli.tensorboard_ingest import HISTOGRAM_INTERVAL_SECONDS
+from hyperdash_cli.tensorboard_ingest import TensorboardIngester
+from hyperdash_cli.tfrecord import CorruptRecordError
+from hyperdash_cli.tfrecord import crc32c
+from hyperdash_cli.tfrecord import masked_crc32c
+
+RUN_DIR = "tests/test_tensorboard_logs/example2"
+EVENT_FILE = os.path.join(RUN_DIR, os.listdir(RUN_DIR)[0])
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(field_number, data):
+    return _varint(field_number << 3 | 2) + _varint(len(data)) + data
+
+
+def _double(field_number, value):
+    return _varint(field_number << 3 | 1) + struct.pack("<d", value)
+
+
+def _event(wall_time, value):
+    return _double(1, wall_time) + _field(5, _field(1, value))
+
+
+def _histogram_event(wall_time, tag):
+    # Values 0-9, with the last bucket ending at DBL_MAX like tensorflow's
+    histo = (_double(1, 0.0) + _double(2, 9.0) + _double(3, 10.0) +
+             _field(6, struct.pack("<3d", -1.0, 4.5, 1.7976931348623157e308)) +
+             _field(7, struct.pack("<3d", 0, 5, 5)))
+    return _event(wall_time, _field(1, tag) + _field(5, histo))
+
+
+def _record(data):
+    length = struct.pack("<Q", len(data))
+    return (length + struct.pack("<I", masked_crc32c(length)) +
+            data + struct.pack("<I", masked_crc32c(data)))
+
+
+class TestEventFiles(object):
+    """TestEventFiles contains tests for the native tfevents reader."""
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_reads_fixture_scalars(self):
+        scalars = list(RunTailer(RUN_DIR, check_crc=True).read_scalars())
+        assert len(scalars) == 27500
+        assert scalars[0] == ("loss", 1512944548.971483, 2.3025853633880615)
+        assert scalars[1] == ("accuracy", 1512944548.971483, 0.14000000059604645)
+
+    def test_tails_partially_written_file(self):
+        with open(EVENT_FILE, "rb") as f:
+            data = f.read()
+        path = os.path.join(self.tmp_dir, "events.out.tfevents.1512944548.host")
+        with open(path, "wb") as f:
+            f.write(data[:len(data) // 2])
+
+        reader = EventFileReader(path)
+        first = list(reader.read_events())
+        offset = reader.offset
+        assert 0 < offset <= len(data) // 2
+        # Nothing new has been written
+        assert list(reader.read_events()) == []
+
+        with open(path, "ab") as f:
+            f.write(data[len(data) // 2:])
+        rest = list(reader.read_events())
+        assert reader.offset == len(data)
+        assert len(first) + len(rest) == len(list(EventFileReader(EVENT_FILE).read_events()))
+
+    def test_crc(self):
+        assert crc32c(b"123456789") == 0xe3069283
+
+        path = os.path.join(self.tmp_dir, "events.out.tfevents.1.host")
+        record = bytearray(_record(b"\x09" + struct.pack("<d", 1.5)))
+        record[-5] ^= 0xff
+        with open(path, "wb") as f:
+            f.write(bytes(record))
+
+        # Corruption is only detected if it's been asked for
+        assert len(list(EventFileReader(path).read_events())) == 1
+        with assert_raises(CorruptRecordError):
+            list(EventFileReader(path, check_crc=True).read_events())
+
+    def test_ingester_skips_rest_of_corrupt_file(self):
+        def scalar_event(wall_time, value):
+            return _event(wall_time, _field(1, b"loss") + _varint(2 << 3 | 5) + struct.pack("<f", value))
+
+        corrupt_path = os.path.join(self.tmp_dir, "events.out.tfevents.1.host")
+        corrupt_record = bytearray(_record(scalar_event(2.0, 2.0)))
+        corrupt_record[-5] ^= 0xff
+        with open(corrupt_path, "wb") as f:
+            f.write(_record(scalar_event(1.0, 1.0)))
+            f.write(bytes(corrupt_record))
+            f.write(_record(scalar_event(3.0, 3.0)))
+        with open(os.path.join(self.tmp_dir, "events.out.tfevents.2.host"), "wb") as f:
+            f.write(_record(scalar_event(4.0, 4.0)))
+
+        recorded = []
+
+        class Client(object):
+            def _metric(self, name, timestamp, value, log=True):
+                recorded.append((name, timestamp, value))
+
+        class Uploader(object):
+            logger = Mock()
+
+            def create_run(self, job_name, sdk_run_uuid=None):
+                return Client()
+
+        uploader = Uploader()
+        ingester = TensorboardIngester(self.tmp_dir, "job", uploader, check_crc=True, start_time=0)
+        with patch("sys.stdout", new=StringIO()):
+            ingester.scan()
+            ingester.scan()
+        assert recorded == [("loss", 1.0, 1.0), ("loss", 4.0, 4.0)]
+        # Logged once, with the offset of the corrupt record
+        assert uploader.logger.error.call_count == 1
+        message = uploader.logger.error.call_args[0][0]
+        assert "offset {} of {}".format(len(_record(scalar_event(1.0, 1.0))), corrupt_path) in message
+
+    def test_malformed_events(self):
+        path = os.path.join(self.tmp_dir, "events.out.tfevents.1.host")
+        good = _record(_event(1.0, _field(1, b"loss")))
+        # Valid records whose payloads are a truncated double, a truncated
+        # varint and an unknown wire type
+        for payload in (b"\x09\x00", b"\x10\xff", b"\x0b"):
+            with open(path, "wb") as f:
+                f.write(good + _record(payload) + good)
+            reader = EventFileReader(path, check_crc=True)
+            events = reader.read_events()
+            assert next(events).wall_time == 1.0
+            with assert_raises(CorruptRecordError) as e:
+                next(events)
+            assert e.exception.offset == len(good)
+
+    def test_reads_tensor_scalars(self):
+        # Summaries written by TF 2.x store scalars as tensors
+        tensor = _varint(1 << 3) + _varint(DT_DOUBLE) + _field(4, struct.pack("<d", 0.25))
+        metadata = _field(1, _field(1, b"scalars"))
+        value = _field(1, b"lr") + _field(9, metadata) + _field(8, tensor)
+        event = _event(10.0, value)
+
+        path = os.path.join(self.tmp_dir, "events.out.tfevents.1.host")
+        with open(path, "wb") as f:
+            f.write(_record(event))
+        assert list(RunTailer(self.tmp_dir).read_scalars()) == [("lr", 10.0, 0.25)]
+
+    def test_reads_histograms(self):
+        path = os.path.join(self.tmp_dir, "events.out.tfevents.1.host")
+        # TF 2.x histograms are [k, 3] tensors of (left edge, right edge, count)
+        tensor = (_varint(1 << 3) + _varint(DT_DOUBLE) +
+                  _field(4, struct.pack("<6d", -1.0, 0.0, 3, 0.0, 1.0, 1)))
+        metadata = _field(1, _field(1, b"histograms"))
+        with open(path, "wb") as f:
+            f.write(_record(_histogram_event(1.0, b"weights")))
+            f.write(_record(_event(2.0, _field(1, b"bias") + _field(9, metadata) + _field(8, tensor))))
+
+        events = list(EventFileReader(path).read_events())
+        histogram = histogram_value(events[0].values[0])
+        assert (histogram.min, histogram.max) == (0.0, 9.0)
+        assert histogram.buckets == [(0.0, 4.5, 5.0), (4.5, 9.0, 5.0)]
+        histogram = histogram_value(events[1].values[0])
+        assert histogram.buckets == [(-1.0, 0.0, 3.0), (0.0, 1.0, 1.0)]
+
+    def test_uploads_histograms_at_bounded_rate(self):
+        path = os.path.join(self.tmp_dir, "events.out.tfevents.1.host")
+        with open(path, "wb") as f:
+            for wall_time in (100.0, 101.0, 100.0 + HISTOGRAM_INTERVAL_SECONDS):
+                f.write(_record(_histogram_event(wall_time, b"weights")))
+
+        sent = []
+
+        class Client(object):
+            def _send_sketch(self, name, timestamp, sketch):
+                sent.append((name, timestamp, sketch))
+
+        class Uploader(object):
+            def create_run(self, job_name, sdk_run_uuid=None):
+                return Client()
+
+        with patch("sys.stdout", new=StringIO()):
+            TensorboardIngester(self.tmp_dir, "job", Uploader(), backfill=True).scan()
+        assert [(name, timestamp) for name, timestamp, _ in sent] == [
+            ("weights", 100.0), ("weights", 100.0 + HISTOGRAM_INTERVAL_SECONDS)]
+        sketch = sent[0][2]
+        assert sketch.count == 10
+        assert (sketch.min, sketch.max) == (0.0, 9.0)
+        assert abs(sketch.quantile(0.25) - 2.25) < 0.1
+        assert abs(sketch.quantile(0.75) - 6.75) < 0.2
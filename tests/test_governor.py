@@ -0,0 +1,76 @@
+import logging
+
+from mock import Mock
+
+from hyperdash.client import HDClient
+from hyperdash.governor import GOVERNOR_INTERVAL_SECONDS
+from hyperdash.governor import LOG_SUMMARY_CHARS
+from hyperdash.governor import MAX_SLOWDOWN
+from hyperdash.governor import OverheadGovernor
+from hyperdash.governor import summarize_log
+from hyperdash.sdk_stats import SDKStats
+
+
+class TestGovernor(object):
+    """TestGovernor contains tests for the SDK's CPU budget governor."""
+    def setup(self):
+        self.stats = SDKStats()
+        self.governor = OverheadGovernor(self.stats, 0.01, logging.getLogger("test_governor"))
+        self.now = 1000.0
+        self.governor.tick(self.now)
+
+    def tick(self, work_seconds):
+        if work_seconds:
+            self.stats.incr("capture_cpu_seconds", work_seconds)
+        self.now += GOVERNOR_INTERVAL_SECONDS
+        self.governor.tick(self.now)
+
+    def test_slows_down_while_over_budget(self):
+        # 5% of a core
+        self.tick(0.25)
+        assert self.governor.slowdown == 2
+        for _ in range(10):
+            self.tick(0.25)
+        assert self.governor.slowdown == MAX_SLOWDOWN
+        assert self.governor.should_summarize_logs()
+
+    def test_recovers_when_under_budget(self):
+        self.tick(0.25)
+        self.tick(0.25)
+        assert self.governor.slowdown == 4
+        # Just under budget isn't enough to recover
+        self.tick(0.04)
+        assert self.governor.slowdown == 4
+        self.tick(0.001)
+        assert self.governor.slowdown == 2
+        self.tick(0)
+        assert self.governor.slowdown == 1
+        self.tick(0)
+        assert self.governor.slowdown == 1
+
+    def test_network_latency_is_not_overhead(self):
+        # Requests spending most of each interval waiting on the network
+        for _ in range(10):
+            self.stats.observe("request_seconds", 4.0)
+            self.stats.incr("request_cpu_seconds", 0.001)
+            self.tick(0)
+        assert self.governor.slowdown == 1
+
+    def test_slows_down_metric_sampling(self):
+        client = HDClient(logging.getLogger("test_governor"), Mock(stats=self.stats), "uuid", governor=self.governor)
+        for i in range(20):
+            client._metric("loss", self.now + i, i, log=False)
+        assert client._server_manager.put_buf.call_count == 20
+
+        self.tick(0.25)
+        self.tick(0.25)
+        client._server_manager.put_buf.reset_mock()
+        for i in range(20):
+            client._metric("loss", self.now + 100 + i, i, log=False)
+        assert client._server_manager.put_buf.call_count == 5
+
+    def test_summarize_log(self):
+        assert summarize_log("short") == "short"
+        summary = summarize_log("a" * LOG_SUMMARY_CHARS + "b" * 100)
+        assert summary.startswith("a" * (LOG_SUMMARY_CHARS // 2) + "\n[... 100 characters omitted")
+        assert summary.endswith("]\n" + "a" * (LOG_SUMMARY_CHARS // 2 - 100) + "b" * 100)
@@ -0,0 +1,37 @@
+from hyperdash.log_limiter import DEDUP_WINDOW_SECONDS
+from hyperdash.log_limiter import LogLimiter
+from hyperdash.log_limiter import TAIL_SAMPLE_LINES
+from hyperdash.log_limiter import TokenBucket
+from hyperdash.sdk_stats import SDKStats
+
+
+class TestLogLimiter(object):
+    """TestLogLimiter contains tests for deduplicating and rate limiting uploaded logs."""
+    def test_collapses_repeated_lines(self):
+        limiter = LogLimiter(TokenBucket(1000, 10000))
+        out = limiter.feed("warning\nwarning\nwarning\nstep 1\nwarning\n\n\n", 0)
+        # Repeats are summarized as soon as a different line arrives, in order
+        assert out == "warning\nwarning (x2)\nstep 1\nwarning\n\n\n"
+        assert limiter.feed("step 2\nstep 2\n", 1) == "step 2\n"
+        # Or once the window of the first occurrence is over
+        assert limiter.feed("step 2\n", 1 + DEDUP_WINDOW_SECONDS - 1) == ""
+        assert limiter.feed("", 1 + DEDUP_WINDOW_SECONDS) == "step 2 (x2)\n"
+        assert limiter.feed("step 2\nstep 2\n", 1 + DEDUP_WINDOW_SECONDS) == "step 2\n"
+        assert limiter.flush() == "step 2 (x1)\n"
+        assert limiter.flush() == ""
+
+    def test_rate_limit_keeps_head_and_tail(self):
+        stats = SDKStats()
+        # 60 bytes a second, which is 10 lines
+        limiter = LogLimiter(TokenBucket(60, 60), stats)
+        out = limiter.feed("".join("l{:04d}\n".format(i) for i in range(100)), 0)
+        assert out == "".join("l{:04d}\n".format(i) for i in range(10))
+        assert stats.snapshot()["log_lines_suppressed"] == 90
+
+        out = limiter.feed("", 1).split("\n")
+        assert out[0].startswith("[... {} lines ({} bytes) left out".format(90 - TAIL_SAMPLE_LINES, (90 - TAIL_SAMPLE_LINES) * 6))
+        assert out[1:-1] == ["l{:04d}".format(i) for i in range(100 - TAIL_SAMPLE_LINES, 100)]
+        # The tail is paid for with the next second's tokens
+        assert limiter.bucket.tokens == 60 - TAIL_SAMPLE_LINES * 6
+        assert limiter.feed("next\n", 1) == "next\n"
+        assert limiter.flush() == ""
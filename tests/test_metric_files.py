@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+
+from mock import patch
+from six import StringIO
+
+from hyperdash_cli.metric_files import CSVParser
+from hyperdash_cli.metric_files import FileTailer
+from hyperdash_cli.metric_files import JSONLParser
+from hyperdash_cli.metric_files import MetricFileIngester
+
+
+class TestMetricFiles(object):
+    """TestMetricFiles contains tests for tailing CSV and JSONL metric files."""
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "metrics.csv")
+
+    def teardown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, data, mode="ab"):
+        with open(self.path, mode) as f:
+            f.write(data)
+
+    def test_tails_appended_lines(self):
+        tailer = FileTailer(self.path)
+        # The file doesn't exist yet
+        assert list(tailer.read_lines()) == []
+
+        self.write(b"step,loss\n1,0.5\n2,0.")
+        assert list(tailer.read_lines()) == [(0, "step,loss"), (10, "1,0.5")]
+        assert tailer.offset == 16
+        # Partial lines are only yielded once they're complete
+        self.write(b"25\r\n")
+        assert list(tailer.read_lines()) == [(16, "2,0.25")]
+        assert list(tailer.read_lines()) == []
+
+        # Resuming from a saved offset doesn't read anything twice
+        self.write(b"3,0.125\n")
+        resumed = FileTailer(self.path, tailer.offset, tailer.inode)
+        assert list(resumed.read_lines()) == [(24, "3,0.125")]
+        tailer.close()
+        resumed.close()
+
+    def test_follows_rotation_and_truncation(self):
+        tailer = FileTailer(self.path)
+        self.write(b"step,loss\n1,0.5\n")
+        assert len(list(tailer.read_lines())) == 2
+
+        # Anything written to the old file before it's replaced is still read
+        self.write(b"2,0.25\n")
+        os.rename(self.path, self.path + ".1")
+        self.write(b"step,loss\n3,0.125\n", "wb")
+        assert list(tailer.read_lines()) == [(16, "2,0.25"), (0, "step,loss"), (10, "3,0.125")]
+
+        self.write(b"step,loss\n", "wb")
+        assert list(tailer.read_lines()) == [(0, "step,loss")]
+        tailer.close()
+
+    def test_parsers(self):
+        parser = CSVParser(time_column="time")
+        assert parser.parse(0, "time, step, loss, name") == (None, {})
+        assert parser.parse(30, "1500000000.5,1,0.5,foo") == (1500000000.5, {"step": 1.0, "loss": 0.5})
+        assert parser.parse(60, "1500000001,2,,foo") == (1500000001.0, {"step": 2.0})
+
+        parser = JSONLParser()
+        assert parser.parse(0, '{"loss": 0.5, "done": true, "name": "foo", "acc": NaN}') == (None, {"loss": 0.5})
+        assert parser.parse(10, '{"loss": 0.') == (None, {})
+
+    def test_ingester_batches_new_rows(self):
+        self.write(b"time,loss\n100,0.5\n")
+        sent = []
+
+        class Client(object):
+            _sdk_run_uuid = "run-uuid"
+
+            def _send_metric_series(self, name, timestamps, values):
+                sent.append((name, timestamps, values))
+
+        class Uploader(object):
+            def create_run(self, job_name, sdk_run_uuid=None):
+                return Client()
+
+        with patch("sys.stdout", new=StringIO()):
+            ingester = MetricFileIngester([self.path], "job", Uploader(), time_column="time")
+            # Rows written before we started are skipped
+            ingester.scan()
+            assert sent == []
+
+            self.write(b"101,0.25\n102,0.125\n")
+            ingester.scan()
+            ingester.close()
+        assert sent == [("loss", [101.0, 102.0], [0.25, 0.125])]
@@ -0,0 +1,55 @@
+from nose.tools import assert_raises
+
+from hyperdash.metric_patterns import MetricExtractor
+from hyperdash.metric_patterns import MetricPatterns
+
+
+class TestMetricPatterns(object):
+    """TestMetricPatterns contains tests for extracting metrics from output."""
+    def test_findall(self):
+        patterns = MetricPatterns([
+            r"^step (?P<step>\d+)",
+            r"loss=(?P<loss>\S+)",
+            # The same group name can be used in more than one pattern
+            r"val_loss: (?P<loss>\S+)",
+        ])
+        text = "step 100 loss=0.23 acc=0.91\nval_loss: 0.5\nno metrics\nloss=abc\n"
+        assert list(patterns.findall(text)) == [("step", 100.0), ("loss", 0.23), ("loss", 0.5)]
+
+    def test_overlapping_patterns(self):
+        patterns = MetricPatterns([r"^epoch (?P<epoch>\d+).*", r"loss=(?P<loss>\S+)"])
+        text = "epoch 3 loss=0.2\nepoch 4\nloss=0.1 loss=0.05\n"
+        assert list(patterns.findall(text)) == [
+            ("epoch", 3.0), ("loss", 0.2), ("epoch", 4.0), ("loss", 0.1), ("loss", 0.05),
+        ]
+
+    def test_patterns_that_cant_be_combined(self):
+        # Inline global flags and numbered backrefs change meaning once combined
+        patterns = MetricPatterns([r"acc=(?P<acc>\S+)", r"(?i)loss=(?P<loss>\S+)"])
+        assert patterns.regex is None
+        assert list(patterns.findall("LOSS=0.5 acc=0.9\n")) == [("acc", 0.9), ("loss", 0.5)]
+
+        patterns = MetricPatterns([r"(?P<a>\d)x", r"(\w)\1 y=(?P<y>\d+)"])
+        assert patterns.regex is None
+        assert list(patterns.findall("zz y=3")) == [("y", 3.0)]
+
+    def test_invalid_patterns(self):
+        with assert_raises(ValueError):
+            MetricPatterns([r"loss=(?P<loss>\S+"])
+        with assert_raises(ValueError):
+            MetricPatterns([r"loss=(\S+)"])
+
+    def test_extractor_only_matches_complete_lines(self):
+        recorded = []
+
+        class Client(object):
+            def _metric(self, name, current_time, value, log=True):
+                recorded.append((name, value))
+
+        extractor = MetricExtractor(MetricPatterns([r"loss=(?P<loss>[0-9.]+)"]), Client())
+        extractor.feed("loss=0.2")
+        assert recorded == []
+        extractor.feed("5\nloss=0.1")
+        assert recorded == [("loss", 0.25)]
+        extractor.flush()
+        assert recorded == [("loss", 0.25), ("loss", 0.1)]
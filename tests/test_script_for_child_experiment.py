@@ -0,0 +1,12 @@
+from hyperdash import Experiment
+
+
+def main():
+    exp = Experiment("child experiment")
+    exp.param("learning rate", 0.01)
+    exp.metric("child metric", 0.5)
+    print("this is the child experiment")
+    exp.end()
+
+
+main()
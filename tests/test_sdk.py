@@ -1,31 +1,46 @@
 # -*- coding: utf-8 -*-
 
+import argparse
 import json
+import logging
 import os
 import random
+import socket
 import string
+import sys
 import time
 
 import six
 from six import StringIO
 from six import PY2
+from mock import Mock
 from mock import patch
+from nose.plugins.skip import SkipTest
 from nose.tools import assert_in
+from nose.tools import assert_raises
 import requests
 import numpy as np
 
 from hyperdash import monitor
 from hyperdash import Experiment
+from hyperdash import telemetry
 from mocks import init_mock_server
+from hyperdash.constants import AGGREGATOR_PORT_ENV_VAR
+from hyperdash.constants import AGGREGATOR_TOKEN_ENV_VAR
 from hyperdash.constants import API_KEY_NAME
 from hyperdash.constants import API_NAME_EXPERIMENT
 from hyperdash.constants import API_NAME_MONITOR
 from hyperdash.constants import get_hyperdash_logs_home_path_for_job
 from hyperdash.constants import get_hyperdash_version
 from hyperdash.constants import VERSION_KEY_NAME
+from threading import current_thread
+from threading import Event
 from threading import Thread
 from hyperdash.constants import MAX_LOG_SIZE_BYTES
+from hyperdash.client import HDClient
 from hyperdash.hyper_dash import HyperDash
+from hyperdash.params import flatten_params
+from hyperdash.parent_channel import ParentChannel
 
 
 server_sdk_messages = []
@@ -610,3 +625,428 @@ class TestSDK(object):
             assert "| Iteration {} of {} |".format(i, 4) in fake_out.getvalue()
         for i in range(3):
             assert "| Iteration {} of {} |".format(i, 2) in fake_out.getvalue()
+
+    def test_experiment_distributed(self):
+        # Grab a free port for rank 0 to listen on
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(("localhost", 0))
+        port = s.getsockname()[1]
+        s.close()
+
+        def rank_env(rank):
+            return {
+                "RANK": str(rank),
+                "WORLD_SIZE": "2",
+                "MASTER_ADDR": "127.0.0.1",
+                AGGREGATOR_PORT_ENV_VAR: str(port),
+                AGGREGATOR_TOKEN_ENV_VAR: "secret",
+            }
+
+        with patch("sys.stdout", new=StringIO()):
+            with patch.dict(os.environ, rank_env(0)):
+                exp_0 = Experiment("distributed", capture_io=False)
+            with patch.dict(os.environ, rank_env(1)):
+                exp_1 = Experiment("distributed", capture_io=False)
+
+            exp_0.metric("loss", 1)
+            exp_1.metric("loss", 3)
+            exp_0.metric("samples", 10, reduce="sum")
+            exp_1.metric("samples", 20, reduce="sum")
+            exp_1.param("rank 1 param", 1)
+            # Rank 1 flushes its metrics to rank 0 before rank 0 ends the run
+            exp_1.end()
+            exp_0.end()
+
+        # Only rank 0 creates a run
+        started_messages = [
+            msg for msg in server_sdk_messages if msg["type"] == "run_started"]
+        assert len(started_messages) == 1
+
+        params_messages = [
+            msg for msg in server_sdk_messages if msg["type"] == "param"]
+        assert len(params_messages) == 0
+
+        metrics = {}
+        for msg in server_sdk_messages:
+            if msg["type"] == "metric":
+                metrics[msg["payload"]["name"]] = msg["payload"]["value"]
+        assert metrics == {"loss": 2, "samples": 30}
+
+    def test_experiment_distributed_rejects_wrong_token(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(("localhost", 0))
+        port = s.getsockname()[1]
+        s.close()
+
+        def rank_env(rank, token):
+            return {
+                "RANK": str(rank),
+                "WORLD_SIZE": "2",
+                "LOCAL_WORLD_SIZE": "2",
+                AGGREGATOR_PORT_ENV_VAR: str(port),
+                AGGREGATOR_TOKEN_ENV_VAR: token,
+            }
+
+        with patch("sys.stdout", new=StringIO()):
+            with patch.dict(os.environ, rank_env(0, "secret")):
+                exp_0 = Experiment("distributed", capture_io=False)
+            with patch.dict(os.environ, rank_env(1, "guess")):
+                exp_1 = Experiment("distributed", capture_io=False)
+
+            exp_0.metric("loss", 1)
+            exp_1.metric("loss", 3)
+            exp_1.end()
+            exp_0.end()
+
+        metrics = [msg["payload"] for msg in server_sdk_messages if msg["type"] == "metric"]
+        assert [(metric["name"], metric["value"]) for metric in metrics] == [("loss", 1)]
+
+    def test_parent_channel_close(self):
+        logger = logging.getLogger("test_parent_channel")
+        server_manager = Mock()
+        channel = ParentChannel(server_manager, "run-uuid", logger)
+        if not channel.start():
+            raise SkipTest("Unix sockets are not available")
+        child = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        child.connect(channel.path)
+        child.sendall(b'{"type": "metric", "payload": {"name": "loss"}}\n')
+        child.close()
+
+        started_at = time.time()
+        channel.close()
+        assert time.time() - started_at < 2
+        # The accept thread stopped before its socket's directory was removed
+        assert not channel.accept_thread.is_alive()
+        assert not os.path.exists(channel.path)
+        messages = [json.loads(call[0][0]) for call in server_manager.put_buf.call_args_list]
+        assert messages == [{"type": "metric", "payload": {"name": "loss"}, "sdk_run_uuid": "run-uuid"}]
+
+    def test_experiment_distribution(self):
+        with patch("sys.stdout", new=StringIO()) as faked_out:
+            exp = Experiment("distribution", capture_io=False)
+            exp.distribution("grad_norm", np.arange(1, 1001))
+            exp.distribution("grad_norm", [1001, 1002])
+            exp.distribution("latency", 0.5)
+            exp.end()
+
+        distributions = {}
+        for msg in server_sdk_messages:
+            if msg["type"] == "distribution":
+                distributions[msg["payload"]["name"]] = msg["payload"]["distribution"]
+
+        # Only the summary of the window is sent, not the raw values
+        assert sorted(distributions) == ["grad_norm", "latency"]
+        grad_norm = distributions["grad_norm"]
+        assert grad_norm["count"] == 1002
+        assert grad_norm["min"] == 1 and grad_norm["max"] == 1002
+        assert abs(grad_norm["quantiles"]["0.5"] - 501) <= 0.01 * 501
+        assert distributions["latency"]["count"] == 1
+
+    def test_experiment_timer(self):
+        with patch("sys.stdout", new=StringIO()):
+            exp = Experiment("timers", capture_io=False)
+
+            @exp.timer("backward", log=False)
+            def backward():
+                time.sleep(0.01)
+
+            for _ in range(3):
+                with exp.timer("step", log=False):
+                    with exp.timer("data", log=False):
+                        pass
+                    backward()
+            exp.end()
+
+        distributions = dict(
+            (msg["payload"]["name"], msg["payload"]["distribution"])
+            for msg in server_sdk_messages if msg["type"] == "distribution"
+        )
+        # Nested timers are named after the timers they're nested in
+        assert sorted(distributions) == ["step", "step/backward", "step/data"]
+        assert all(d["count"] == 3 for d in distributions.values())
+        assert distributions["step/backward"]["min"] >= 0.01
+        assert distributions["step"]["sum"] >= distributions["step/backward"]["sum"]
+
+    def test_experiment_run_started_is_first_message(self):
+        with patch("sys.stdout", new=StringIO()):
+            exp = Experiment("run started first", capture_io=False, trace=True, profile_hz=100, system_metrics=True)
+            exp.end()
+
+        assert server_sdk_messages[0]["type"] == "run_started"
+        params = [msg["payload"]["params"] for msg in server_sdk_messages if msg["type"] == "param"]
+        os.remove(params[0]["hd_trace_path"])
+
+    def test_experiment_trace(self):
+        with patch("sys.stdout", new=StringIO()):
+            exp = Experiment("trace", capture_io=False, trace=True)
+            for _ in range(2):
+                with exp.timer("step", log=False):
+                    with exp.timer("data", log=False):
+                        pass
+            exp.end()
+
+        params = [msg["payload"]["params"] for msg in server_sdk_messages if msg["type"] == "param"]
+        trace_path = params[0]["hd_trace_path"]
+        with open(trace_path) as f:
+            events = json.load(f)["traceEvents"]
+        os.remove(trace_path)
+        spans = [e["name"] for e in events if e["ph"] == "X"]
+        assert spans == ["step/data", "step", "step/data", "step"]
+
+    def test_experiment_profile_rejects_negative_hz(self):
+        with patch("sys.stdout", new=StringIO()) as fake_out:
+            with assert_raises(ValueError):
+                Experiment("profile", profile_hz=-10)
+            # Nothing was started
+            assert sys.stdout is fake_out
+        assert not [msg for msg in server_sdk_messages if msg["type"] == "run_started"]
+
+    def test_experiment_profile(self):
+        def busy_loop():
+            deadline = time.time() + 0.5
+            while time.time() < deadline:
+                pass
+
+        with patch("sys.stdout", new=StringIO()):
+            exp = Experiment("profile", capture_io=False, profile_hz=100)
+            busy_loop()
+            exp.end()
+
+        params = [msg["payload"]["params"] for msg in server_sdk_messages if msg["type"] == "param"]
+        profile_dir = params[0]["hd_profile_path"]
+        profiles = os.listdir(profile_dir)
+        assert len(profiles) == 1
+        with open(os.path.join(profile_dir, profiles[0])) as f:
+            lines = f.read().splitlines()
+        counts = {}
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            counts[stack] = int(count)
+        # Stacks are folded outermost first, starting with the thread's name
+        busy = sum(count for stack, count in counts.items() if "busy_loop (test_sdk.py" in stack)
+        assert busy >= 10
+        assert all(stack.startswith("MainThread;") for stack in counts if "busy_loop" in stack)
+        # SDK threads are profiled too
+        assert any("network_loop (hyper_dash.py" in stack for stack in counts)
+
+    def test_experiment_memory_snapshots(self):
+        if PY2:
+            raise SkipTest("tracemalloc requires Python 3")
+        job_name = "memory snapshots"
+        with patch("sys.stdout", new=StringIO()):
+            exp = Experiment(job_name, capture_io=False, memory_snapshot_interval=0.2)
+            # Let the baseline snapshot be taken before allocating
+            time.sleep(0.3)
+            leaked = [bytearray(1024) for _ in range(1000)]
+            time.sleep(0.5)
+            exp.end()
+
+        metrics = [msg["payload"] for msg in server_sdk_messages if msg["type"] == "metric"]
+        traced = [metric["value"] for metric in metrics if metric["name"] == "hd_traced_memory_bytes"]
+        assert len(traced) >= 2
+        assert max(traced) >= len(leaked) * 1024
+
+        log_dir = get_hyperdash_logs_home_path_for_job(job_name)
+        latest_log_file = max([
+            os.path.join(log_dir, filename) for
+            filename in
+            os.listdir(log_dir)
+        ], key=os.path.getmtime)
+        with open(latest_log_file, "r") as log_file:
+            data = log_file.read()
+        assert_in("Top memory growth since the previous snapshot", data)
+        assert_in("test_sdk.py", data)
+
+    def test_experiment_stats(self):
+        with patch("sys.stdout", new=StringIO()):
+            exp = Experiment("stats", capture_io=False, sdk_stats=True)
+            exp.metric("loss", 1, log=False)
+            # Wait for the network loop to send the queued messages
+            time.sleep(1.5)
+            stats = exp.stats()
+            exp.end()
+
+        assert stats["messages_sent"] >= 2
+        assert stats["bytes_sent"] > 0
+        assert stats["request_seconds"]["count"] >= stats["messages_sent"]
+        assert stats["queue_wait_seconds"]["p99"] >= 0
+        assert stats["capture_seconds"]["count"] > 0
+        assert stats["queue_depth"] == 0
+        assert "retries" not in stats
+
+        metrics = [msg["payload"] for msg in server_sdk_messages if msg["type"] == "metric"]
+        sdk_metrics = [metric for metric in metrics if metric["name"].startswith("hd_sdk_")]
+        names = set(metric["name"] for metric in sdk_metrics)
+        assert "hd_sdk_messages_sent" in names
+        assert "hd_sdk_request_seconds_p99" in names
+        assert all(metric["is_internal"] for metric in sdk_metrics)
+
+    def test_experiment_capture_logging(self):
+        class PrefixHandler(logging.StreamHandler):
+            def emit(self, record):
+                self.stream.write("prefixed: {}\n".format(record.getMessage()))
+
+        private_logger = logging.getLogger("test_capture_logging_private")
+        private_logger.propagate = False
+        with patch("sys.stdout", new=StringIO()) as fake_out:
+            exp = Experiment("capture logging", capture_logging=True)
+            # Created after the experiment, like the loggers of a library
+            # imported later
+            app_logger = logging.getLogger("test_capture_logging")
+            app_logger.setLevel(logging.INFO)
+            # Added after stdout is captured, so they print to the captured buffer
+            handlers = [
+                (app_logger, logging.StreamHandler(sys.stdout)),
+                (logging.getLogger(), PrefixHandler(sys.stdout)),
+                (private_logger, logging.StreamHandler(sys.stdout)),
+            ]
+            for logger, handler in handlers:
+                logger.addHandler(handler)
+            try:
+                # Wait for the handlers to be picked up
+                time.sleep(1)
+                app_logger.warning("disk %s is full", "/tmp")
+                private_logger.warning("not captured")
+                print("plain print")
+                time.sleep(1.5)
+                exp.end()
+            finally:
+                for logger, handler in handlers:
+                    logger.removeHandler(handler)
+                private_logger.propagate = True
+            captured_out = fake_out.getvalue()
+
+        # Still printed locally
+        assert_in("disk /tmp is full", captured_out)
+        assert_in("prefixed: disk /tmp is full", captured_out)
+        logs = [msg["payload"] for msg in server_sdk_messages if msg["type"] == "log"]
+        records = [log for log in logs if log.get("logger") == "test_capture_logging"]
+        assert len(records) == 1
+        assert records[0]["level"] == "WARNING"
+        assert records[0]["body"] == "disk /tmp is full"
+        assert records[0]["timestamp"] > 0
+        # But not uploaded as text too
+        text = "".join(log["body"] for log in logs if "logger" not in log)
+        assert_in("plain print", text)
+        assert "disk /tmp is full" not in text
+        # Loggers which aren't captured are still uploaded as text
+        assert_in("not captured", text)
+        assert not any(log.get("logger") == "test_capture_logging_private" for log in logs)
+
+    def test_experiment_system_metrics(self):
+        if not telemetry.is_supported():
+            raise SkipTest("procfs is not available")
+        with patch("sys.stdout", new=StringIO()):
+            exp = Experiment("system metrics", capture_io=False, system_metrics=True, system_metrics_interval=0.2)
+            time.sleep(1)
+            exp.end()
+
+        metrics = [msg["payload"] for msg in server_sdk_messages if msg["type"] == "metric"]
+        names = set(metric["name"] for metric in metrics)
+        assert "hd_system_cpu_percent" in names
+        assert "hd_self_rss_bytes" in names
+        assert all(metric["is_internal"] for metric in metrics)
+
+    def test_iter_fast(self):
+        n = 200000
+        with patch("sys.stdout", new=StringIO()) as fake_out:
+            @monitor("test iter fast")
+            def test_job(exp):
+                total = 0
+                for i in exp.iter(n, fast=True):
+                    total += i
+                return total
+            assert test_job() == sum(range(n))
+
+        metric_messages = {}
+        for msg in server_sdk_messages:
+            payload = msg["payload"]
+            if "name" in payload:
+                metric_messages.setdefault(payload["name"], []).append(payload)
+
+        # Progress is sampled instead of being sent on every iteration
+        assert len(metric_messages["hd_iter_0"]) < 10
+        assert metric_messages["hd_iter_0"][-1]["value"] == n - 1
+        assert all(m["is_internal"] for m in metric_messages["hd_iter_0"])
+        assert "hd_iter_0_rate" in metric_messages
+        assert "| Iteration {} of {} |".format(n - 1, n - 1) in fake_out.getvalue()
+
+    def test_iter_fast_final_tick_waits_for_tick_in_progress(self):
+        client = HDClient(logging.getLogger("test_iter_fast"), Mock(), "uuid")
+        recorded = []
+        tick_started = Event()
+        final_recorded = Event()
+        threads = {}
+
+        def metric(name, timestamp, value, **kwargs):
+            if name == "hd_iter_0" and current_thread() is threads.get("tick"):
+                tick_started.set()
+                # Without waiting for this tick, the final one records its
+                # sample first
+                final_recorded.wait(0.5)
+            recorded.append((name, timestamp))
+            if name == "hd_iter_0" and current_thread() is threads.get("final"):
+                final_recorded.set()
+        client._metric = metric
+
+        it = client.iter(10, log=False, fast=True)
+        for _ in range(5):
+            next(it)
+        ticker = client._tickers[-1]
+        time.sleep(0.01)
+        threads["tick"] = Thread(target=ticker, args=(time.time(), False))
+        threads["final"] = Thread(target=it.close)
+        threads["tick"].start()
+        tick_started.wait()
+        threads["final"].start()
+        threads["tick"].join()
+        threads["final"].join()
+        client._close()
+
+        timestamps = [timestamp for name, timestamp in recorded if name == "hd_iter_0"]
+        assert len(timestamps) == 2
+        assert timestamps[0] < timestamps[1]
+
+    def test_params(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--lr", type=float, default=0.1)
+        parser.add_argument("--layers", type=int, default=3)
+
+        with patch("sys.stdout", new=StringIO()) as fake_out:
+            @monitor("test bulk params")
+            def test_job(exp):
+                exp.params({
+                    "optimizer": {"name": "adam", "betas": {"beta1": 0.9}},
+                    "epochs": np.int64(5),
+                    "dropout": None,
+                })
+                exp.params(parser.parse_args([]))
+            test_job()
+
+        params_messages = [
+            msg["payload"] for msg in server_sdk_messages if msg["type"] == "param"]
+        # One message per call, with nested keys flattened
+        assert params_messages == [
+            {
+                "params": {
+                    "optimizer.name": "adam",
+                    "optimizer.betas.beta1": 0.9,
+                    "epochs": 5.0,
+                    "dropout": None,
+                },
+                "is_internal": False,
+            },
+            {
+                "params": {"lr": 0.1, "layers": 3},
+                "is_internal": False,
+            },
+        ]
+        assert "{ optimizer.betas.beta1: 0.9 }" in fake_out.getvalue()
+        assert "{ layers: 3 }" in fake_out.getvalue()
+
+    def test_params_collision(self):
+        with assert_raises(ValueError) as e:
+            flatten_params({"a.b": 1, "a": {"b": 2}})
+        assert_in("a.b", str(e.exception))
+        # No collision with another separator
+        assert flatten_params({"a.b": 1, "a": {"b": 2}}, separator="/") == {"a.b": 1, "a/b": 2}
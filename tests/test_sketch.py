@@ -0,0 +1,44 @@
+import random
+
+import numpy as np
+
+from hyperdash.sketch import DDSketch
+
+
+class TestSketch(object):
+    """TestSketch contains tests for the DDSketch class."""
+    def test_quantiles_are_within_relative_accuracy(self):
+        values = [random.lognormvariate(0, 2) for _ in range(10000)]
+        values += [-v for v in values[:1000]] + [0] * 50
+        sketch = DDSketch(relative_accuracy=0.01)
+        sketch.add_many(values)
+
+        values.sort()
+        assert sketch.count == len(values)
+        for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+            expected = values[int(q * (len(values) - 1))]
+            assert abs(sketch.quantile(q) - expected) <= 0.01 * abs(expected)
+
+    def test_numpy_arrays_match_python_values(self):
+        values = np.random.normal(size=(100, 100))
+        from_array = DDSketch()
+        from_array.add_many(values)
+        from_list = DDSketch()
+        from_list.add_many(values.ravel().tolist())
+
+        assert from_array.count == from_list.count
+        assert from_array.positive == from_list.positive
+        assert from_array.negative == from_list.negative
+        assert from_array.min == from_list.min
+
+    def test_merge_and_serialize(self):
+        a = DDSketch()
+        a.add_many(range(1, 501))
+        b = DDSketch()
+        b.add_many(range(501, 1001))
+        a.merge(b)
+
+        restored = DDSketch.from_dict(a.to_dict())
+        assert restored.count == 1000
+        assert restored.min == 1 and restored.max == 1000
+        assert abs(restored.quantile(0.5) - 500) <= 0.01 * 500
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import time
+
+from nose.plugins.skip import SkipTest
+
+from hyperdash import telemetry
+
+
+class TestTelemetry(object):
+    """TestTelemetry contains tests for the procfs resource samplers."""
+    def setup(self):
+        if not telemetry.is_supported():
+            raise SkipTest("procfs is not available")
+
+    def test_parse_stat(self):
+        # The command name can contain spaces and parentheses
+        data = b"42 (a) b) S 7 42 42 0 -1 4194560 100 0 0 0 25 5 0 0 20 0 3 0 100 1000 50 18446744073709551615"
+        sample = telemetry._ProcessSample()
+        assert telemetry._parse_stat(data, sample) == 7
+        assert sample.cpu_ticks == 30
+        assert sample.threads == 3
+        assert sample.rss_bytes == 50 * telemetry.PAGE_SIZE
+
+    def test_process_sampler_includes_descendants(self):
+        # A shell whose child keeps running
+        p = subprocess.Popen("{} -c 'import time; time.sleep(5)'; true".format(sys.executable), shell=True)
+        try:
+            sampler = telemetry.ProcessSampler(p.pid, None, 0.1)
+            # Wait for the shell to start its child
+            deadline = time.time() + 5
+            while len(sampler._process_tree()) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+            # Rates are only reported once there are two samples to compare
+            assert sampler.sample(time.time()) is None
+            metrics = sampler.sample(time.time() + 0.1)
+            sampler.stop()
+        finally:
+            p.kill()
+            p.wait()
+        assert metrics["hd_process_count"] >= 2
+        assert metrics["hd_process_rss_bytes"] > 0
+        assert metrics["hd_process_threads"] >= 2
+        assert metrics["hd_process_cpu_percent"] >= 0
+
+    def test_proc_file_reuses_handle(self):
+        f = telemetry.ProcFile("/proc/self/stat")
+        first = f.read()
+        handle = f.f
+        assert f.read() and f.f is handle
+        assert first.startswith(str(os.getpid()).encode("utf-8"))
+        f.close()
+        assert telemetry.ProcFile("/proc/does-not-exist").read() is None
+
+    def test_system_sampler(self):
+        sampler = telemetry.SystemSampler(None)
+        metrics = sampler.sample(time.time())
+        assert metrics["hd_self_rss_bytes"] > 0
+        assert metrics["hd_self_threads"] >= 1
+        assert "hd_system_cpu_percent" not in metrics
+        # Let some CPU time pass
+        time.sleep(0.2)
+        metrics = sampler.sample(time.time())
+        sampler.close()
+        assert 0 <= metrics["hd_system_cpu_percent"] <= 100
+        assert 0 <= metrics["hd_system_memory_used_percent"] <= 100
+        for name in ("disk_read", "disk_write", "net_rx", "net_tx"):
+            assert metrics["hd_system_{}_bytes_per_second".format(name)] >= 0
@@ -0,0 +1,38 @@
+from hyperdash.terminal import PENDING_LINE_INTERVAL_SECONDS
+from hyperdash.terminal import TerminalCompactor
+
+
+class TestTerminalCompactor(object):
+    """TestTerminalCompactor contains tests for compacting captured output."""
+    def test_plain_lines_are_unchanged(self):
+        compactor = TerminalCompactor()
+        assert compactor.feed("a\nb\n", 0) == "a\nb\n"
+        assert compactor.feed("c", 0) == ""
+        assert compactor.feed("d\n", 0) == "cd\n"
+
+    def test_progress_bar_keeps_last_frame(self):
+        compactor = TerminalCompactor()
+        out = compactor.feed("\r\x1b[32m 10%|#         |\x1b[0m", 0)
+        out += compactor.feed("\r\x1b[32m 50%|#####     |\x1b[0m", 1)
+        out += compactor.feed("\r\x1b[32m100%|##########|\x1b[0m\ndone\n", 2)
+        assert out == "100%|##########|\ndone\n"
+
+    def test_overwrites_like_a_terminal(self):
+        compactor = TerminalCompactor()
+        assert compactor.feed("loading...\rdone\n", 0) == "doneing...\n"
+        assert compactor.feed("abc\b\bX\n", 0) == "aXc\n"
+        # Windows line endings
+        assert compactor.feed("line\r\n", 0) == "line\n"
+
+    def test_escape_sequence_split_across_chunks(self):
+        compactor = TerminalCompactor()
+        assert compactor.feed("red: \x1b[3", 0) == ""
+        assert compactor.feed("1mtext\x1b]0;title\x07\n", 0) == "red: text\n"
+
+    def test_pending_line_is_uploaded_periodically(self):
+        compactor = TerminalCompactor()
+        assert compactor.feed("\r 10%", 0) == ""
+        assert compactor.feed("\r 20%", PENDING_LINE_INTERVAL_SECONDS) == " 20%\n"
+        assert compactor.feed("\r 30%", PENDING_LINE_INTERVAL_SECONDS + 1) == ""
+        assert compactor.flush() == " 30%"
+        assert compactor.flush() == ""
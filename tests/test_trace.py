@@ -0,0 +1,39 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from hyperdash.trace import SpanRecorder
+
+
+class TestTrace(object):
+    """TestTrace contains tests for the span ring buffer."""
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "traces", "trace.json")
+
+    def teardown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_keeps_most_recent_spans(self):
+        recorder = SpanRecorder(self.path, capacity=3)
+        start = recorder.origin_ns
+        for i in range(5):
+            recorder.record("step", start + i * 1000, start + i * 1000 + 500)
+
+        events = recorder.to_dict()["traceEvents"]
+        assert [e["ph"] for e in events] == ["M", "X", "X", "X"]
+        assert events[0]["args"]["name"] == threading.current_thread().name
+        assert [(e["ts"], e["dur"]) for e in events[1:]] == [(2.0, 0.5), (3.0, 0.5), (4.0, 0.5)]
+
+    def test_dump(self):
+        recorder = SpanRecorder(self.path)
+        recorder.record("data", recorder.origin_ns, recorder.origin_ns + 1000)
+        recorder.tick(100.0, False)
+        # Not dumped until the interval has passed, unless forced
+        assert not os.path.exists(self.path)
+        recorder.tick(101.0, True)
+        with open(self.path) as f:
+            trace = json.load(f)
+        assert [e["name"] for e in trace["traceEvents"]] == ["thread_name", "data"]
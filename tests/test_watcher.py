@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+
+from hyperdash_cli.watcher import create_watcher
+from hyperdash_cli.watcher import InotifyWatcher
+from hyperdash_cli.watcher import PollingWatcher
+
+
+class TestWatcher(object):
+    """TestWatcher contains tests for the logdir watchers."""
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_reports_changed_directories(self):
+        watcher = create_watcher(self.tmp_dir)
+        try:
+            if isinstance(watcher, PollingWatcher):
+                # inotify isn't available on this platform
+                assert watcher.wait(0) is None
+                return
+            assert isinstance(watcher, InotifyWatcher)
+            assert watcher.wait(0) == set()
+
+            # A new directory and the files created in it before we had a
+            # chance to watch it
+            run_dir = os.path.join(self.tmp_dir, "run")
+            os.makedirs(os.path.join(run_dir, "nested"))
+            assert watcher.wait(1) == set([self.tmp_dir, run_dir, os.path.join(run_dir, "nested")])
+
+            # Files written after the directory is watched
+            with open(os.path.join(run_dir, "events.out.tfevents.1.host"), "w") as f:
+                f.write("data")
+            assert watcher.wait(1) == set([run_dir])
+        finally:
+            watcher.close()